@@ -1,3 +1,22 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import BillingLine, BillingDay, BillingCostRollup
+
+
+@admin.register(BillingLine)
+class BillingLineAdmin(admin.ModelAdmin):
+    list_display = ('provider', 'date', 'product_name', 'resource_id', 'region', 'cost')
+    list_filter = ('provider', 'product_name')
+    search_fields = ('resource_id', 'product_name')
+
+
+@admin.register(BillingDay)
+class BillingDayAdmin(admin.ModelAdmin):
+    list_display = ('provider', 'date', 'total_cost', 'line_count', 'fetched_at')
+    list_filter = ('provider',)
+
+
+@admin.register(BillingCostRollup)
+class BillingCostRollupAdmin(admin.ModelAdmin):
+    list_display = ('provider', 'date', 'product_name', 'region', 'total_cost', 'line_count')
+    list_filter = ('provider', 'product_name', 'region')
@@ -4,13 +4,32 @@ from alibabacloud_tea_openapi import models as open_api_models
 from alibabacloud_bssopenapi20171214.client import Client as BssClient
 from alibabacloud_bssopenapi20171214 import models as bss_models
 from alibabacloud_tea_util import models as util_models
+from .billing_utils import date_range, summarize_billing_data, aggregate_daily_costs
+from .billing_pager import ConcurrentPager
+from .rate_limiter import ProviderRateLimits, parse_api_rates
+from .resilience import ProviderResilience
+from .metrics import metrics
 
 class AlibabaCloudService:
+    # QueryInstanceBill / QueryBill 单页最大条数
+    PAGE_SIZE = 300
+
     def __init__(self):
         # 使用空字符串作为默认值，避免类型检查因 None 报错
         self.access_key_id = os.environ.get("ALIBABA_CLOUD_ACCESS_KEY_ID", "")
         self.access_key_secret = os.environ.get("ALIBABA_CLOUD_ACCESS_KEY_SECRET", "")
         self.endpoint = os.environ.get("ALIBABA_CLOUD_BSS_ENDPOINT", "business.aliyuncs.com")
+        # 账户标识，用于区分增量同步水位，未配置时使用AccessKey ID
+        self.account_id = os.environ.get("ALIBABA_CLOUD_ACCOUNT_ID", self.access_key_id)
+        # 账单并发请求数及每秒请求数上限（需低于账户的接口QPS配额）
+        self.max_concurrency = int(os.environ.get("ALIBABA_BILLING_CONCURRENCY", "4"))
+        # 按账户和接口限流，同一台机器上的所有进程共享令牌桶（BILLING_RATE_LIMIT_DB）
+        self.rate_limits = ProviderRateLimits(
+            'alibaba', self.account_id, float(os.environ.get("ALIBABA_BILLING_QPS", "5")),
+            api_rates=parse_api_rates(os.environ.get("ALIBABA_BILLING_API_QPS"))
+        )
+        # 限流和临时错误时退避重试，连续失败时熔断
+        self.resilience = ProviderResilience('alibaba')
 
         config = open_api_models.Config(
             access_key_id=self.access_key_id,
@@ -18,12 +37,17 @@ class AlibabaCloudService:
         )
         config.endpoint = self.endpoint
         self.client = BssClient(config)
+        # 服务实例由client_registry在进程内共享，保持长连接并按并发数保留空闲连接
+        self.runtime = util_models.RuntimeOptions(
+            keep_alive=True,
+            max_idle_conns=max(self.max_concurrency, 1) * 2
+        )
 
     def get_account_balance(self):
         """获取账户余额"""
         try:
-            # 直接调用无参数方法以适配 SDK 的签名
-            response = self.client.query_account_balance()
+            response = self._call('QueryAccountBalance', self.client.query_account_balance_with_options,
+                                  self.runtime)
             data = getattr(response.body, "data", None)
             return getattr(data, "available_amount", None)
         except Exception as e:
@@ -36,74 +60,127 @@ class AlibabaCloudService:
         :param start_date: 开始日期 (YYYY-MM-DD)
         :param end_date: 结束日期 (YYYY-MM-DD)
         :param billing_cycle: 账期 (YYYY-MM), 如果指定则按月账单查询
-        :return: 账单数据列表
+        :return: 账单数据列表，重试后仍查询失败时抛出异常，不返回不完整的数据
         """
-        try:
-            billing_data = []
-            
-            # 如果指定了billing_cycle，使用月账单查询
-            if billing_cycle:
-                request = bss_models.QueryBillRequest(
-                    billing_cycle=billing_cycle,
-                    page_num=1,
-                    page_size=300
-                )
-                response = self.client.query_bill(request)
-                if response.body.data and response.body.data.items:
-                    for item in response.body.data.items.item:
-                        billing_data.append({
-                            'date': item.billing_date if hasattr(item, 'billing_date') else billing_cycle,
+        # 如果指定了billing_cycle，使用月账单查询
+        if billing_cycle:
+            return list(self._iter_monthly_bill_lines(billing_cycle))
+        return list(self.iter_billing_lines(start_date, end_date))
+
+    def iter_billing_lines(self, start_date, end_date):
+        """
+        流式获取实例账单明细
+        每天单独查询（按天粒度必须指定账单日期），各天及其分页并发拉取，按日期顺序返回；
+        分页在后台预取，内存中只保留预取窗口内的分页
+        :param start_date: 开始日期 (YYYY-MM-DD)
+        :param end_date: 结束日期 (YYYY-MM-DD)
+        :return: 账单明细生成器，查询失败时抛出异常
+        """
+        queries = self._instance_bill_queries(start_date, end_date)
+        with ConcurrentPager(self.max_concurrency) as pager:
+            for _, items in pager.iter_paged(queries, self._query_instance_bill, self.PAGE_SIZE):
+                for item in items:
+                    # 过滤日期范围
+                    item_date = item.billing_date if hasattr(item, 'billing_date') else ''
+                    if start_date <= item_date <= end_date:
+                        yield {
+                            'date': item_date,
                             'product_name': item.product_name if hasattr(item, 'product_name') else '',
                             'cost': float(item.pretax_amount) if hasattr(item, 'pretax_amount') else 0.0,
                             'currency': item.currency if hasattr(item, 'currency') else 'CNY',
-                            'subscription_type': item.subscription_type if hasattr(item, 'subscription_type') else ''
-                        })
-            else:
-                # 按日期范围查询
-                request = bss_models.QueryInstanceBillRequest(
-                    billing_cycle=start_date[:7],  # YYYY-MM格式
-                    page_num=1,
-                    page_size=300
-                )
-                response = self.client.query_instance_bill(request)
-                if response.body.data and response.body.data.items:
-                    for item in response.body.data.items.item:
-                        # 过滤日期范围
-                        item_date = item.billing_date if hasattr(item, 'billing_date') else ''
-                        if start_date <= item_date <= end_date:
-                            billing_data.append({
-                                'date': item_date,
-                                'product_name': item.product_name if hasattr(item, 'product_name') else '',
-                                'cost': float(item.pretax_amount) if hasattr(item, 'pretax_amount') else 0.0,
-                                'currency': item.currency if hasattr(item, 'currency') else 'CNY',
-                                'instance_id': item.instance_id if hasattr(item, 'instance_id') else ''
-                            })
-            
-            return billing_data
-        except Exception as e:
-            print(f"Error querying Alibaba Cloud billing data: {e}")
-            return []
+                            'instance_id': item.instance_id if hasattr(item, 'instance_id') else ''
+                        }
+
+    def _iter_monthly_bill_lines(self, billing_cycle):
+        """流式获取月账单明细"""
+        with ConcurrentPager(self.max_concurrency) as pager:
+            for _, items in pager.iter_paged([billing_cycle], self._query_bill, self.PAGE_SIZE):
+                for item in items:
+                    yield {
+                        'date': item.billing_date if hasattr(item, 'billing_date') else billing_cycle,
+                        'product_name': item.product_name if hasattr(item, 'product_name') else '',
+                        'cost': float(item.pretax_amount) if hasattr(item, 'pretax_amount') else 0.0,
+                        'currency': item.currency if hasattr(item, 'currency') else 'CNY',
+                        'subscription_type': item.subscription_type if hasattr(item, 'subscription_type') else ''
+                    }
+
+    def _query_bill(self, billing_cycle, page, need_total=False):
+        """
+        调用QueryBill查询一页月账单
+        :param page: 页码，从0开始
+        :return: (items, total_count)
+        """
+        request = bss_models.QueryBillRequest(
+            billing_cycle=billing_cycle,
+            page_num=page + 1,
+            page_size=self.PAGE_SIZE
+        )
+        response = self._call('QueryBill', self.client.query_bill_with_options, request, self.runtime)
+        return self._page_items(response, 'QueryBill')
+
+    def _query_instance_bill(self, query, page, need_total=False):
+        """
+        调用QueryInstanceBill查询一页实例账单
+        :param query: (billing_cycle, billing_date)，按天粒度查询时必须指定billing_date
+        :param page: 页码，从0开始
+        :return: (items, total_count)
+        """
+        billing_cycle, billing_date = query
+        request = bss_models.QueryInstanceBillRequest(
+            billing_cycle=billing_cycle,  # YYYY-MM格式
+            billing_date=billing_date,
+            granularity='DAILY',
+            page_num=page + 1,
+            page_size=self.PAGE_SIZE
+        )
+        response = self._call('QueryInstanceBill', self.client.query_instance_bill_with_options,
+                              request, self.runtime)
+        return self._page_items(response, 'QueryInstanceBill')
+
+    def _page_items(self, response, api):
+        """从分页响应中取出明细和总条数"""
+        data = response.body.data
+        if not data:
+            return [], None
+        items = data.items.item if data.items and data.items.item else []
+        metrics.inc('finance_provider_items_total', len(items), provider='alibaba', api=api)
+        return items, getattr(data, 'total_count', None)
+
+    def _call(self, api, method, *args):
+        """
+        调用SDK接口：每次尝试前按接口获取限流令牌，限流和临时错误时退避重试（只重试这一个请求），
+        连续失败时熔断；每次尝试分别记录耗时和结果
+        """
+        def attempt():
+            self.rate_limits.acquire(api)
+            with metrics.track('finance_provider_request_seconds', 'finance_provider_requests_total',
+                               provider='alibaba', api=api):
+                return method(*args)
+        return self.resilience.call(api, attempt)
+
+    def _instance_bill_queries(self, start_date, end_date):
+        """
+        生成实例账单查询参数
+        QueryInstanceBill按天粒度（DAILY）查询时必须指定BillingDate，因此每天单独查询
+        :return: [(billing_cycle, billing_date)]
+        """
+        return [(day[:7], day) for day in date_range(start_date, end_date)]
+
+    def get_billing_summary(self, start_date, end_date):
+        """
+        单次拉取账单明细并汇总
+        :param start_date: 开始日期 (YYYY-MM-DD)
+        :param end_date: 结束日期 (YYYY-MM-DD)
+        :return: {'billing_data', 'daily_costs', 'product_costs', 'region_costs', 'total_cost'}，
+                 重试后仍查询失败时抛出异常，不返回不完整的数据
+        """
+        return summarize_billing_data(self.iter_billing_lines(start_date, end_date))
 
     def get_daily_costs(self, start_date, end_date):
         """
-        获取每日成本汇总
+        获取每日成本汇总（流式汇总，内存占用与账单明细条数无关）
         :param start_date: 开始日期 (YYYY-MM-DD)
         :param end_date: 结束日期 (YYYY-MM-DD)
-        :return: 每日成本字典 {date: cost}
+        :return: 每日成本字典 {date: cost}，重试后仍查询失败时抛出异常，不返回不完整的数据
         """
-        try:
-            billing_data = self.get_billing_data(start_date, end_date)
-            daily_costs = {}
-            
-            for item in billing_data:
-                date = item['date']
-                cost = item['cost']
-                if date in daily_costs:
-                    daily_costs[date] += cost
-                else:
-                    daily_costs[date] = cost
-            
-            return daily_costs
-        except Exception as e:
-            print(f"Error calculating daily costs: {e}")
-            return {}
\ No newline at end of file
+        return aggregate_daily_costs(self.iter_billing_lines(start_date, end_date))
@@ -0,0 +1,203 @@
+"""
+成本分析结果缓存
+预测和分析结果只取决于每日成本序列和参数，按内容哈希缓存，
+进程内使用有界LRU，可选使用Django缓存后端在多个进程间共享
+"""
+import copy
+import functools
+import hashlib
+import inspect
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from .metrics import metrics
+
+
+class AnalysisCache:
+    """
+    分析结果缓存（线程安全）
+    缓存键包含缓存代数，账单数据写入后调用invalidate使已缓存的结果全部失效
+    """
+
+    GENERATION_KEY = 'finance_api:analysis_cache:generation'
+
+    def __init__(self, max_entries=None, ttl_seconds=None, backend=None):
+        """
+        :param max_entries: 进程内最多缓存的结果数，<=0 表示不缓存
+        :param ttl_seconds: 结果有效期（秒）
+        :param backend: Django缓存别名（如 'default'），为空时只使用进程内缓存
+        """
+        self.max_entries = max_entries if max_entries is not None else int(
+            os.environ.get("ANALYSIS_CACHE_SIZE", "256"))
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(
+            os.environ.get("ANALYSIS_CACHE_TTL", "300"))
+        self.backend = backend if backend is not None else os.environ.get(
+            "ANALYSIS_CACHE_BACKEND", "")
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def make_key(self, name, daily_costs, params):
+        """
+        生成缓存键
+        :param name: 分析方法名
+        :param daily_costs: 每日成本 {date: cost}，或包含date、cost列的DataFrame
+        :param params: 其余参数字典
+        :return: 缓存键字符串
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps(
+            [name, sorted(params.items())], default=str, separators=(',', ':')
+        ).encode('utf-8'))
+        if isinstance(daily_costs, dict):
+            digest.update(json.dumps(
+                sorted(daily_costs.items()), default=str, separators=(',', ':')
+            ).encode('utf-8'))
+        else:
+            # DataFrame（如Parquet归档读取结果）按内容哈希
+            from pandas.util import hash_pandas_object
+            digest.update(hash_pandas_object(daily_costs[['date', 'cost']], index=False).to_numpy().tobytes())
+        return f'finance_api:analysis:{self._current_generation()}:{digest.hexdigest()}'
+
+    def get_or_compute(self, name, daily_costs, params, compute):
+        """
+        读取缓存结果，未命中时计算并缓存
+        :param compute: 无参数的计算函数
+        :return: 结果副本，调用方修改结果不会影响缓存
+        """
+        if not self.enabled or daily_costs is None or len(daily_costs) == 0:
+            return compute()
+
+        key = self.make_key(name, daily_costs, params)
+        found, result = self._get(key)
+        metrics.inc('finance_analysis_cache_requests_total', result='hit' if found else 'miss')
+        if not found:
+            result = compute()
+            self._set(key, result)
+        return copy.deepcopy(result)
+
+    def invalidate(self):
+        """使所有已缓存的结果失效（账单数据写入后调用）"""
+        with self._lock:
+            self._entries.clear()
+            self._generation += 1
+
+        cache = self._backend_cache()
+        if cache is not None:
+            try:
+                cache.incr(self.GENERATION_KEY)
+            except ValueError:
+                cache.set(self.GENERATION_KEY, 1, None)
+            except Exception as e:
+                print(f"Error invalidating analysis cache: {e}")
+
+    def clear(self):
+        """清空进程内缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    return True, value
+                del self._entries[key]
+
+        cache = self._backend_cache()
+        if cache is not None:
+            try:
+                value = cache.get(key)
+            except Exception as e:
+                print(f"Error reading analysis cache: {e}")
+                value = None
+            if value is not None:
+                self._store_local(key, value)
+                return True, value
+
+        return False, None
+
+    def _set(self, key, value):
+        self._store_local(key, value)
+
+        cache = self._backend_cache()
+        if cache is not None:
+            try:
+                cache.set(key, value, self.ttl_seconds)
+            except Exception as e:
+                print(f"Error writing analysis cache: {e}")
+
+    def _store_local(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _current_generation(self):
+        cache = self._backend_cache()
+        if cache is None:
+            return self._generation
+        try:
+            return cache.get(self.GENERATION_KEY, 0)
+        except Exception as e:
+            print(f"Error reading analysis cache generation: {e}")
+            return self._generation
+
+    def _backend_cache(self):
+        if not self.backend:
+            return None
+        from django.core.cache import caches
+        return caches[self.backend]
+
+
+# 进程内共享的分析结果缓存，BillingStore写入账单数据后使其失效
+analysis_cache = AnalysisCache()
+
+
+def _hit_ratio():
+    hits = metrics.counter_value('finance_analysis_cache_requests_total', result='hit')
+    total = metrics.counter_total('finance_analysis_cache_requests_total')
+    return hits / total if total else 0.0
+
+
+metrics.register_gauge('finance_analysis_cache_hit_ratio', _hit_ratio)
+metrics.register_gauge('finance_analysis_cache_entries', lambda: len(analysis_cache))
+
+
+def cached_analysis(method):
+    """
+    缓存分析方法结果的装饰器
+    被装饰方法的第一个参数为每日成本 {date: cost}，其余参数按名称参与缓存键；
+    实例的cache属性为None时不缓存
+    """
+    signature = inspect.signature(method)
+
+    @functools.wraps(method)
+    def wrapper(self, daily_costs, *args, **kwargs):
+        cache = getattr(self, 'cache', None)
+        if cache is None:
+            return method(self, daily_costs, *args, **kwargs)
+
+        bound = signature.bind(self, daily_costs, *args, **kwargs)
+        bound.apply_defaults()
+        params = dict(list(bound.arguments.items())[2:])
+        return cache.get_or_compute(
+            method.__name__, daily_costs, params,
+            lambda: method(self, daily_costs, *args, **kwargs)
+        )
+
+    return wrapper
@@ -0,0 +1,118 @@
+"""
+异步视图的执行器
+云服务商SDK和数据库访问都是阻塞调用，异步视图将其放到有界线程池中执行，事件循环只负责等待；
+模型训练等CPU密集计算放到进程池中执行，不占用I/O线程和事件循环
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from django.db import connections
+
+
+class LazyExecutor:
+    """首次提交任务时才创建的执行器，避免导入视图模块（如运行管理命令）时创建线程或子进程"""
+
+    def __init__(self, factory):
+        """
+        :param factory: 无参数函数，返回ThreadPoolExecutor或ProcessPoolExecutor
+        """
+        self.factory = factory
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        executor = self._executor
+        if executor is not None:
+            return executor
+
+        with self._lock:
+            if self._executor is None:
+                self._executor = self.factory()
+            return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        return self.get().submit(fn, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+# 阻塞调用（云服务商请求、数据库读写）共用的有界线程池，并发请求超出时排队而不是无限创建线程
+io_executor = LazyExecutor(lambda: ThreadPoolExecutor(
+    max_workers=int(os.environ.get("ASYNC_IO_WORKERS", "32")),
+    thread_name_prefix='finance-io'
+))
+
+# 模型训练进程池；子进程使用spawn启动，不继承父进程中线程持有的锁
+cpu_executor = LazyExecutor(lambda: ProcessPoolExecutor(
+    max_workers=int(os.environ.get("ASYNC_CPU_WORKERS", "0")) or os.cpu_count() or 1,
+    mp_context=multiprocessing.get_context('spawn')
+))
+
+
+def _call_in_worker(func, args, kwargs):
+    """在线程池中执行，结束后关闭该线程的数据库连接"""
+    try:
+        return func(*args, **kwargs)
+    finally:
+        connections.close_all()
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    在I/O线程池中执行阻塞调用
+    :param func: 阻塞函数
+    :return: func的返回值
+    """
+    return await sync_to_async(
+        _call_in_worker, thread_sensitive=False, executor=io_executor.get()
+    )(func, args, kwargs)
+
+
+async def iterate_blocking(iterable, max_buffered=256):
+    """
+    在I/O线程池的一个线程中遍历阻塞的同步迭代器（如流式读取数据库的生成器），异步产出其元素
+    生成器始终在同一线程中执行，数据库游标不会跨线程使用；消费方较慢时最多缓冲max_buffered个元素
+    :param iterable: 同步可迭代对象
+    :return: 异步生成器
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    slots = threading.Semaphore(max_buffered)
+    stopped = threading.Event()
+
+    def produce():
+        error = None
+        try:
+            for item in iterable:
+                slots.acquire()
+                if stopped.is_set():
+                    return
+                loop.call_soon_threadsafe(queue.put_nowait, (False, item))
+        except Exception as e:
+            error = e
+        finally:
+            connections.close_all()
+        if not stopped.is_set():
+            loop.call_soon_threadsafe(queue.put_nowait, (True, error))
+
+    loop.run_in_executor(io_executor.get(), produce)
+    try:
+        while True:
+            done, item = await queue.get()
+            if done:
+                if item is not None:
+                    raise item
+                return
+            slots.release()
+            yield item
+    finally:
+        # 客户端断开时通知生产线程停止
+        stopped.set()
+        slots.release()
@@ -0,0 +1,283 @@
+"""
+离线基准测试
+使用本地模拟的云服务商（fake_providers）端到端测试BillingFetchService的账单拉取、入库和读取，
+以及CostPredictionService在不同序列长度和序列数量下的预测耗时；结果为JSON，可与基线结果比较发现性能回退
+"""
+import json
+import math
+import os
+import platform
+import random
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+# 账单拉取场景：(服务商, 天数, 每天明细条数, 单页条数(None为默认), 每次接口调用延迟(秒))
+FETCH_CASES = [
+    ('alibaba', 90, 200, None, 0.05),
+    ('tencent', 90, 200, None, 0.05),
+    ('all', 90, 200, None, 0.05),
+    ('tencent', 30, 1000, None, 0.02),
+]
+# 单序列预测的历史天数：30天到5年
+PREDICT_DAYS = [30, 90, 365, 1825]
+# 批量预测场景：(序列数, 预测方法)，随机森林每个序列单独训练，只测试较少的序列数
+BATCH_CASES = [
+    (1, 'ensemble'), (10, 'ensemble'), (100, 'ensemble'),
+    (1, 'linear'), (100, 'linear'), (1000, 'linear'), (10000, 'linear'),
+]
+BATCH_SERIES_DAYS = 90
+
+# --quick 使用的较小场景（适合CI）
+QUICK_FETCH_CASES = [('alibaba', 31, 50, None, 0.01), ('tencent', 31, 50, None, 0.01), ('all', 31, 50, None, 0.01)]
+QUICK_PREDICT_DAYS = [30, 365]
+QUICK_BATCH_CASES = [(10, 'ensemble'), (1000, 'linear')]
+
+SUITES = ('fetch', 'predict', 'batch')
+
+# 固定的结束日期，各次运行拉取相同的（已结算的）账单
+END_DATE = '2024-06-30'
+
+
+def synthetic_daily_costs(days, seed=0, end_date=END_DATE):
+    """
+    生成确定性的每日成本序列（趋势、周期和噪声）
+    :return: {date: cost}
+    """
+    rng = random.Random(seed)
+    end = datetime.strptime(end_date, '%Y-%m-%d')
+    costs = {}
+    for i in range(days):
+        day = end - timedelta(days=days - 1 - i)
+        weekly = 0.75 if day.weekday() >= 5 else 1.0
+        costs[day.strftime('%Y-%m-%d')] = round((150 + 0.05 * i) * weekly * rng.uniform(0.85, 1.15), 2)
+    return costs
+
+
+def _timed(func, repeat):
+    """执行repeat次，返回 (最短耗时(秒), 最后一次的返回值)"""
+    best, result = math.inf, None
+    for _ in range(max(repeat, 1)):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def _result(suite, name, seconds, params, **measures):
+    return {'suite': suite, 'name': name, 'seconds': round(seconds, 6), 'params': params, **measures}
+
+
+def _clear_store():
+    from .analysis_cache import analysis_cache
+    from .models import BillingLine, BillingDay, BillingCostRollup, BillingSyncState
+
+    for model in (BillingLine, BillingDay, BillingCostRollup, BillingSyncState):
+        model.objects.all().delete()
+    analysis_cache.clear()
+
+
+def _stored_rows():
+    from .models import BillingLine
+    return BillingLine.objects.count()
+
+
+def run_fetch_benchmarks(cases=None, repeat=1, log=None):
+    """
+    端到端测试账单拉取：冷启动（本地存储为空，分页请求模拟的云服务商并写入存储）和热读取（只读本地存储）
+    :param cases: 场景列表，默认FETCH_CASES
+    :param repeat: 重复次数，每次冷启动前清空本地存储，取最短耗时
+    :return: 结果列表
+    """
+    from .billing_fetch_service import BillingFetchService
+    from .fake_providers import create_fake_service
+
+    results = []
+    for provider, days, rows_per_day, page_size, latency in cases or FETCH_CASES:
+        start_date = (datetime.strptime(END_DATE, '%Y-%m-%d') - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+        params = {'provider': provider, 'days': days, 'rows_per_day': rows_per_day,
+                  'page_size': page_size, 'latency': latency}
+        label = f'{provider}/days={days}/rows_per_day={rows_per_day}/page_size={page_size or "default"}/latency={latency}'
+
+        cold, warm, calls = math.inf, math.inf, 0
+        for _ in range(max(repeat, 1)):
+            _clear_store()
+            service = BillingFetchService()
+            fakes = {name: create_fake_service(name, rows_per_day, page_size, latency)
+                     for name in service._resolve_providers(provider)}
+            service.alibaba_service = fakes.get('alibaba')
+            service.tencent_service = fakes.get('tencent')
+
+            if provider == 'all':
+                fetch = lambda: service.fetch_all_billing_data(start_date, END_DATE)
+            else:
+                fetch = lambda: service.fetch_billing_data(provider, start_date, END_DATE)
+
+            seconds, _ = _timed(fetch, 1)
+            cold = min(cold, seconds)
+            calls = sum(fake.client.calls for fake in fakes.values())
+            rows = _stored_rows()
+            if rows != days * rows_per_day * len(fakes):
+                raise RuntimeError(f'{label}: 入库 {rows} 条，应为 {days * rows_per_day * len(fakes)} 条')
+            seconds, _ = _timed(fetch, 1)
+            warm = min(warm, seconds)
+
+        results.append(_result('fetch', f'fetch/cold/{label}', cold, params, rows=rows, api_calls=calls,
+                               rows_per_second=round(rows / cold, 1)))
+        results.append(_result('fetch', f'fetch/warm/{label}', warm, params, rows=rows,
+                               rows_per_second=round(rows / warm, 1)))
+        if log:
+            log(results[-2])
+            log(results[-1])
+    _clear_store()
+    return results
+
+
+def run_predict_benchmarks(days_list=None, repeat=3, days_ahead=30, method='ensemble', log=None):
+    """
+    测试单个序列的预测耗时（准备数据、训练模型和预测，不使用分析结果缓存和模型注册表）
+    :param days_list: 历史天数列表，默认PREDICT_DAYS
+    :return: 结果列表
+    """
+    from .cost_prediction_service import CostPredictionService
+
+    service = CostPredictionService(cache=None, model_registry=None)
+    results = []
+    for days in days_list or PREDICT_DAYS:
+        daily_costs = synthetic_daily_costs(days)
+        seconds, prediction = _timed(lambda: service.predict_costs(daily_costs, days_ahead, method), repeat)
+        if not prediction['success']:
+            raise RuntimeError(f"预测失败（{days}天）: {prediction['message']}")
+        results.append(_result(
+            'predict', f'predict/days={days}/method={method}', seconds,
+            {'days': days, 'days_ahead': days_ahead, 'method': method}
+        ))
+        if log:
+            log(results[-1])
+    return results
+
+
+def run_batch_benchmarks(cases=None, repeat=1, days=BATCH_SERIES_DAYS, days_ahead=30, log=None):
+    """
+    测试批量预测（predict_batch）在不同序列数下的耗时
+    :param cases: [(序列数, 预测方法)]，默认BATCH_CASES
+    :return: 结果列表
+    """
+    from .cost_prediction_service import CostPredictionService
+
+    service = CostPredictionService(cache=None, model_registry=None)
+    results = []
+    for count, method in cases or BATCH_CASES:
+        series = {f'series-{i}': synthetic_daily_costs(days, seed=i) for i in range(count)}
+        seconds, predictions = _timed(lambda: service.predict_batch(series, days_ahead, method), repeat)
+        failed = [series_id for series_id, result in predictions.items() if not result['success']]
+        if failed:
+            raise RuntimeError(f'批量预测失败: {failed[:5]}')
+        results.append(_result(
+            'batch', f'batch/series={count}/days={days}/method={method}', seconds,
+            {'series': count, 'days': days, 'days_ahead': days_ahead, 'method': method},
+            series_per_second=round(count / seconds, 1)
+        ))
+        if log:
+            log(results[-1])
+    return results
+
+
+@contextmanager
+def isolated_database():
+    """
+    在临时测试数据库中运行，不影响本地账单存储
+    SQLite使用临时文件而不是内存数据库，多个服务商并发写入时与实际部署的锁行为一致
+    """
+    from django.db import connection
+
+    old_name = connection.settings_dict['NAME']
+    test_settings = connection.settings_dict.setdefault('TEST', {})
+    old_test_name = test_settings.get('NAME')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if connection.vendor == 'sqlite':
+            test_settings['NAME'] = os.path.join(tmp_dir, 'benchmark.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            test_settings['NAME'] = old_test_name
+
+
+def run_benchmarks(suites=SUITES, quick=False, repeat=None, log=None):
+    """
+    运行基准测试
+    :param suites: 要运行的测试组，'fetch'、'predict'、'batch'
+    :param quick: 使用较小的场景
+    :param repeat: 重复次数，默认拉取1次、单序列预测3次、批量预测1次
+    :param log: 每得到一个结果时调用
+    :return: 报告字典 {'created_at', 'environment', 'results'}
+    """
+    results = []
+    if 'fetch' in suites:
+        with isolated_database():
+            results += run_fetch_benchmarks(QUICK_FETCH_CASES if quick else FETCH_CASES, repeat or 1, log)
+    if 'predict' in suites:
+        results += run_predict_benchmarks(QUICK_PREDICT_DAYS if quick else PREDICT_DAYS, repeat or 3, log=log)
+    if 'batch' in suites:
+        results += run_batch_benchmarks(QUICK_BATCH_CASES if quick else BATCH_CASES, repeat or 1, log=log)
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment(),
+        'quick': quick,
+        'results': results,
+    }
+
+
+def environment():
+    """运行环境（比较结果时应在相同环境下运行）"""
+    import numpy
+    import pandas
+    import sklearn
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'pandas': pandas.__version__,
+        'numpy': numpy.__version__,
+        'scikit-learn': sklearn.__version__,
+    }
+
+
+def compare_results(current, baseline, tolerance=0.2, min_seconds=0.01):
+    """
+    与基线结果比较
+    :param current: 本次的报告或结果列表
+    :param baseline: 基线报告或结果列表
+    :param tolerance: 允许的耗时增加比例，超过视为性能回退
+    :param min_seconds: 两次耗时都低于该值的场景不比较（计时误差较大）
+    :return: 性能回退的场景列表 [{'name', 'baseline', 'current', 'ratio'}]
+    """
+    current = current['results'] if isinstance(current, dict) else current
+    baseline = baseline['results'] if isinstance(baseline, dict) else baseline
+    baseline_seconds = {result['name']: result['seconds'] for result in baseline}
+
+    regressions = []
+    for result in current:
+        before = baseline_seconds.get(result['name'])
+        if before is None or max(before, result['seconds']) < min_seconds:
+            continue
+        ratio = result['seconds'] / before if before else math.inf
+        if ratio > 1 + tolerance:
+            regressions.append({'name': result['name'], 'baseline': before,
+                                'current': result['seconds'], 'ratio': round(ratio, 2)})
+    return regressions
+
+
+def load_report(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_report(report, path):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
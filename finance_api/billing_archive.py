@@ -0,0 +1,175 @@
+"""
+账单明细列式归档
+按 服务商/月份 分区保存为Parquet文件，读取时将日期、服务商、产品过滤条件下推到文件和行组，
+只读取需要的列并通过内存映射直接生成pandas DataFrame
+"""
+import os
+import re
+from datetime import datetime
+from .billing_utils import month_slices
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+DEFAULT_ARCHIVE_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'billing_archive')
+
+COLUMNS = ['date', 'product_name', 'resource_id', 'region', 'cost', 'currency', 'subscription_type']
+
+
+class BillingArchive:
+    """
+    Parquet账单归档
+    文件布局为 <root>/provider=<provider>/month=<YYYY-MM>/data.parquet，月内按日期排序
+    """
+
+    def __init__(self, root=None):
+        """
+        :param root: 归档目录，默认读取BILLING_ARCHIVE_DIR
+        """
+        if pa is None:
+            raise RuntimeError("Parquet归档需要安装pyarrow: pip install pyarrow")
+        self.root = root or os.environ.get("BILLING_ARCHIVE_DIR", DEFAULT_ARCHIVE_DIR)
+        self.schema = pa.schema([
+            ('date', pa.date32()),
+            ('product_name', pa.string()),
+            ('resource_id', pa.string()),
+            ('region', pa.string()),
+            ('cost', pa.float64()),
+            ('currency', pa.string()),
+            ('subscription_type', pa.string()),
+        ])
+        self.partitioning = ds.partitioning(
+            pa.schema([('provider', pa.string()), ('month', pa.string())]), flavor='hive'
+        )
+        # 读取时内存映射文件，列数据直接映射到Arrow缓冲区
+        self.filesystem = pafs.LocalFileSystem(use_mmap=True)
+
+    def write(self, provider, start_date, end_date, billing_lines):
+        """
+        归档一段日期范围内的账单明细，替换归档中该范围的已有数据
+        :param provider: 'alibaba' 或 'tencent'
+        :param start_date: 开始日期 (YYYY-MM-DD)
+        :param end_date: 结束日期 (YYYY-MM-DD)
+        :param billing_lines: 账单明细列表或生成器
+        :return: 归档的明细条数
+        """
+        if not re.fullmatch(r'[A-Za-z0-9_-]+', provider):
+            raise ValueError(f"Invalid provider name: {provider}")
+
+        # 按月份收集列数据
+        months = {}
+        for item in billing_lines:
+            date = item.get('date', '')
+            if not (start_date <= date <= end_date) or len(date) != 10:
+                continue
+            columns = months.setdefault(date[:7], {name: [] for name in COLUMNS})
+            columns['date'].append(date)
+            columns['product_name'].append(item.get('product_name', ''))
+            columns['resource_id'].append(item.get('resource_id') or item.get('instance_id') or '')
+            columns['region'].append(item.get('region', ''))
+            columns['cost'].append(item.get('cost', 0.0))
+            columns['currency'].append(item.get('currency', 'CNY'))
+            columns['subscription_type'].append(item.get('subscription_type', ''))
+
+        count = 0
+        for month, slice_start, slice_end, _ in month_slices(start_date, end_date):
+            columns = months.get(month, {name: [] for name in COLUMNS})
+            columns['date'] = pc.strptime(
+                pa.array(columns['date'], pa.string()), format='%Y-%m-%d', unit='s'
+            ).cast(pa.date32())
+            table = pa.table(columns, schema=self.schema)
+            count += table.num_rows
+            self._replace_range(provider, month, slice_start, slice_end, table)
+
+        return count
+
+    def read(self, providers=None, start_date=None, end_date=None, products=None, columns=None):
+        """
+        读取归档的账单明细
+        :param providers: 服务商列表，为空时读取全部
+        :param start_date: 开始日期 (YYYY-MM-DD)
+        :param end_date: 结束日期 (YYYY-MM-DD)
+        :param products: 只读取这些产品
+        :param columns: 需要的列，默认全部列及provider
+        :return: pandas DataFrame，date列为datetime64
+        """
+        columns = columns or ['provider'] + COLUMNS
+        table = self._read_table(columns, providers, start_date, end_date, products)
+        return table.to_pandas(date_as_object=False)
+
+    def read_daily_costs(self, providers=None, start_date=None, end_date=None, products=None):
+        """
+        读取每日成本，在Arrow中按日期汇总
+        :return: 按日期排序的 DataFrame[date, cost]，可直接传给CostPredictionService
+        """
+        table = self._read_table(['date', 'cost'], providers, start_date, end_date, products)
+        daily = table.group_by('date').aggregate([('cost', 'sum')])
+        daily = pa.table({'date': daily['date'], 'cost': daily['cost_sum']}).sort_by('date')
+        return daily.to_pandas(date_as_object=False)
+
+    def _read_table(self, columns, providers, start_date, end_date, products):
+        empty = pa.schema(
+            [('provider', pa.string())] + list(zip(self.schema.names, self.schema.types))
+        ).empty_table().select(columns)
+        if not os.path.isdir(self.root):
+            return empty
+
+        # 服务商和月份过滤命中目录分区，日期和产品过滤使用行组统计信息跳过数据
+        conditions = []
+        if providers:
+            conditions.append(ds.field('provider').isin(list(providers)))
+        if start_date:
+            conditions.append(ds.field('month') >= start_date[:7])
+            conditions.append(ds.field('date') >= pa.scalar(self._to_date(start_date), pa.date32()))
+        if end_date:
+            conditions.append(ds.field('month') <= end_date[:7])
+            conditions.append(ds.field('date') <= pa.scalar(self._to_date(end_date), pa.date32()))
+        if products:
+            conditions.append(ds.field('product_name').isin(list(products)))
+
+        filters = None
+        for condition in conditions:
+            filters = condition if filters is None else filters & condition
+
+        dataset = ds.dataset(
+            self.root, format='parquet', partitioning=self.partitioning, filesystem=self.filesystem
+        )
+        if not dataset.files:
+            return empty
+        return dataset.to_table(columns=columns, filter=filters)
+
+    def _replace_range(self, provider, month, slice_start, slice_end, table):
+        directory = os.path.join(self.root, f'provider={provider}', f'month={month}')
+        path = os.path.join(directory, 'data.parquet')
+
+        if os.path.exists(path):
+            existing = pq.read_table(path, schema=self.schema, memory_map=True)
+            keep = pc.invert(pc.and_(
+                pc.greater_equal(existing['date'], pa.scalar(self._to_date(slice_start), pa.date32())),
+                pc.less_equal(existing['date'], pa.scalar(self._to_date(slice_end), pa.date32()))
+            ))
+            table = pa.concat_tables([existing.filter(keep), table])
+
+        if table.num_rows == 0:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+
+        os.makedirs(directory, exist_ok=True)
+        # 按日期排序使行组的日期统计信息有效；先写临时文件再替换，避免读到未写完的文件
+        # （以.开头的文件不会被读取时的目录扫描发现）
+        table = table.sort_by([('date', 'ascending'), ('product_name', 'ascending')])
+        tmp_path = os.path.join(directory, f'.data.parquet.{os.getpid()}.tmp')
+        pq.write_table(table, tmp_path, compression='zstd', row_group_size=64 * 1024)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _to_date(value):
+        return datetime.strptime(value, '%Y-%m-%d').date()
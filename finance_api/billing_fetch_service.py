@@ -2,34 +2,79 @@
 云账单拉取服务
 支持阿里云和腾讯云账单数据拉取
 """
+import os
 import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 from datetime import datetime, timedelta
-from .alibaba_cloud_service import AlibabaCloudService
-from .tencent_cloud_service import TencentCloudService
-from .cost_prediction_service import CostPredictionService
+from django.db import connections
+from .client_registry import get_alibaba_service, get_tencent_service
+from .billing_store import BillingStore
+from .resilience import ProviderUnavailableError
+from .single_flight import SingleFlight
+
+# 多个服务商并发请求共用的有界线程池
+_provider_executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("BILLING_FETCH_WORKERS", "8")),
+    thread_name_prefix='billing-provider'
+)
 
 
 class BillingFetchService:
     """统一的账单拉取服务"""
     
-    def __init__(self):
+    PROVIDER_NAMES = {
+        'alibaba': 'Alibaba Cloud',
+        'tencent': 'Tencent Cloud'
+    }
+    
+    INIT_FAILED_MESSAGES = {
+        'alibaba': '阿里云服务初始化失败',
+        'tencent': '腾讯云服务初始化失败'
+    }
+    
+    def __init__(self, provider_timeout=None, prediction_service=None):
         self.alibaba_service = None
         self.tencent_service = None
-        self.prediction_service = CostPredictionService()
+        self.store = BillingStore()
+        # 预测服务（pandas、scikit-learn）在首次分析时才创建
+        self._prediction_service = prediction_service
+        # 合并同时进行的相同上游拉取和分析请求
+        self.flights = SingleFlight()
+        # 为False时接口只读取本地存储，不在请求中访问云服务商（由定时同步任务更新本地数据）
+        self.fetch_on_request = os.environ.get("BILLING_FETCH_ON_REQUEST", "true").lower() not in ('0', 'false', 'no')
+        # 同步租约时长（秒），同步进程异常退出后租约到期自动释放
+        self.sync_lock_seconds = int(os.environ.get("BILLING_SYNC_LOCK_TTL", "1800"))
+        # 单个服务商请求的超时时间（秒），超时的服务商不影响其他服务商的结果
+        self.provider_timeout = provider_timeout if provider_timeout is not None else float(
+            os.environ.get("BILLING_PROVIDER_TIMEOUT", "60"))
         
+    @property
+    def prediction_service(self):
+        if self._prediction_service is None:
+            from .cost_prediction_service import CostPredictionService
+            self._prediction_service = CostPredictionService()
+        return self._prediction_service
+    
+    @prediction_service.setter
+    def prediction_service(self, value):
+        self._prediction_service = value
+    
     def initialize_alibaba_cloud(self):
-        """初始化阿里云服务"""
+        """初始化阿里云服务（使用进程内共享的客户端）"""
         try:
-            self.alibaba_service = AlibabaCloudService()
+            self.alibaba_service = get_alibaba_service()
             return True
         except Exception as e:
             print(f"Failed to initialize Alibaba Cloud service: {e}")
             return False
     
     def initialize_tencent_cloud(self):
-        """初始化腾讯云服务"""
+        """初始化腾讯云服务（使用进程内共享的客户端）"""
         try:
-            self.tencent_service = TencentCloudService()
+            self.tencent_service = get_tencent_service()
             return True
         except Exception as e:
             print(f"Failed to initialize Tencent Cloud service: {e}")
@@ -38,52 +83,331 @@ class BillingFetchService:
     def fetch_billing_data(self, provider, start_date, end_date):
         """
         拉取指定云服务商的账单数据
+        优先读取本地存储，仅对缺失或过期的日期请求云服务商
         :param provider: 'alibaba' 或 'tencent'
         :param start_date: 开始日期 (YYYY-MM-DD)
         :param end_date: 结束日期 (YYYY-MM-DD)
-        :return: 账单数据
+        :return: 账单数据，stale 为 true 表示部分日期使用的是本地已过期的数据（云服务商暂时不可用）
+        """
+        if provider not in self.PROVIDER_NAMES:
+            return {'success': False, 'message': f'不支持的云服务商: {provider}'}
+        
+        try:
+            if not self.refresh_store(provider, start_date, end_date):
+                return {'success': False, 'message': self.INIT_FAILED_MESSAGES[provider]}
+        except ProviderUnavailableError as e:
+            return {'success': False, 'message': str(e)}
+        
+        # 单次遍历获取明细及每日/产品/地域汇总
+        summary = self.store.get_billing_summary(provider, start_date, end_date)
+        
+        return {
+            'success': True,
+            'provider': self.PROVIDER_NAMES[provider],
+            'start_date': start_date,
+            'end_date': end_date,
+            'stale': self.fetch_on_request and bool(self.store.missing_days(provider, start_date, end_date)),
+            **summary
+        }
+    
+    def refresh_store(self, provider, start_date, end_date):
         """
+        从云服务商拉取本地缺失或过期的日期并写入本地存储
+        拉取失败（重试后仍失败或服务商熔断）时，如果这些日期在本地都有以前拉取的数据，则继续使用这些数据
+        :param provider: 'alibaba' 或 'tencent'
+        :return: 服务初始化失败且本地没有完整数据时返回False；
+                 拉取失败且本地没有完整数据时抛出ProviderUnavailableError
+        """
+        if not self.fetch_on_request:
+            return True
+        
+        missing_days = self.store.missing_days(provider, start_date, end_date)
+        if not missing_days:
+            return True
+        
+        service = self._get_provider_service(provider)
+        if service:
+            fetch_start, fetch_end = missing_days[0], missing_days[-1]
+            # 同时请求相同日期范围时只向云服务商拉取一次
+            error = self.flights.do(
+                ('refresh_store', provider, fetch_start, fetch_end),
+                self._fetch_into_store, service, provider, fetch_start, fetch_end
+            )
+            if error is None:
+                return True
+        
+        if self.store.has_days(provider, missing_days):
+            return True
+        if not service:
+            return False
+        raise ProviderUnavailableError(f'{self.PROVIDER_NAMES[provider]}账单拉取失败: {error}')
+    
+    def _fetch_into_store(self, service, provider, fetch_start, fetch_end):
+        """
+        从云服务商拉取账单明细并流式写入本地存储；查询失败时不记录拉取结果，下次请求重新拉取
+        :return: 查询失败时返回错误信息，成功时返回None
+        """
+        try:
+            self.store.save_lines(
+                provider, fetch_start, fetch_end,
+                service.iter_billing_lines(fetch_start, fetch_end)
+            )
+        except Exception as e:
+            print(f"Error refreshing {provider} billing data: {e}")
+            return str(e)
+        return None
+    
+    def refresh_providers(self, provider, start_date, end_date):
+        """
+        并发刷新各服务商的本地存储
+        :param provider: 'alibaba', 'tencent', 或 'all'
+        :return: (providers, errors)，可以读取本地数据的服务商列表，
+                 以及失败或超时的服务商 [{'provider', 'message'}]
+        """
+        providers = self._resolve_providers(provider)
+        refreshed, provider_errors = self._run_providers(
+            lambda name: self.refresh_store(name, start_date, end_date), providers
+        )
+        errors = self._provider_errors(providers, refreshed, provider_errors)
+        return [name for name in providers if refreshed.get(name)], errors
+    
+    def get_daily_costs(self, provider, start_date, end_date):
+        """
+        获取每日成本（读取本地存储）
+        :param provider: 'alibaba', 'tencent', 或 'all'
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: (daily_costs, errors)，每日成本字典 {date: cost} 只包含拉取成功的服务商，
+                 errors 为失败或超时的服务商 [{'provider', 'message'}]
+        """
+        providers, errors = self.refresh_providers(provider, start_date, end_date)
+        
+        combined_daily_costs = {}
+        for name in providers:
+            daily_costs = self.store.get_daily_costs(name, start_date, end_date)
+            for date, cost in daily_costs.items():
+                combined_daily_costs[date] = combined_daily_costs.get(date, 0) + cost
+        
+        return dict(sorted(combined_daily_costs.items())), errors
+    
+    def get_grouped_daily_costs(self, provider, start_date, end_date, group_by='product'):
+        """
+        按维度获取每日成本序列（读取本地存储），用于批量预测
+        :param provider: 'alibaba', 'tencent', 或 'all'
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :param group_by: 'product', 'region' 或 'provider'，多个服务商的同名产品/地域合并
+        :return: (series, errors)，series 为 {分组值: {date: cost}}，只包含拉取成功的服务商，
+                 errors 为失败或超时的服务商 [{'provider', 'message'}]
+        """
+        providers, errors = self.refresh_providers(provider, start_date, end_date)
+        return self.store.get_grouped_daily_costs(providers, start_date, end_date, group_by), errors
+    
+    def get_cost_breakdown(self, provider, start_date, end_date, group_by=('product',),
+                           products=None, regions=None):
+        """
+        按维度分解成本（读取成本聚合数据）
+        :param provider: 'alibaba', 'tencent', 或 'all'
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :param group_by: 分组维度列表，取值 'date', 'provider', 'product', 'region'
+        :param products: 只统计这些产品
+        :param regions: 只统计这些地域
+        :return: 分解结果字典
+        """
+        providers = self._resolve_providers(provider)
+        refreshed, provider_errors = self._run_providers(
+            lambda name: self.refresh_store(name, start_date, end_date), providers
+        )
+        refreshed_providers = [name for name in providers if refreshed.get(name)]
+        errors = self._provider_errors(providers, refreshed, provider_errors)
+        
+        rows = self.store.query_cost_rollup(
+            refreshed_providers, start_date, end_date, list(group_by), products, regions
+        )
+        
+        return {
+            'success': bool(refreshed_providers),
+            'provider': provider,
+            'date_range': {
+                'start': start_date,
+                'end': end_date
+            },
+            'group_by': list(group_by),
+            'rows': rows,
+            'total_cost': sum(row['cost'] for row in rows),
+            'errors': errors,
+            'partial': bool(errors)
+        }
+    
+    def iter_billing_lines(self, providers, start_date, end_date):
+        """
+        流式获取账单明细（只读取本地存储），每条明细附带服务商标识
+        :param providers: refresh_providers返回的可以读取的服务商列表
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :return: 账单明细生成器
+        """
+        for name in providers:
+            for item in self.store.iter_billing_lines(name, start_date, end_date):
+                item['provider'] = name
+                yield item
+    
+    def sync_billing_data(self, provider, initial_days=None, resync_days=None):
+        """
+        增量同步账单数据到本地存储
+        只拉取水位之后的日期，以及最近resync_days天仍可能被调整的账单
+        :param provider: 'alibaba' 或 'tencent'
+        :param initial_days: 首次同步拉取的历史天数，默认读取BILLING_SYNC_INITIAL_DAYS
+        :param resync_days: 每次重新同步的最近天数，默认与本地存储的结算天数一致
+        :return: 同步结果
+        """
+        if provider not in self.PROVIDER_NAMES:
+            return {'success': False, 'message': f'不支持的云服务商: {provider}'}
+        
+        service = self._get_provider_service(provider)
+        if not service:
+            return {'success': False, 'message': self.INIT_FAILED_MESSAGES[provider]}
+        
+        if initial_days is None:
+            initial_days = int(os.environ.get("BILLING_SYNC_INITIAL_DAYS", "90"))
+        if resync_days is None:
+            resync_days = self.store.settle_days
+        
+        # 同一服务商账户同时只允许一个同步（包括其他进程中的定时同步）
+        owner = f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+        if not self.store.acquire_sync_lock(provider, service.account_id, owner, self.sync_lock_seconds):
+            return {
+                'success': False,
+                'busy': True,
+                'provider': self.PROVIDER_NAMES[provider],
+                'message': '该账户正在同步中，跳过本次同步'
+            }
+        try:
+            return self._sync_billing_data(provider, service, initial_days, resync_days)
+        finally:
+            self.store.release_sync_lock(provider, service.account_id, owner)
+    
+    def _sync_billing_data(self, provider, service, initial_days, resync_days):
+        """持有同步租约时执行增量同步"""
+        today = datetime.now().date()
+        resync_start = today - timedelta(days=resync_days)
+        state = self.store.get_sync_state(provider, service.account_id)
+        
+        if state.settled_through:
+            start = min(state.settled_through + timedelta(days=1), resync_start)
+        else:
+            start = today - timedelta(days=initial_days)
+        
+        start_date = start.strftime('%Y-%m-%d')
+        end_date = today.strftime('%Y-%m-%d')
+        
+        # 查询失败时不推进水位
+        try:
+            line_count = self.store.save_lines(
+                provider, start_date, end_date,
+                service.iter_billing_lines(start_date, end_date)
+            )
+        except Exception as e:
+            return {
+                'success': False,
+                'provider': self.PROVIDER_NAMES[provider],
+                'message': f'账单拉取失败，水位保持不变: {e}',
+                'settled_through': state.settled_through.strftime('%Y-%m-%d') if state.settled_through else None
+            }
+        
+        # 水位只覆盖本次实际拉取的范围：不超过结束日期，也不早于开始日期的前一天
+        settled_through = max(min(resync_start - timedelta(days=1), today), start - timedelta(days=1))
+        settled_through = settled_through.strftime('%Y-%m-%d')
+        state = self.store.update_sync_state(
+            provider, service.account_id, start_date, end_date, settled_through, line_count
+        )
+        
+        return {
+            'success': True,
+            'provider': self.PROVIDER_NAMES[provider],
+            'start_date': start_date,
+            'end_date': end_date,
+            'line_count': line_count,
+            'settled_through': state.settled_through.strftime('%Y-%m-%d')
+        }
+    
+    def _resolve_providers(self, provider):
+        """将 'all' 或单个服务商名称转换为服务商列表，不支持的服务商返回空列表"""
+        if provider == 'all':
+            return list(self.PROVIDER_NAMES)
+        if provider in self.PROVIDER_NAMES:
+            return [provider]
+        return []
+    
+    def _run_providers(self, func, providers):
+        """
+        并发对多个服务商执行func，单个服务商失败或超时不影响其他服务商
+        :param func: 参数为服务商名称的函数
+        :param providers: 服务商名称列表
+        :return: (results, errors)，分别为 {provider: 返回值} 和 {provider: 错误信息}
+        """
+        results, errors = {}, {}
+        
+        # 单个服务商无需切换线程
+        if len(providers) == 1:
+            try:
+                results[providers[0]] = func(providers[0])
+            except Exception as e:
+                errors[providers[0]] = str(e)
+            return results, errors
+        
+        futures = {
+            provider: _provider_executor.submit(self._call_in_worker, func, provider)
+            for provider in providers
+        }
+        deadline = time.monotonic() + self.provider_timeout
+        
+        for provider, future in futures.items():
+            try:
+                results[provider] = future.result(timeout=max(0, deadline - time.monotonic()))
+            except FuturesTimeoutError:
+                errors[provider] = f'请求超时（{self.provider_timeout:g}秒）'
+            except Exception as e:
+                errors[provider] = str(e)
+        
+        return results, errors
+    
+    def _provider_errors(self, providers, refreshed, provider_errors):
+        """
+        汇总未能读取数据的服务商
+        :param refreshed: _run_providers返回的 {provider: refresh_store结果}
+        :param provider_errors: _run_providers返回的 {provider: 错误信息}
+        :return: [{'provider', 'message'}]
+        """
+        errors = []
+        for name in providers:
+            if name in provider_errors:
+                errors.append({'provider': name, 'message': provider_errors[name]})
+            elif not refreshed.get(name):
+                errors.append({'provider': name, 'message': self.INIT_FAILED_MESSAGES[name]})
+        return errors
+    
+    def _call_in_worker(self, func, provider):
+        """在线程池中执行，结束后关闭该线程的数据库连接"""
+        try:
+            return func(provider)
+        finally:
+            connections.close_all()
+    
+    def _get_provider_service(self, provider):
+        """获取（必要时初始化）云服务商服务"""
         if provider == 'alibaba':
             if not self.alibaba_service:
                 self.initialize_alibaba_cloud()
-            
-            if not self.alibaba_service:
-                return {'success': False, 'message': '阿里云服务初始化失败'}
-            
-            billing_data = self.alibaba_service.get_billing_data(start_date, end_date)
-            daily_costs = self.alibaba_service.get_daily_costs(start_date, end_date)
-            
-            return {
-                'success': True,
-                'provider': 'Alibaba Cloud',
-                'start_date': start_date,
-                'end_date': end_date,
-                'billing_data': billing_data,
-                'daily_costs': daily_costs,
-                'total_cost': sum(daily_costs.values()) if daily_costs else 0
-            }
-            
-        elif provider == 'tencent':
+            return self.alibaba_service
+        
+        if provider == 'tencent':
             if not self.tencent_service:
                 self.initialize_tencent_cloud()
-            
-            if not self.tencent_service:
-                return {'success': False, 'message': '腾讯云服务初始化失败'}
-            
-            billing_data = self.tencent_service.get_billing_data(start_date, end_date)
-            daily_costs = self.tencent_service.get_daily_costs(start_date, end_date)
-            
-            return {
-                'success': True,
-                'provider': 'Tencent Cloud',
-                'start_date': start_date,
-                'end_date': end_date,
-                'billing_data': billing_data,
-                'daily_costs': daily_costs,
-                'total_cost': sum(daily_costs.values()) if daily_costs else 0
-            }
-        else:
-            return {'success': False, 'message': f'不支持的云服务商: {provider}'}
+            return self.tencent_service
+        
+        return None
     
     def fetch_all_billing_data(self, start_date, end_date):
         """
@@ -95,34 +419,39 @@ class BillingFetchService:
         results = {
             'start_date': start_date,
             'end_date': end_date,
-            'providers': []
+            'providers': [],
+            'errors': []
         }
         
-        # 拉取阿里云数据
-        alibaba_result = self.fetch_billing_data('alibaba', start_date, end_date)
-        if alibaba_result['success']:
-            results['providers'].append(alibaba_result)
+        # 并发拉取各云服务商数据
+        provider_results, errors = self._run_providers(
+            lambda name: self.fetch_billing_data(name, start_date, end_date),
+            list(self.PROVIDER_NAMES)
+        )
+        
+        for provider in self.PROVIDER_NAMES:
+            provider_result = provider_results.get(provider)
+            if provider_result and provider_result['success']:
+                results['providers'].append(provider_result)
+            elif provider_result:
+                results['errors'].append({'provider': provider, 'message': provider_result['message']})
+            elif provider in errors:
+                results['errors'].append({'provider': provider, 'message': errors[provider]})
         
-        # 拉取腾讯云数据
-        tencent_result = self.fetch_billing_data('tencent', start_date, end_date)
-        if tencent_result['success']:
-            results['providers'].append(tencent_result)
+        results['partial'] = bool(results['errors'])
+        results['stale'] = any(p['stale'] for p in results['providers'])
         
         # 计算总成本
         total_cost = sum(p.get('total_cost', 0) for p in results['providers'])
         results['total_cost'] = total_cost
         
-        # 合并每日成本
-        combined_daily_costs = {}
-        for provider_data in results['providers']:
-            daily_costs = provider_data.get('daily_costs', {})
-            for date, cost in daily_costs.items():
-                if date in combined_daily_costs:
-                    combined_daily_costs[date] += cost
-                else:
-                    combined_daily_costs[date] = cost
-        
-        results['combined_daily_costs'] = combined_daily_costs
+        # 合并每日/产品/地域成本
+        for key in ('daily_costs', 'product_costs', 'region_costs'):
+            combined = {}
+            for provider_data in results['providers']:
+                for name, cost in provider_data.get(key, {}).items():
+                    combined[name] = combined.get(name, 0) + cost
+            results[f'combined_{key}'] = dict(sorted(combined.items())) if key == 'daily_costs' else combined
         
         return results
     
@@ -133,34 +462,36 @@ class BillingFetchService:
         :param start_date: 开始日期
         :param end_date: 结束日期
         :param prediction_days: 预测未来多少天
-        :return: 完整的分析和预测结果
+        :return: 完整的分析和预测结果，timings_ms 为各阶段耗时（毫秒）
         """
-        # 拉取账单数据
-        if provider == 'all':
-            billing_result = self.fetch_all_billing_data(start_date, end_date)
-            daily_costs = billing_result.get('combined_daily_costs', {})
-        else:
-            billing_result = self.fetch_billing_data(provider, start_date, end_date)
-            daily_costs = billing_result.get('daily_costs', {})
+        started = time.perf_counter()
+        
+        # 读取每日成本
+        daily_costs, errors = self.get_daily_costs(provider, start_date, end_date)
+        fetch_ms = round((time.perf_counter() - started) * 1000, 2)
         
         if not daily_costs:
             return {
                 'success': False,
-                'message': '无法获取账单数据'
+                'message': '无法获取账单数据',
+                'errors': errors
             }
         
+        # 每日成本只准备一次，各分析阶段共享
+        pipeline = self.prediction_service.analysis_pipeline(daily_costs)
+        
         # 每日成本分析
-        daily_analysis = self.prediction_service.daily_cost_analysis(daily_costs)
+        daily_analysis = pipeline.daily_cost_analysis()
         
         # 成本预测
-        predictions = self.prediction_service.predict_costs(
-            daily_costs, 
+        predictions = pipeline.predict_costs(
             days_ahead=prediction_days,
-            method='ensemble'
+            method='ensemble',
+            provider=provider
         )
         
         # 异常检测
-        anomalies = self.prediction_service.detect_anomalies(daily_costs)
+        anomalies = pipeline.detect_anomalies()
         
         return {
             'success': True,
@@ -170,48 +501,47 @@ class BillingFetchService:
                 'end': end_date
             },
             'billing_summary': {
-                'total_cost': billing_result.get('total_cost', 0),
+                'total_cost': sum(daily_costs.values()),
                 'days_count': len(daily_costs)
             },
             'daily_analysis': daily_analysis,
             'predictions': predictions,
-            'anomalies': anomalies
+            'anomalies': anomalies,
+            'errors': errors,
+            'partial': bool(errors),
+            'timings_ms': {
+                'fetch': fetch_ms,
+                **pipeline.timings,
+                'total': round((time.perf_counter() - started) * 1000, 2)
+            }
         }
     
     def get_account_balances(self):
         """获取所有云账户余额"""
         balances = []
         
-        # 阿里云余额
-        if not self.alibaba_service:
-            self.initialize_alibaba_cloud()
-        
-        if self.alibaba_service:
-            alibaba_balance = self.alibaba_service.get_account_balance()
-            if alibaba_balance is not None:
-                balances.append({
-                    'provider': 'Alibaba Cloud',
-                    'balance': alibaba_balance,
-                    'currency': 'CNY'
-                })
+        def query_balance(provider):
+            service = self._get_provider_service(provider)
+            return service.get_account_balance() if service else None
         
-        # 腾讯云余额
-        if not self.tencent_service:
-            self.initialize_tencent_cloud()
+        # 并发查询各云服务商余额
+        provider_balances, errors = self._run_providers(query_balance, list(self.PROVIDER_NAMES))
         
-        if self.tencent_service:
-            tencent_balance = self.tencent_service.get_account_balance()
-            if tencent_balance is not None:
+        for provider, name in self.PROVIDER_NAMES.items():
+            balance = provider_balances.get(provider)
+            if balance is not None:
                 balances.append({
-                    'provider': 'Tencent Cloud',
-                    'balance': tencent_balance,
+                    'provider': name,
+                    'balance': balance,
                     'currency': 'CNY'
                 })
         
         return {
             'success': True,
             'balances': balances,
-            'total_balance': sum(b['balance'] for b in balances)
+            'total_balance': sum(b['balance'] for b in balances),
+            'errors': [{'provider': p, 'message': m} for p, m in errors.items()],
+            'partial': bool(errors)
         }
     
     def export_to_json(self, data, filename):
@@ -223,6 +553,30 @@ class BillingFetchService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    def export_to_parquet(self, provider, start_date, end_date, archive_dir=None):
+        """
+        将账单明细导出到Parquet归档（按服务商/月份分区，替换归档中该日期范围的已有数据）
+        :param provider: 'alibaba', 'tencent', 或 'all'
+        :param start_date: 开始日期
+        :param end_date: 结束日期
+        :param archive_dir: 归档目录，默认读取BILLING_ARCHIVE_DIR
+        :return: 导出结果
+        """
+        try:
+            from .billing_archive import BillingArchive
+            archive = BillingArchive(archive_dir)
+            line_counts = {}
+            for name in self._resolve_providers(provider):
+                if not self.refresh_store(name, start_date, end_date):
+                    continue
+                line_counts[name] = archive.write(
+                    name, start_date, end_date,
+                    self.store.iter_billing_lines(name, start_date, end_date)
+                )
+            return {'success': True, 'archive_dir': archive.root, 'line_counts': line_counts}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+    
     def get_last_n_days(self, days=30):
         """获取最近N天的日期范围"""
         end_date = datetime.now()
@@ -0,0 +1,109 @@
+"""
+账单分页并发拉取
+"""
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+
+class Prefetched:
+    """已获取的分页结果，放入请求序列中时不再发起请求"""
+
+    def __init__(self, value):
+        self.value = value
+
+
+class ConcurrentPager:
+    """
+    并发分页拉取器
+    按顺序返回结果，同时在后台预取后续分页，同一时间最多max_in_flight个请求在途
+    """
+
+    def __init__(self, max_workers=4, max_in_flight=None):
+        """
+        :param max_workers: 最大并发请求数
+        :param max_in_flight: 最多预取的请求数，默认为max_workers的2倍
+        """
+        self.max_workers = max(1, max_workers)
+        self.max_in_flight = max_in_flight or self.max_workers * 2
+        self._executor = None
+
+    def __enter__(self):
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix='billing-pager'
+        )
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+    def map_ordered(self, calls):
+        """
+        并发执行请求并按提交顺序返回结果
+        :param calls: 无参数可调用对象或Prefetched的可迭代序列，可以是惰性生成器
+        :return: 结果生成器
+        """
+        calls = iter(calls)
+        pending = deque()
+
+        for call in calls:
+            pending.append(self._submit(call))
+            if len(pending) >= self.max_in_flight:
+                break
+
+        try:
+            while pending:
+                result = pending.popleft().result()
+                # 取走一个结果后补充一个请求，保持预取窗口
+                for call in calls:
+                    pending.append(self._submit(call))
+                    break
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+    def iter_paged(self, queries, fetch_page, page_size):
+        """
+        并发拉取多个分页查询
+        先并发查询每个查询的第一页获取总条数，再并发预取剩余分页
+        :param queries: 查询参数列表（如月份）
+        :param fetch_page: fetch_page(query, page, need_total) -> (items, total)，
+                           page从0开始，未请求或未返回总条数时total为None
+        :param page_size: 每页条数
+        :return: (query, items) 生成器，按查询和分页顺序返回
+        """
+        queries = list(queries)
+        first_pages = self.map_ordered(
+            partial(fetch_page, query, 0, True) for query in queries
+        )
+
+        def page_calls():
+            for query, (items, total) in zip(queries, first_pages):
+                yield Prefetched((query, items))
+
+                if total is not None:
+                    for page in range(1, (total + page_size - 1) // page_size):
+                        yield partial(self._fetch_page, fetch_page, query, page)
+                    continue
+
+                # 未返回总条数时逐页查询，直到不足一页
+                page = 1
+                while len(items) >= page_size:
+                    items, _ = fetch_page(query, page, False)
+                    yield Prefetched((query, items))
+                    page += 1
+
+        return self.map_ordered(page_calls())
+
+    def _fetch_page(self, fetch_page, query, page):
+        items, _ = fetch_page(query, page, False)
+        return query, items
+
+    def _submit(self, call):
+        if isinstance(call, Prefetched):
+            future = Future()
+            future.set_result(call.value)
+            return future
+        return self._executor.submit(call)
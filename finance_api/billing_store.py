@@ -0,0 +1,380 @@
+"""
+本地账单存储
+将云服务商拉取的账单明细持久化到数据库，分析接口直接读取本地数据
+"""
+import os
+import pickle
+import tempfile
+from datetime import datetime, timedelta
+from django.db import transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+from .analysis_cache import analysis_cache
+from .billing_utils import summarize_billing_data
+from .metrics import metrics
+from .models import BillingLine, BillingDay, BillingCostRollup, BillingSyncState
+
+
+class BillingStore:
+    """账单明细的本地存储"""
+
+    # 入库时每批处理的明细条数（同时受SQLite单条语句参数个数限制）
+    CHUNK_SIZE = 500
+
+    # 成本聚合查询的维度及对应字段
+    ROLLUP_DIMENSIONS = {
+        'date': 'date',
+        'provider': 'provider',
+        'product': 'product_name',
+        'region': 'region'
+    }
+
+    def __init__(self, ttl_seconds=None, settle_days=None):
+        # 近期账单仍会被云服务商调整，缓存超过ttl后需重新拉取
+        self.ttl_seconds = ttl_seconds if ttl_seconds is not None else int(
+            os.environ.get("BILLING_STORE_TTL", "3600"))
+        # 账单日期之后超过settle_days才拉取的数据视为已结算，不再重新拉取
+        self.settle_days = settle_days if settle_days is not None else int(
+            os.environ.get("BILLING_SETTLE_DAYS", "3"))
+
+    def missing_days(self, provider, start_date, end_date):
+        """
+        获取本地缺失或已过期的日期
+        :param provider: 'alibaba' 或 'tencent'
+        :param start_date: 开始日期 (YYYY-MM-DD)
+        :param end_date: 结束日期 (YYYY-MM-DD)
+        :return: 需要重新拉取的日期列表 (YYYY-MM-DD)，按日期升序
+        """
+        now = timezone.now()
+        fresh_days = set()
+        records = BillingDay.objects.filter(
+            provider=provider, date__range=(start_date, end_date)
+        ).values_list('date', 'fetched_at')
+
+        for day, fetched_at in records:
+            settled = fetched_at.date() > day + timedelta(days=self.settle_days)
+            recent = (now - fetched_at).total_seconds() < self.ttl_seconds
+            if settled or recent:
+                fresh_days.add(day)
+
+        return [
+            day.strftime('%Y-%m-%d')
+            for day in self._date_range(start_date, end_date)
+            if day not in fresh_days
+        ]
+
+    def has_days(self, provider, days):
+        """
+        本地是否有这些日期以前拉取的数据（可能已过期）
+        :param days: 日期列表 (YYYY-MM-DD)
+        """
+        return BillingDay.objects.filter(provider=provider, date__in=days).count() == len(set(days))
+
+    def save_lines(self, provider, start_date, end_date, billing_data):
+        """
+        保存一段日期范围内拉取到的账单明细，覆盖该范围内已有数据
+        明细按批写入临时文件，拉取完成后在一个事务中分批入库，内存中只保留一批明细和每日、聚合汇总；
+        拉取过程中不持有数据库写锁，拉取失败时本地已有数据保持不变
+        :param provider: 'alibaba' 或 'tencent'
+        :param start_date: 拉取的开始日期 (YYYY-MM-DD)
+        :param end_date: 拉取的结束日期 (YYYY-MM-DD)
+        :param billing_data: 服务商返回的账单明细列表或生成器，相同键的明细合并后入库
+        :return: 入库的明细条数
+        """
+        with tempfile.TemporaryFile() as spool:
+            chunk = []
+            for line in self._valid_lines(start_date, end_date, billing_data):
+                chunk.append(line)
+                if len(chunk) >= self.CHUNK_SIZE:
+                    pickle.dump(chunk, spool, protocol=pickle.HIGHEST_PROTOCOL)
+                    chunk = []
+            if chunk:
+                pickle.dump(chunk, spool, protocol=pickle.HIGHEST_PROTOCOL)
+            spool.seek(0)
+
+            daily_totals = {}
+            rollups = {}
+            line_count = 0
+            now = timezone.now()
+            with transaction.atomic():
+                BillingLine.objects.filter(
+                    provider=provider, date__range=(start_date, end_date)
+                ).delete()
+                for chunk in self._read_chunks(spool):
+                    line_count += self._write_chunk(provider, chunk, daily_totals, rollups)
+
+                BillingDay.objects.filter(
+                    provider=provider, date__range=(start_date, end_date)
+                ).delete()
+                BillingDay.objects.bulk_create([
+                    BillingDay(
+                        provider=provider,
+                        date=day,
+                        total_cost=daily_totals.get(day.strftime('%Y-%m-%d'), (0.0, 0))[0],
+                        line_count=daily_totals.get(day.strftime('%Y-%m-%d'), (0.0, 0))[1],
+                        fetched_at=now,
+                    )
+                    for day in self._date_range(start_date, end_date)
+                ], batch_size=1000)
+
+                # 只重建本次写入日期范围内的聚合数据
+                BillingCostRollup.objects.filter(
+                    provider=provider, date__range=(start_date, end_date)
+                ).delete()
+                BillingCostRollup.objects.bulk_create([
+                    BillingCostRollup(
+                        provider=provider,
+                        date=date,
+                        product_name=product_name,
+                        region=region,
+                        total_cost=total,
+                        line_count=count,
+                    )
+                    for (date, product_name, region), (total, count) in rollups.items()
+                ], batch_size=1000)
+
+        metrics.inc('finance_billing_rows_ingested_total', line_count, provider=provider)
+        # 账单数据已变化，缓存的分析结果失效
+        analysis_cache.invalidate()
+        return line_count
+
+    @staticmethod
+    def _valid_lines(start_date, end_date, billing_data):
+        """
+        过滤日期范围外的明细
+        :return: (date, product_name, resource_id, region, cost, currency, subscription_type) 生成器
+        """
+        for item in billing_data:
+            date = item.get('date', '')
+            if not (start_date <= date <= end_date) or len(date) != 10:
+                continue
+            yield (
+                date,
+                item.get('product_name', ''),
+                item.get('resource_id') or item.get('instance_id') or '',
+                item.get('region', ''),
+                item.get('cost', 0.0),
+                item.get('currency', 'CNY'),
+                item.get('subscription_type', ''),
+            )
+
+    @staticmethod
+    def _read_chunks(spool):
+        while True:
+            try:
+                yield pickle.load(spool)
+            except EOFError:
+                return
+
+    def _write_chunk(self, provider, chunk, daily_totals, rollups):
+        """
+        写入一批明细，与本次已写入的相同键的明细合并，并累加每日和聚合汇总
+        :return: 新增的明细条数
+        """
+        lines = {}
+        for date, product_name, resource_id, region, cost, currency, subscription_type in chunk:
+            key = (date, product_name, resource_id)
+            if key in lines:
+                lines[key].cost += cost
+            else:
+                lines[key] = BillingLine(
+                    provider=provider,
+                    date=date,
+                    product_name=product_name,
+                    resource_id=resource_id,
+                    region=region,
+                    cost=cost,
+                    currency=currency,
+                    subscription_type=subscription_type,
+                )
+
+        # 该范围的旧数据已删除，已存在的明细只可能来自之前的批次
+        existing = {}
+        for date, product_name, resource_id, region in BillingLine.objects.filter(
+            provider=provider,
+            date__in={key[0] for key in lines},
+            resource_id__in={key[2] for key in lines},
+        ).values_list('date', 'product_name', 'resource_id', 'region'):
+            existing[(date.strftime('%Y-%m-%d'), product_name, resource_id)] = region
+
+        new_lines = []
+        for key, line in lines.items():
+            date, product_name, resource_id = key
+            if key in existing:
+                BillingLine.objects.filter(
+                    provider=provider, date=date, product_name=product_name, resource_id=resource_id
+                ).update(cost=F('cost') + line.cost)
+                region, count = existing[key], 0
+            else:
+                new_lines.append(line)
+                region, count = line.region, 1
+
+            total, lines_on_day = daily_totals.get(date, (0.0, 0))
+            daily_totals[date] = (total + line.cost, lines_on_day + count)
+            rollup_key = (date, product_name, region)
+            total, lines_in_group = rollups.get(rollup_key, (0.0, 0))
+            rollups[rollup_key] = (total + line.cost, lines_in_group + count)
+
+        BillingLine.objects.bulk_create(new_lines)
+        return len(new_lines)
+
+    def get_billing_lines(self, provider, start_date, end_date):
+        """
+        读取本地账单明细
+        :return: 账单数据列表，字段与服务商返回格式一致
+        """
+        return list(self.iter_billing_lines(provider, start_date, end_date))
+
+    def iter_billing_lines(self, provider, start_date, end_date, chunk_size=2000):
+        """
+        流式读取本地账单明细，按批从数据库读取，不缓存整个结果集
+        :return: 账单明细生成器
+        """
+        rows = self._line_rows(provider, start_date, end_date).iterator(chunk_size=chunk_size)
+        for row in rows:
+            yield self._row_to_item(row)
+
+    def get_billing_summary(self, provider, start_date, end_date):
+        """
+        单次遍历读取本地账单明细并汇总
+        :return: {'billing_data', 'daily_costs', 'product_costs', 'region_costs', 'total_cost'}
+        """
+        return summarize_billing_data(self.iter_billing_lines(provider, start_date, end_date))
+
+    def _line_rows(self, provider, start_date, end_date):
+        """查询日期范围内的账单明细记录"""
+        return BillingLine.objects.filter(
+            provider=provider, date__range=(start_date, end_date)
+        ).order_by('date', 'product_name', 'resource_id').values(
+            'date', 'product_name', 'resource_id', 'region',
+            'cost', 'currency', 'subscription_type'
+        )
+
+    def _row_to_item(self, row):
+        """数据库记录转换为账单明细字典"""
+        return {
+            'date': row['date'].strftime('%Y-%m-%d'),
+            'product_name': row['product_name'],
+            'cost': row['cost'],
+            'currency': row['currency'],
+            'resource_id': row['resource_id'],
+            'region': row['region'],
+            'subscription_type': row['subscription_type']
+        }
+
+    def get_daily_costs(self, provider, start_date, end_date):
+        """
+        读取本地每日成本汇总
+        :return: 每日成本字典 {date: cost}，不包含没有账单明细的日期
+        """
+        rows = BillingDay.objects.filter(
+            provider=provider, date__range=(start_date, end_date), line_count__gt=0
+        ).order_by('date').values_list('date', 'total_cost')
+
+        return {day.strftime('%Y-%m-%d'): cost for day, cost in rows}
+
+    def get_grouped_daily_costs(self, providers, start_date, end_date, group_by):
+        """
+        按维度读取本地每日成本（读取成本聚合数据），多个服务商的同名产品/地域合并
+        :param providers: 服务商列表
+        :param group_by: 分组维度 'product', 'region' 或 'provider'
+        :return: {分组值: {date: cost}}，不包含分组值为空的明细
+        """
+        grouped = {}
+        for row in self.query_cost_rollup(providers, start_date, end_date, ['date', group_by]):
+            if row[group_by]:
+                grouped.setdefault(row[group_by], {})[row['date']] = row['cost']
+        return grouped
+
+    def query_cost_rollup(self, providers, start_date, end_date, group_by=(), products=None, regions=None):
+        """
+        按维度查询成本聚合数据，不扫描账单明细
+        :param providers: 服务商列表
+        :param start_date: 开始日期 (YYYY-MM-DD)
+        :param end_date: 结束日期 (YYYY-MM-DD)
+        :param group_by: 分组维度列表，取值 'date', 'provider', 'product', 'region'，为空时只返回总计
+        :param products: 只统计这些产品
+        :param regions: 只统计这些地域
+        :return: [{维度: 值, 'cost': 成本, 'line_count': 明细条数}]，有日期维度时按日期升序，其余按成本降序
+        """
+        fields = [self.ROLLUP_DIMENSIONS[dimension] for dimension in group_by]
+        rows = BillingCostRollup.objects.filter(
+            provider__in=providers, date__range=(start_date, end_date)
+        )
+        if products:
+            rows = rows.filter(product_name__in=products)
+        if regions:
+            rows = rows.filter(region__in=regions)
+
+        ordering = ['date', '-cost'] if 'date' in fields else ['-cost']
+        rows = rows.values(*fields).annotate(
+            cost=Sum('total_cost'), lines=Sum('line_count')
+        ).order_by(*ordering, *fields)
+
+        result = []
+        for row in rows:
+            if row['cost'] is None:
+                continue
+            item = {
+                dimension: row[field].strftime('%Y-%m-%d') if field == 'date' else row[field]
+                for dimension, field in zip(group_by, fields)
+            }
+            item['cost'] = row['cost']
+            item['line_count'] = row['lines']
+            result.append(item)
+        return result
+
+    def get_sync_state(self, provider, account_id):
+        """
+        获取服务商账户的增量同步水位
+        :return: BillingSyncState，首次同步时settled_through为None
+        """
+        state, _ = BillingSyncState.objects.get_or_create(provider=provider, account_id=account_id)
+        return state
+
+    def update_sync_state(self, provider, account_id, start_date, end_date, settled_through, line_count):
+        """
+        记录一次成功的增量同步，水位只前进不后退
+        :param settled_through: 本次同步后已结算的最后一天 (YYYY-MM-DD)
+        """
+        state = self.get_sync_state(provider, account_id)
+        settled = datetime.strptime(settled_through, '%Y-%m-%d').date()
+        if state.settled_through is None or settled > state.settled_through:
+            state.settled_through = settled
+        state.last_sync_start = start_date
+        state.last_sync_end = end_date
+        state.last_line_count = line_count
+        state.last_synced_at = timezone.now()
+        state.save()
+        return state
+
+    def acquire_sync_lock(self, provider, account_id, owner, lease_seconds):
+        """
+        获取服务商账户的同步租约（跨进程，基于数据库条件更新）
+        :param owner: 持有者标识
+        :param lease_seconds: 租约时长，持有者异常退出后到期自动释放
+        :return: 获取成功返回True，其他持有者的租约未到期时返回False
+        """
+        state = self.get_sync_state(provider, account_id)
+        now = timezone.now()
+        acquired = BillingSyncState.objects.filter(pk=state.pk).filter(
+            Q(locked_until__isnull=True) | Q(locked_until__lt=now) | Q(lock_owner=owner)
+        ).update(lock_owner=owner, locked_until=now + timedelta(seconds=lease_seconds))
+        return acquired == 1
+
+    def release_sync_lock(self, provider, account_id, owner):
+        """释放同步租约，只释放自己持有的租约"""
+        BillingSyncState.objects.filter(
+            provider=provider, account_id=account_id, lock_owner=owner
+        ).update(lock_owner='', locked_until=None)
+
+    def _date_range(self, start_date, end_date):
+        """生成日期列表（包含首尾）"""
+        current = datetime.strptime(start_date, '%Y-%m-%d').date()
+        end = datetime.strptime(end_date, '%Y-%m-%d').date()
+
+        days = []
+        while current <= end:
+            days.append(current)
+            current += timedelta(days=1)
+        return days
@@ -0,0 +1,117 @@
+"""
+账单处理公共工具
+"""
+from datetime import datetime, timedelta
+
+
+def month_slices(start_date, end_date):
+    """
+    将日期范围按自然月切分
+    :param start_date: 开始日期 (YYYY-MM-DD)
+    :param end_date: 结束日期 (YYYY-MM-DD)
+    :return: [(month, slice_start, slice_end, full_month)]，month为YYYY-MM，
+             full_month表示该切片是否覆盖整个自然月
+    """
+    slices = []
+    current = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+
+    while current <= end:
+        month_start = current.replace(day=1)
+        if month_start.month == 12:
+            next_month = month_start.replace(year=month_start.year + 1, month=1)
+        else:
+            next_month = month_start.replace(month=month_start.month + 1)
+        month_end = next_month - timedelta(days=1)
+
+        slice_end = min(month_end, end)
+        slices.append((
+            month_start.strftime('%Y-%m'),
+            current.strftime('%Y-%m-%d'),
+            slice_end.strftime('%Y-%m-%d'),
+            current == month_start and slice_end == month_end
+        ))
+        current = next_month
+
+    return slices
+
+
+def date_range(start_date, end_date):
+    """生成日期字符串列表（包含首尾）"""
+    current = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+
+    days = []
+    while current <= end:
+        days.append(current.strftime('%Y-%m-%d'))
+        current += timedelta(days=1)
+    return days
+
+
+class BillingAggregator:
+    """
+    账单汇总器
+    单次遍历账单明细，同时计算每日、产品、地域成本
+    """
+
+    def __init__(self):
+        self.daily_costs = {}
+        self.product_costs = {}
+        self.region_costs = {}
+        self.total_cost = 0.0
+        self.line_count = 0
+
+    def add(self, item):
+        """累加一条账单明细"""
+        cost = item.get('cost', 0.0)
+        date = item.get('date', '')
+        product_name = item.get('product_name', '')
+        region = item.get('region', '')
+
+        self.daily_costs[date] = self.daily_costs.get(date, 0) + cost
+        if product_name:
+            self.product_costs[product_name] = self.product_costs.get(product_name, 0) + cost
+        if region:
+            self.region_costs[region] = self.region_costs.get(region, 0) + cost
+        self.total_cost += cost
+        self.line_count += 1
+
+    def summary(self):
+        """
+        获取汇总结果
+        :return: {'daily_costs', 'product_costs', 'region_costs', 'total_cost'}
+        """
+        return {
+            'daily_costs': dict(sorted(self.daily_costs.items())),
+            'product_costs': dict(sorted(self.product_costs.items(), key=lambda x: x[1], reverse=True)),
+            'region_costs': dict(sorted(self.region_costs.items(), key=lambda x: x[1], reverse=True)),
+            'total_cost': self.total_cost
+        }
+
+
+def summarize_billing_data(billing_lines):
+    """
+    单次遍历账单明细，返回明细及汇总结果
+    :param billing_lines: 账单明细列表或生成器
+    :return: {'billing_data', 'daily_costs', 'product_costs', 'region_costs', 'total_cost'}
+    """
+    aggregator = BillingAggregator()
+    billing_data = []
+    for item in billing_lines:
+        billing_data.append(item)
+        aggregator.add(item)
+
+    return {'billing_data': billing_data, **aggregator.summary()}
+
+
+def aggregate_daily_costs(billing_lines):
+    """
+    流式汇总每日成本，不保留账单明细
+    :param billing_lines: 账单明细列表或生成器
+    :return: 每日成本字典 {date: cost}
+    """
+    daily_costs = {}
+    for item in billing_lines:
+        date = item.get('date', '')
+        daily_costs[date] = daily_costs.get(date, 0) + item.get('cost', 0.0)
+    return dict(sorted(daily_costs.items()))
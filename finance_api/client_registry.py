@@ -0,0 +1,52 @@
+"""
+云服务商客户端注册表
+进程内共享云服务商服务实例（及其SDK客户端和HTTP连接池），首次使用时线程安全地初始化
+"""
+import threading
+from django.utils.module_loading import import_string
+
+# 服务类（及云服务商SDK）在首次使用时才导入，只访问一家云服务商的进程不加载另一家的SDK
+SERVICE_CLASSES = {
+    'alibaba': 'finance_api.alibaba_cloud_service.AlibabaCloudService',
+    'tencent': 'finance_api.tencent_cloud_service.TencentCloudService'
+}
+
+_services = {}
+_lock = threading.Lock()
+
+
+def get_service(provider):
+    """
+    获取共享的云服务商服务实例
+    :param provider: 'alibaba' 或 'tencent'
+    :return: 服务实例，初始化失败时抛出异常，下次调用会重新初始化
+    """
+    service = _services.get(provider)
+    if service is not None:
+        return service
+
+    with _lock:
+        service = _services.get(provider)
+        if service is None:
+            service_class = SERVICE_CLASSES[provider]
+            if isinstance(service_class, str):
+                service_class = import_string(service_class)
+            service = service_class()
+            _services[provider] = service
+        return service
+
+
+def get_alibaba_service():
+    """获取共享的阿里云服务实例"""
+    return get_service('alibaba')
+
+
+def get_tencent_service():
+    """获取共享的腾讯云服务实例"""
+    return get_service('tencent')
+
+
+def reset_services():
+    """清空已创建的服务实例（凭证变更后调用）"""
+    with _lock:
+        _services.clear()
@@ -1,83 +1,185 @@
+import os
+import time
 import pandas as pd
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime, timedelta
 from sklearn.linear_model import LinearRegression
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
+from sklearn.base import clone
 import warnings
+from .analysis_cache import analysis_cache, cached_analysis
+from .metrics import metrics
+from .model_registry import ModelRegistry, model_registry
 warnings.filterwarnings('ignore')
 
+
+class InvalidSeriesError(ValueError):
+    """批量预测的输入序列无法解析（日期或成本格式错误）"""
+
+
+def _fit_models(templates, X, y):
+    """
+    训练模型（可在进程池的子进程中执行）
+    :param templates: 未训练的模型模板 {name: model}
+    :return: 训练好的模型字典 {name: model}，失败时返回None
+    """
+    fitted = {}
+    for name, template in templates.items():
+        model = clone(template)
+        try:
+            model.fit(X, y)
+        except Exception as e:
+            print(f"Error training {name} model: {e}")
+            return None
+        fitted[name] = model
+    return fitted
+
+
+def _fit_predict_models(template, tasks):
+    """
+    训练模型并预测（在进程池的子进程中执行）
+    :param template: 未训练的模型模板
+    :param tasks: [(X, y, X_future)]
+    :return: 预测值数组列表，与tasks顺序一致
+    """
+    results = []
+    for X, y, X_future in tasks:
+        model = clone(template)
+        model.fit(X, y)
+        results.append(model.predict(X_future))
+    return results
+
+
 class CostPredictionService:
     """
     云成本预测服务
     支持多种预测算法：线性回归、移动平均、Prophet时间序列
     """
+
+    FEATURE_COLS = ['day_of_week', 'day_of_month', 'month', 'days_since_start',
+                    'cost_ma7', 'cost_ma30', 'cost_std7']
+    LEVEL_DESCRIPTIONS = {'high': '成本偏高', 'low': '成本偏低', 'normal': '成本正常'}
     
-    def __init__(self):
-        self.scaler = StandardScaler()
+    def __init__(self, cache=analysis_cache, model_registry=model_registry, fit_executor=None):
+        """
+        :param cache: 分析结果缓存，为None时每次重新计算
+        :param model_registry: 训练模型注册表，为None时每次重新训练
+        :param fit_executor: 训练模型的进程池（需有submit方法），为None时在当前线程中训练
+        """
+        self.cache = cache
+        self.model_registry = model_registry
+        self.fit_executor = fit_executor
+        # 模型模板，训练时复制后拟合，多个请求共享的服务实例不会被修改
         self.models = {
             'linear': LinearRegression(),
             'random_forest': RandomForestRegressor(n_estimators=100, random_state=42)
         }
         
-    def prepare_data(self, daily_costs):
+    def prepare_data(self, daily_costs, lightweight=False):
         """
         准备训练数据
-        :param daily_costs: 字典 {date: cost}
+        :param daily_costs: 字典 {date: cost}，或包含date、cost列的DataFrame（如Parquet归档读取结果，
+                            同一天的多行会合并）
+        :param lightweight: 只返回按日期排序的date和cost列，不计算模型特征（用于统计分析）
         :return: DataFrame with features
         """
-        if not daily_costs:
+        if daily_costs is None or len(daily_costs) == 0:
             return None
             
         # 转换为DataFrame
-        df = pd.DataFrame(list(daily_costs.items()), columns=['date', 'cost'])
-        df['date'] = pd.to_datetime(df['date'])
-        df = df.sort_values('date').reset_index(drop=True)
+        with metrics.timer('finance_prepare_data_seconds', stage='frame'):
+            if isinstance(daily_costs, pd.DataFrame):
+                df = daily_costs.groupby('date', as_index=False, sort=False)['cost'].sum()
+                df['date'] = pd.to_datetime(df['date'])
+            else:
+                df = pd.DataFrame({
+                    'date': pd.to_datetime(list(daily_costs.keys())),
+                    'cost': list(daily_costs.values())
+                })
+            df = df.sort_values('date').reset_index(drop=True)
         
-        # 创建特征
-        df['day_of_week'] = df['date'].dt.dayofweek
-        df['day_of_month'] = df['date'].dt.day
-        df['month'] = df['date'].dt.month
-        df['days_since_start'] = (df['date'] - df['date'].min()).dt.days
+        if lightweight:
+            return df
         
-        # 滚动统计特征
-        df['cost_ma7'] = df['cost'].rolling(window=7, min_periods=1).mean()
-        df['cost_ma30'] = df['cost'].rolling(window=30, min_periods=1).mean()
-        df['cost_std7'] = df['cost'].rolling(window=7, min_periods=1).std().fillna(0)
+        return self.add_features(df)
+    
+    def add_features(self, df):
+        """
+        为按日期排序的date、cost数据添加模型特征列
+        :param df: prepare_data(lightweight=True)返回的DataFrame，原地添加特征列
+        :return: DataFrame with features
+        """
+        with metrics.timer('finance_prepare_data_seconds', stage='features'):
+            # 创建特征
+            df['day_of_week'] = df['date'].dt.dayofweek
+            df['day_of_month'] = df['date'].dt.day
+            df['month'] = df['date'].dt.month
+            df['days_since_start'] = (df['date'] - df['date'].min()).dt.days
+            
+            # 滚动统计特征
+            df['cost_ma7'] = df['cost'].rolling(window=7, min_periods=1).mean()
+            df['cost_ma30'] = df['cost'].rolling(window=30, min_periods=1).mean()
+            df['cost_std7'] = df['cost'].rolling(window=7, min_periods=1).std().fillna(0)
         
         return df
     
-    def train_models(self, df):
-        """训练预测模型"""
+    def fit_models(self, df):
+        """
+        训练预测模型
+        :param df: prepare_data返回的DataFrame
+        :return: 新训练的模型字典 {name: model}，失败时返回None
+        """
         if df is None or len(df) < 7:
-            return False
-            
-        feature_cols = ['day_of_week', 'day_of_month', 'month', 'days_since_start', 
-                       'cost_ma7', 'cost_ma30', 'cost_std7']
+            return None
         
-        X = df[feature_cols].values
+        X = df[self.FEATURE_COLS].values
         y = df['cost'].values
         
-        # 训练多个模型
-        for name, model in self.models.items():
-            try:
-                model.fit(X, y)
-            except Exception as e:
-                print(f"Error training {name} model: {e}")
-                return False
-        
-        return True
+        with metrics.timer('finance_model_fit_seconds'):
+            if self.fit_executor is not None:
+                try:
+                    return self.fit_executor.submit(_fit_models, self.models, X, y).result()
+                except (OSError, BrokenProcessPool) as e:
+                    # 无法创建子进程或子进程异常退出时在当前线程训练
+                    print(f"Process pool unavailable, training in-process: {e}")
+            
+            return _fit_models(self.models, X, y)
+    
+    def get_models(self, df, provider=None):
+        """
+        获取训练好的模型，注册表中已有相同数据训练的模型时直接复用
+        :param df: prepare_data返回的DataFrame
+        :param provider: 服务商标识，用于区分模型注册表目录
+        :return: 模型字典 {name: model}，失败时返回None
+        """
+        if df is None or len(df) < 7:
+            return None
+        if self.model_registry is None:
+            return self.fit_models(df)
+        
+        fingerprint = ModelRegistry.fingerprint(df[self.FEATURE_COLS].values, df['cost'].values)
+        feature_set = ModelRegistry.feature_set_id(self.FEATURE_COLS, self.models)
+        return self.model_registry.get_or_train(
+            provider, fingerprint, feature_set, lambda: self.fit_models(df)
+        )
     
-    def predict_costs(self, daily_costs, days_ahead=30, method='ensemble'):
+    @cached_analysis
+    def predict_costs(self, daily_costs, days_ahead=30, method='ensemble', provider=None):
         """
         预测未来成本
-        :param daily_costs: 历史每日成本 {date: cost}
+        :param daily_costs: 历史每日成本 {date: cost}，或包含date、cost列的DataFrame
         :param days_ahead: 预测未来多少天
         :param method: 预测方法 'linear', 'random_forest', 'moving_average', 'ensemble'
+        :param provider: 服务商标识，用于区分已训练的模型
         :return: 预测结果字典
         """
-        df = self.prepare_data(daily_costs)
-        
+        return self._predict_from_frame(self.prepare_data(daily_costs), days_ahead, method, provider)
+    
+    def _predict_from_frame(self, df, days_ahead, method, provider):
+        """根据prepare_data返回的DataFrame预测未来成本"""
         if df is None or len(df) < 7:
             return {
                 'success': False,
@@ -85,47 +187,240 @@ class CostPredictionService:
                 'predictions': []
             }
         
-        # 训练模型
-        if not self.train_models(df):
+        # 获取训练好的模型（相同数据复用已训练的模型）
+        models = self.get_models(df, provider)
+        if models is None:
             return {
                 'success': False,
                 'message': '模型训练失败',
                 'predictions': []
             }
         
-        # 生成未来日期
-        last_date = df['date'].max()
-        future_dates = [last_date + timedelta(days=i+1) for i in range(days_ahead)]
+        # 一次性构建整个预测期的特征矩阵，每个模型只调用一次predict
+        horizon = max(days_ahead, 0)
+        costs = df['cost'].to_numpy()
+        future_dates = pd.date_range(df['date'].max() + timedelta(days=1), periods=horizon, freq='D')
+        features = self._create_future_features(df, future_dates)
+        
+        with metrics.timer('finance_predict_seconds', method=method):
+            # 预测期为0天时不调用predict（模型不接受0行的特征矩阵）
+            model_predictions = {
+                name: models[name].predict(features) if horizon else np.empty(0)
+                for name in self._models_for_method(method)
+            }
+            predicted_costs = self._combine_predictions(method, model_predictions, costs, horizon)
+        return self._prediction_result(costs, future_dates, predicted_costs, days_ahead)
+    
+    def prepare_batch_data(self, series, series_col='series_id'):
+        """
+        批量准备多个序列的训练数据，所有序列在一个DataFrame中按组计算特征
+        :param series: {series_id: {date: cost}}，或包含series_col、date、cost列的长格式DataFrame
+                       （同一序列同一天的多行会合并）
+        :param series_col: 长格式DataFrame中的序列标识列
+        :return: 按序列和日期排序的长格式DataFrame，特征与prepare_data一致；
+                 日期或成本无法解析时抛出InvalidSeriesError
+        """
+        if isinstance(series, pd.DataFrame):
+            df = series[[series_col, 'date', 'cost']]
+        else:
+            ids, dates, costs = [], [], []
+            for series_id, daily_costs in series.items():
+                ids.extend([series_id] * len(daily_costs))
+                dates.extend(daily_costs.keys())
+                costs.extend(daily_costs.values())
+            df = pd.DataFrame({series_col: ids, 'date': dates, 'cost': costs})
+        
+        try:
+            df = df.assign(date=pd.to_datetime(df['date']), cost=pd.to_numeric(df['cost']))
+            df = df.groupby([series_col, 'date'], as_index=False, sort=True)['cost'].sum()
+        except (ValueError, TypeError) as e:
+            raise InvalidSeriesError(f'序列的日期或成本格式错误: {e}') from e
+        
+        # 创建特征
+        groups = df.groupby(series_col, sort=False)
+        df['day_of_week'] = df['date'].dt.dayofweek
+        df['day_of_month'] = df['date'].dt.day
+        df['month'] = df['date'].dt.month
+        df['days_since_start'] = (df['date'] - groups['date'].transform('min')).dt.days
+        
+        # 滚动统计特征（按序列分别计算）
+        def rolling(window, func):
+            result = getattr(groups['cost'].rolling(window=window, min_periods=1), func)()
+            return result.reset_index(level=0, drop=True)
         
-        # 构建预测特征
-        predictions = []
+        df['cost_ma7'] = rolling(7, 'mean')
+        df['cost_ma30'] = rolling(30, 'mean')
+        df['cost_std7'] = rolling(7, 'std').fillna(0)
         
-        for future_date in future_dates:
-            features = self._create_future_features(df, future_date)
-            
-            if method == 'ensemble':
-                # 集成多个模型的预测
-                pred_values = []
-                for model in self.models.values():
-                    pred = model.predict([features])[0]
-                    pred_values.append(max(0, pred))  # 确保非负
-                predicted_cost = np.mean(pred_values)
-            elif method in self.models:
-                predicted_cost = max(0, self.models[method].predict([features])[0])
-            elif method == 'moving_average':
-                # 移动平均预测
-                predicted_cost = df['cost'].tail(7).mean()
-            else:
-                predicted_cost = df['cost'].mean()
+        return df
+    
+    def predict_batch(self, series, days_ahead=30, method='ensemble', series_col='series_id',
+                      max_workers=None):
+        """
+        批量预测多个成本序列（按产品、地域、账户等）
+        线性回归对相同长度的序列批量求解，随机森林在进程池中并行训练
+        :param series: {series_id: {date: cost}}，或包含series_col、date、cost列的长格式DataFrame
+        :param days_ahead: 预测未来多少天
+        :param method: 预测方法 'linear', 'random_forest', 'moving_average', 'ensemble'
+        :param series_col: 长格式DataFrame中的序列标识列
+        :param max_workers: 训练随机森林的进程数，默认读取PREDICTION_BATCH_WORKERS，
+                            未配置时为CPU核数，1表示在当前进程训练
+        :return: {series_id: 预测结果}，每个结果与predict_costs的返回格式相同；
+                 日期或成本无法解析时抛出InvalidSeriesError
+        """
+        df = self.prepare_batch_data(series, series_col)
+        horizon = max(days_ahead, 0)
+        feature_values = df[self.FEATURE_COLS].to_numpy(dtype=float)
+        cost_values = df['cost'].to_numpy()
+        
+        results = {}
+        batch = []
+        for series_id, index in df.groupby(series_col, sort=False).indices.items():
+            if len(index) < 7:
+                results[series_id] = {
+                    'success': False,
+                    'message': '历史数据不足，至少需要7天的数据',
+                    'predictions': []
+                }
+                continue
             
-            predictions.append({
-                'date': future_date.strftime('%Y-%m-%d'),
-                'predicted_cost': round(predicted_cost, 2)
+            dates = df['date'].iloc[index]
+            costs = cost_values[index]
+            future_dates = pd.date_range(dates.iloc[-1] + timedelta(days=1), periods=horizon, freq='D')
+            batch.append({
+                'series_id': series_id,
+                'X': feature_values[index],
+                'y': costs,
+                'X_future': self._future_feature_matrix(dates.iloc[0], costs, future_dates),
+                'future_dates': future_dates
             })
         
+        model_predictions = {}
+        for name in self._models_for_method(method):
+            try:
+                if isinstance(self.models[name], LinearRegression):
+                    model_predictions[name] = self._predict_linear_batch(batch)
+                else:
+                    model_predictions[name] = self._predict_models_batch(
+                        self.models[name], batch, max_workers)
+            except Exception as e:
+                print(f"Error training {name} models in batch: {e}")
+                for item in batch:
+                    results[item['series_id']] = {
+                        'success': False,
+                        'message': '模型训练失败',
+                        'predictions': []
+                    }
+                return results
+        
+        for i, item in enumerate(batch):
+            predicted_costs = self._combine_predictions(
+                method,
+                {name: predictions[i] for name, predictions in model_predictions.items()},
+                item['y'],
+                horizon
+            )
+            results[item['series_id']] = self._prediction_result(
+                item['y'], item['future_dates'], predicted_costs, days_ahead)
+        
+        return results
+    
+    def _predict_linear_batch(self, batch):
+        """
+        批量求解线性回归并预测
+        相同长度的序列堆叠后一次求最小二乘解（与LinearRegression相同：中心化后取最小范数解，结果在浮点误差内一致）
+        :return: 预测值数组列表，与batch顺序一致
+        """
+        predictions = [None] * len(batch)
+        groups = {}
+        for i, item in enumerate(batch):
+            groups.setdefault(len(item['y']), []).append(i)
+        
+        for positions in groups.values():
+            X = np.stack([batch[i]['X'] for i in positions])
+            y = np.stack([batch[i]['y'] for i in positions]).astype(float)[:, :, np.newaxis]
+            X_future = np.stack([batch[i]['X_future'] for i in positions])
+            
+            X_mean = X.mean(axis=1, keepdims=True)
+            y_mean = y.mean(axis=1, keepdims=True)
+            X_centered = X - X_mean
+            rcond = np.finfo(float).eps * max(X.shape[1:])
+            coef = np.linalg.pinv(X_centered, rcond=rcond) @ (y - y_mean)
+            intercept = y_mean - X_mean @ coef
+            
+            for i, predicted in zip(positions, (X_future @ coef + intercept)[:, :, 0]):
+                predictions[i] = predicted
+        
+        return predictions
+    
+    def _predict_models_batch(self, template, batch, max_workers=None):
+        """
+        批量训练模型并预测，多个序列分块后在进程池中并行训练
+        :return: 预测值数组列表，与batch顺序一致
+        """
+        if max_workers is None:
+            max_workers = int(os.environ.get("PREDICTION_BATCH_WORKERS", "0")) or os.cpu_count() or 1
+        tasks = [(item['X'], item['y'], item['X_future']) for item in batch]
+        
+        if max_workers <= 1 or len(tasks) <= 1:
+            return _fit_predict_models(template, tasks)
+        
+        # 每个进程分几块任务，减少进程间传输次数的同时保持负载均衡
+        chunk_size = max(1, -(-len(tasks) // (max_workers * 4)))
+        chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+        try:
+            if self.fit_executor is not None:
+                # 复用共享的进程池，不为每个请求启动子进程
+                futures = [self.fit_executor.submit(_fit_predict_models, template, chunk) for chunk in chunks]
+                return [predicted for future in futures for predicted in future.result()]
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(chunks))) as executor:
+                futures = [executor.submit(_fit_predict_models, template, chunk) for chunk in chunks]
+                return [predicted for future in futures for predicted in future.result()]
+        except (OSError, BrokenProcessPool) as e:
+            # 无法创建子进程时在当前进程训练
+            print(f"Process pool unavailable, training in-process: {e}")
+            return _fit_predict_models(template, tasks)
+    
+    def _models_for_method(self, method):
+        """预测方法需要的模型名称"""
+        if method == 'ensemble':
+            return list(self.models)
+        if method in self.models:
+            return [method]
+        return []
+    
+    def _combine_predictions(self, method, model_predictions, costs, horizon):
+        """
+        根据预测方法合并模型预测值
+        :param model_predictions: {模型名称: 预测值数组}
+        :param costs: 历史成本数组（按日期排序）
+        :param horizon: 预测天数
+        :return: 预测成本数组
+        """
+        if method == 'ensemble':
+            # 集成多个模型的预测
+            return np.mean([
+                np.maximum(0, predictions)  # 确保非负
+                for predictions in model_predictions.values()
+            ], axis=0)
+        if method in model_predictions:
+            return np.maximum(0, model_predictions[method])
+        if method == 'moving_average':
+            # 移动平均预测
+            return np.full(horizon, costs[-7:].mean())
+        return np.full(horizon, costs.mean())
+    
+    def _prediction_result(self, costs, future_dates, predicted_costs, days_ahead):
+        """构建预测结果字典"""
+        predicted_costs = np.round(predicted_costs, 2)
+        predictions = [
+            {'date': date, 'predicted_cost': cost}
+            for date, cost in zip(future_dates.strftime('%Y-%m-%d'), predicted_costs.tolist())
+        ]
+        
         # 分析预测趋势
-        recent_avg = df['cost'].tail(7).mean()
-        predicted_avg = np.mean([p['predicted_cost'] for p in predictions])
+        recent_avg = costs[-7:].mean()
+        predicted_avg = predicted_costs.mean() if len(predicted_costs) else np.nan
         
         trend = 'stable'
         if predicted_avg > recent_avg * 1.1:
@@ -140,28 +435,44 @@ class CostPredictionService:
                 'recent_avg_cost': round(recent_avg, 2),
                 'predicted_avg_cost': round(predicted_avg, 2),
                 'trend': trend,
-                'historical_days': len(df),
+                'historical_days': len(costs),
                 'prediction_days': days_ahead
             }
         }
     
-    def _create_future_features(self, df, future_date):
-        """为未来日期创建特征"""
-        last_date = df['date'].max()
-        days_since_start = (future_date - df['date'].min()).days
-        
-        features = [
-            future_date.dayofweek,
-            future_date.day,
-            future_date.month,
-            days_since_start,
-            df['cost'].tail(7).mean(),  # 最近7天平均
-            df['cost'].tail(30).mean() if len(df) >= 30 else df['cost'].mean(),  # 最近30天平均
-            df['cost'].tail(7).std() if len(df) >= 7 else 0  # 最近7天标准差
-        ]
-        
+    def _create_future_features(self, df, future_dates):
+        """
+        为未来日期批量创建特征
+        :param df: prepare_data返回的DataFrame
+        :param future_dates: 未来日期 DatetimeIndex
+        :return: 特征矩阵，每行对应一个日期，列顺序与FEATURE_COLS一致
+        """
+        return self._future_feature_matrix(df['date'].min(), df['cost'].to_numpy(), future_dates)
+    
+    def _future_feature_matrix(self, first_date, costs, future_dates):
+        """
+        为未来日期批量创建特征
+        :param first_date: 历史数据的第一天
+        :param costs: 历史成本数组（按日期排序）
+        :param future_dates: 未来日期 DatetimeIndex
+        :return: 特征矩阵
+        """
+        # 滚动统计特征在整个预测期内保持不变，只计算一次
+        recent = np.array([
+            costs[-7:].mean(),  # 最近7天平均
+            costs[-30:].mean(),  # 最近30天平均（不足30天时为全部平均）
+            costs[-7:].std(ddof=1)  # 最近7天标准差
+        ])
+        
+        features = np.empty((len(future_dates), len(self.FEATURE_COLS)))
+        features[:, 0] = future_dates.dayofweek
+        features[:, 1] = future_dates.day
+        features[:, 2] = future_dates.month
+        features[:, 3] = (future_dates - first_date).days
+        features[:, 4:] = recent
         return features
     
+    @cached_analysis
     def detect_anomalies(self, daily_costs, threshold=2.0):
         """
         检测异常成本
@@ -169,72 +480,77 @@ class CostPredictionService:
         :param threshold: 异常阈值（标准差倍数）
         :return: 异常日期列表
         """
-        df = self.prepare_data(daily_costs)
-        
+        df = self.prepare_data(daily_costs, lightweight=True)
+        return self._detect_anomalies_from_frame(df, self.series_stats(df), threshold)
+    
+    def _detect_anomalies_from_frame(self, df, stats, threshold):
+        """根据按日期排序的DataFrame和统计指标检测异常成本"""
         if df is None or len(df) < 7:
             return []
         
         # 计算z-score
-        mean_cost = df['cost'].mean()
-        std_cost = df['cost'].std()
+        costs = df['cost'].to_numpy()
+        mean_cost = stats['mean']
+        std_cost = stats['std']
         
         if std_cost == 0:
             return []
         
-        df['z_score'] = (df['cost'] - mean_cost) / std_cost
+        z_scores = (costs - mean_cost) / std_cost
         
         # 找出异常值
-        anomalies = df[abs(df['z_score']) > threshold]
-        
-        return [{
-            'date': row['date'].strftime('%Y-%m-%d'),
-            'cost': round(row['cost'], 2),
-            'z_score': round(row['z_score'], 2),
-            'status': 'high' if row['z_score'] > 0 else 'low'
-        } for _, row in anomalies.iterrows()]
+        mask = np.abs(z_scores) > threshold
+        
+        return self._build_records({
+            'date': self._format_dates(df['date'][mask]),
+            'cost': self._round_values(costs[mask]),
+            'z_score': self._round_values(z_scores[mask]),
+            'status': np.where(z_scores[mask] > 0, 'high', 'low').tolist()
+        })
     
+    @cached_analysis
     def daily_cost_analysis(self, daily_costs):
         """
         每日成本分析，判断成本高低
         :param daily_costs: 每日成本 {date: cost}
         :return: 分析结果
         """
-        df = self.prepare_data(daily_costs)
-        
+        df = self.prepare_data(daily_costs, lightweight=True)
+        return self._daily_analysis_from_frame(df, self.series_stats(df))
+    
+    def _daily_analysis_from_frame(self, df, stats):
+        """根据按日期排序的DataFrame和统计指标分析每日成本"""
         if df is None or len(df) == 0:
             return {
                 'success': False,
                 'message': '无可用数据'
             }
         
-        # 计算统计指标
-        mean_cost = df['cost'].mean()
-        median_cost = df['cost'].median()
-        std_cost = df['cost'].std()
+        # 统计指标
+        mean_cost = stats['mean']
+        median_cost = stats['median']
+        std_cost = stats['std']
         
         # 对每天进行分类
-        daily_analysis = []
-        for _, row in df.iterrows():
-            cost = row['cost']
-            
-            # 判断成本水平
-            if cost > mean_cost + std_cost:
-                level = 'high'
-                description = '成本偏高'
-            elif cost < mean_cost - std_cost:
-                level = 'low'
-                description = '成本偏低'
-            else:
-                level = 'normal'
-                description = '成本正常'
-            
-            daily_analysis.append({
-                'date': row['date'].strftime('%Y-%m-%d'),
-                'cost': round(cost, 2),
-                'level': level,
-                'description': description,
-                'deviation_pct': round(((cost - mean_cost) / mean_cost) * 100, 2)
-            })
+        costs = df['cost'].to_numpy()
+        levels = np.select(
+            [costs > mean_cost + std_cost, costs < mean_cost - std_cost],
+            ['high', 'low'],
+            default='normal'
+        ).tolist()
+        
+        if mean_cost:
+            deviation_pcts = self._round_values(((costs - mean_cost) / mean_cost) * 100)
+        else:
+            deviation_pcts = [0] * len(df)
+        
+        daily_analysis = self._build_records({
+            'date': self._format_dates(df['date']),
+            'cost': self._round_values(costs),
+            'level': levels,
+            'description': [self.LEVEL_DESCRIPTIONS[level] for level in levels],
+            'deviation_pct': deviation_pcts
+        })
         
         return {
             'success': True,
@@ -249,6 +565,30 @@ class CostPredictionService:
             }
         }
     
+    @staticmethod
+    def series_stats(df):
+        """
+        计算成本序列的统计指标
+        :param df: 包含cost列的DataFrame
+        :return: {'mean', 'std', 'median'}，df为空时返回None
+        """
+        if df is None or len(df) == 0:
+            return None
+        return {
+            'mean': df['cost'].mean(),
+            'std': df['cost'].std(),
+            'median': df['cost'].median()
+        }
+    
+    def analysis_pipeline(self, daily_costs):
+        """
+        创建分析流水线，多个分析共享同一次数据准备
+        :param daily_costs: 每日成本 {date: cost}，或包含date、cost列的DataFrame
+        :return: AnalysisPipeline
+        """
+        return AnalysisPipeline(self, daily_costs)
+    
+    @cached_analysis
     def compare_with_baseline(self, daily_costs, baseline_cost):
         """
         与基线成本比较
@@ -256,31 +596,29 @@ class CostPredictionService:
         :param baseline_cost: 基线成本（预算）
         :return: 比较结果
         """
-        df = self.prepare_data(daily_costs)
+        df = self.prepare_data(daily_costs, lightweight=True)
         
         if df is None:
             return {'success': False, 'message': '无可用数据'}
         
-        comparison = []
-        over_budget_days = 0
-        
-        for _, row in df.iterrows():
-            cost = row['cost']
-            diff = cost - baseline_cost
-            diff_pct = (diff / baseline_cost) * 100 if baseline_cost > 0 else 0
-            
-            status = 'over_budget' if cost > baseline_cost else 'within_budget'
-            if cost > baseline_cost:
-                over_budget_days += 1
-            
-            comparison.append({
-                'date': row['date'].strftime('%Y-%m-%d'),
-                'cost': round(cost, 2),
-                'baseline': baseline_cost,
-                'difference': round(diff, 2),
-                'difference_pct': round(diff_pct, 2),
-                'status': status
-            })
+        costs = df['cost'].to_numpy()
+        diffs = costs - baseline_cost
+        over_budget = costs > baseline_cost
+        over_budget_days = int(over_budget.sum())
+        
+        if baseline_cost > 0:
+            diff_pcts = self._round_values((diffs / baseline_cost) * 100)
+        else:
+            diff_pcts = [0] * len(df)
+        
+        comparison = self._build_records({
+            'date': self._format_dates(df['date']),
+            'cost': self._round_values(costs),
+            'baseline': [baseline_cost] * len(df),
+            'difference': self._round_values(diffs),
+            'difference_pct': diff_pcts,
+            'status': np.where(over_budget, 'over_budget', 'within_budget').tolist()
+        })
         
         total_cost = df['cost'].sum()
         total_baseline = baseline_cost * len(df)
@@ -297,3 +635,116 @@ class CostPredictionService:
                 'over_budget_rate': round((over_budget_days / len(df)) * 100, 2)
             }
         }
+    
+    @staticmethod
+    def _build_records(columns):
+        """
+        按列构建每日记录列表
+        :param columns: 有序字典 {字段名: 值列表}，各列长度相同
+        :return: [{字段名: 值}]
+        """
+        keys = list(columns)
+        return [dict(zip(keys, values)) for values in zip(*columns.values())]
+    
+    @staticmethod
+    def _format_dates(dates):
+        """日期列转换为 YYYY-MM-DD 字符串列表"""
+        return dates.dt.strftime('%Y-%m-%d').tolist()
+    
+    @staticmethod
+    def _round_values(values):
+        """数组转换为保留两位小数的Python数值列表，与逐个round的结果一致"""
+        return [round(value, 2) for value in values.tolist()]
+
+
+class AnalysisPipeline:
+    """
+    成本分析流水线
+    每日成本序列只准备一次（排序、构建DataFrame、计算统计指标和模型特征），
+    每日分析、预测和异常检测共享同一份数据，并记录每个阶段的耗时（毫秒）。
+    各阶段结果与CostPredictionService对应方法一致，并共用同一个分析结果缓存
+    """
+    
+    def __init__(self, service, daily_costs):
+        """
+        :param service: CostPredictionService
+        :param daily_costs: 每日成本 {date: cost}，或包含date、cost列的DataFrame
+        """
+        self.service = service
+        self.daily_costs = daily_costs
+        self.timings = {}
+        self._frame = None
+        self._stats = None
+        self._prepared = False
+        self._has_features = False
+    
+    @property
+    def frame(self):
+        """按日期排序的date、cost数据，首次使用时准备"""
+        if not self._prepared:
+            with self._timer('prepare'):
+                self._frame = self.service.prepare_data(self.daily_costs, lightweight=True)
+                self._stats = self.service.series_stats(self._frame)
+            self._prepared = True
+        return self._frame
+    
+    @property
+    def stats(self):
+        """成本序列的统计指标 {'mean', 'std', 'median'}"""
+        self.frame
+        return self._stats
+    
+    @property
+    def feature_frame(self):
+        """带模型特征列的数据，只在预测需要时计算一次"""
+        df = self.frame
+        if df is not None and not self._has_features:
+            with self._timer('prepare'):
+                self.service.add_features(df)
+            self._has_features = True
+        return df
+    
+    def daily_cost_analysis(self):
+        """每日成本分析，结果同CostPredictionService.daily_cost_analysis"""
+        return self._run_stage(
+            'daily_analysis', 'daily_cost_analysis', {},
+            lambda: self.service._daily_analysis_from_frame(self.frame, self.stats)
+        )
+    
+    def predict_costs(self, days_ahead=30, method='ensemble', provider=None):
+        """预测未来成本，结果同CostPredictionService.predict_costs"""
+        return self._run_stage(
+            'predictions', 'predict_costs',
+            {'days_ahead': days_ahead, 'method': method, 'provider': provider},
+            lambda: self.service._predict_from_frame(self.feature_frame, days_ahead, method, provider)
+        )
+    
+    def detect_anomalies(self, threshold=2.0):
+        """检测异常成本，结果同CostPredictionService.detect_anomalies"""
+        return self._run_stage(
+            'anomalies', 'detect_anomalies', {'threshold': threshold},
+            lambda: self.service._detect_anomalies_from_frame(self.frame, self.stats, threshold)
+        )
+    
+    def _run_stage(self, stage, name, params, compute):
+        # 缓存键与服务对应方法相同，流水线和单独接口共用缓存结果
+        prepare_before = self.timings.get('prepare', 0)
+        started = time.perf_counter()
+        cache = self.service.cache
+        if cache is None:
+            result = compute()
+        else:
+            result = cache.get_or_compute(name, self.daily_costs, params, compute)
+        elapsed = (time.perf_counter() - started) * 1000
+        # 阶段耗时不包含首次使用时的数据准备
+        self.timings[stage] = round(elapsed - (self.timings.get('prepare', 0) - prepare_before), 2)
+        return result
+    
+    @contextmanager
+    def _timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - started) * 1000
+            self.timings[stage] = round(self.timings.get(stage, 0) + elapsed, 2)
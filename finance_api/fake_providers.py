@@ -0,0 +1,246 @@
+"""
+本地模拟的云服务商账单接口
+代替阿里云BSS和腾讯云Billing的SDK客户端，按配置的每日明细条数、分页大小和延迟返回确定性的账单数据，
+供基准测试和离线开发使用；服务类的分页、限流和明细转换逻辑与访问真实接口时相同
+"""
+import os
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+PRODUCTS = [
+    ('ECS', 'ecs', 60.0), ('RDS', 'rds', 35.0), ('OSS', 'oss', 8.0),
+    ('CDN', 'cdn', 12.0), ('SLB', 'slb', 5.0), ('Redis', 'redis', 15.0),
+]
+REGIONS = ['cn-hangzhou', 'cn-shanghai', 'cn-beijing', 'cn-shenzhen']
+
+
+class FakeProviderError(Exception):
+    """模拟的接口错误，code与云服务商返回的错误码一致"""
+
+    def __init__(self, code, message=''):
+        super().__init__(f'{code}: {message}' if message else code)
+        self.code = code
+
+
+class FakeBillingData:
+    """确定性的模拟账单明细，每天 rows_per_day 条，相同参数和日期总是生成相同的明细"""
+
+    def __init__(self, rows_per_day=100, seed=0):
+        self.rows_per_day = rows_per_day
+        self.seed = seed
+
+    def day_rows(self, date):
+        """
+        生成某一天的账单明细
+        :param date: YYYY-MM-DD
+        :return: [{'date', 'product_name', 'resource_id', 'region', 'cost'}]
+        """
+        rng = random.Random(f'{self.seed}:{date}')
+        # 工作日成本较高，周末较低
+        weekday_factor = 0.7 if datetime.strptime(date, '%Y-%m-%d').weekday() >= 5 else 1.0
+        rows = []
+        for i in range(self.rows_per_day):
+            product, prefix, base_cost = PRODUCTS[i % len(PRODUCTS)]
+            rows.append({
+                'date': date,
+                'product_name': product,
+                'resource_id': f'{prefix}-{i:06d}',
+                'region': REGIONS[i % len(REGIONS)],
+                'cost': round(base_cost * weekday_factor * rng.uniform(0.8, 1.2), 4),
+            })
+        return rows
+
+    def page(self, start_date, end_date, offset, limit):
+        """
+        按偏移量读取日期范围内的一页明细（只生成该页涉及的日期）
+        :return: (明细列表, 日期范围内的总条数)
+        """
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        days = (datetime.strptime(end_date, '%Y-%m-%d') - start).days + 1
+        total = max(days, 0) * self.rows_per_day
+        if self.rows_per_day <= 0 or offset >= total:
+            return [], total
+
+        rows = []
+        first_day = offset // self.rows_per_day
+        last_day = min(days, (offset + limit - 1) // self.rows_per_day + 1)
+        for day in range(first_day, last_day):
+            rows.extend(self.day_rows((start + timedelta(days=day)).strftime('%Y-%m-%d')))
+        skip = offset - first_day * self.rows_per_day
+        return rows[skip:skip + limit], total
+
+
+class _FakeClient:
+    """模拟客户端的公共部分：注入延迟并统计调用次数"""
+
+    # 限流时返回的错误码
+    THROTTLING_CODE = 'Throttling'
+
+    def __init__(self, data, latency=0.0, jitter=0.0, max_page_size=None, balance=10000.0, error_rate=0.0):
+        """
+        :param data: FakeBillingData
+        :param latency: 每次调用的固定延迟（秒）
+        :param jitter: 随机附加延迟的上限（秒）
+        :param max_page_size: 单页最大条数，请求的分页更大时按该值返回（与真实接口一致）
+        :param balance: 账户余额
+        :param error_rate: 调用返回限流错误的概率
+        """
+        self.data = data
+        self.latency = latency
+        self.jitter = jitter
+        self.max_page_size = max_page_size
+        self.balance = balance
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+        self.items_returned = 0
+        self._lock = threading.Lock()
+
+    def _respond(self, start_date, end_date, offset, limit):
+        """模拟一次分页查询，返回 (明细列表, 总条数)"""
+        if self.max_page_size:
+            limit = min(limit, self.max_page_size)
+        rows, total = self.data.page(start_date, end_date, offset, limit)
+        self._count_call(len(rows))
+        return rows, total
+
+    def _count_call(self, items=0):
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        throttled = self.error_rate > 0 and random.random() < self.error_rate
+        with self._lock:
+            self.calls += 1
+            if throttled:
+                self.errors += 1
+            else:
+                self.items_returned += items
+        if throttled:
+            raise FakeProviderError(self.THROTTLING_CODE, 'Request was denied due to flow control.')
+
+
+class FakeBssClient(_FakeClient):
+    """模拟阿里云BSS客户端（QueryInstanceBill、QueryBill、QueryAccountBalance）"""
+
+    def __init__(self, data, latency=0.0, jitter=0.0, max_page_size=300, balance=10000.0, error_rate=0.0):
+        super().__init__(data, latency, jitter, max_page_size, balance, error_rate)
+
+    def query_instance_bill_with_options(self, request, runtime=None):
+        # 与真实接口一致：按天粒度查询时必须指定BillingDate
+        if getattr(request, 'granularity', None) == 'DAILY' and not request.billing_date:
+            raise FakeProviderError('InvalidParameter', 'BillingDate is mandatory when Granularity is DAILY.')
+        start_date, end_date = self._cycle_range(request.billing_cycle, request.billing_date)
+        return self._page_response(start_date, end_date, request.page_num, request.page_size)
+
+    def query_bill_with_options(self, request, runtime=None):
+        start_date, end_date = self._cycle_range(request.billing_cycle, None)
+        return self._page_response(start_date, end_date, request.page_num, request.page_size)
+
+    def query_account_balance_with_options(self, runtime=None):
+        self._count_call()
+        return SimpleNamespace(body=SimpleNamespace(data=SimpleNamespace(
+            available_amount=f'{self.balance:.2f}')))
+
+    def _page_response(self, start_date, end_date, page_num, page_size):
+        rows, total = self._respond(start_date, end_date, (page_num - 1) * page_size, page_size)
+        items = [
+            SimpleNamespace(
+                billing_date=row['date'], product_name=row['product_name'], pretax_amount=row['cost'],
+                currency='CNY', instance_id=row['resource_id'], subscription_type='PayAsYouGo'
+            )
+            for row in rows
+        ]
+        return SimpleNamespace(body=SimpleNamespace(data=SimpleNamespace(
+            items=SimpleNamespace(item=items), total_count=total)))
+
+    @staticmethod
+    def _cycle_range(billing_cycle, billing_date):
+        if billing_date:
+            return billing_date, billing_date
+        first = datetime.strptime(billing_cycle, '%Y-%m')
+        last = (first.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        return first.strftime('%Y-%m-%d'), last.strftime('%Y-%m-%d')
+
+
+class FakeBillingClient(_FakeClient):
+    """模拟腾讯云Billing客户端（DescribeBillDetail、DescribeBillSummaryByProduct、DescribeAccountBalance）"""
+
+    THROTTLING_CODE = 'RequestLimitExceeded'
+
+    def __init__(self, data, latency=0.0, jitter=0.0, max_page_size=100, balance=1000000, error_rate=0.0):
+        super().__init__(data, latency, jitter, max_page_size, balance, error_rate)
+
+    def DescribeBillDetail(self, request):
+        rows, total = self._respond(request.BeginTime[:10], request.EndTime[:10], request.Offset, request.Limit)
+        details = [
+            SimpleNamespace(
+                PayTime=f"{row['date']} 00:00:00", ProductName=row['product_name'], Cost=str(row['cost']),
+                ResourceId=row['resource_id'], Region=row['region']
+            )
+            for row in rows
+        ]
+        return SimpleNamespace(DetailSet=details, Total=total if request.NeedRecordNum else None)
+
+    def DescribeBillSummaryByProduct(self, request):
+        start_date, end_date = FakeBssClient._cycle_range(request.Month, None)
+        rows, _ = self.data.page(start_date, end_date, 0, self.data.rows_per_day * 31)
+        self._count_call()
+        totals = {}
+        for row in rows:
+            totals[row['product_name']] = totals.get(row['product_name'], 0.0) + row['cost']
+        return SimpleNamespace(SummaryDetail=[
+            SimpleNamespace(ProductName=name, TotalCost=str(round(cost, 2)), RealTotalCost=str(round(cost, 2)))
+            for name, cost in totals.items()
+        ])
+
+    def DescribeAccountBalance(self, request):
+        self._count_call()
+        return SimpleNamespace(Balance=self.balance)
+
+
+def create_fake_service(provider, rows_per_day=100, page_size=None, latency=0.0, jitter=0.0,
+                        concurrency=None, qps=0, seed=0, error_rate=0.0):
+    """
+    创建使用模拟客户端的云服务商服务实例（不调用构造函数，不需要凭证，不访问网络）
+    :param provider: 'alibaba' 或 'tencent'
+    :param rows_per_day: 每天的账单明细条数
+    :param page_size: 单页条数，默认为服务类的PAGE_SIZE
+    :param latency: 每次接口调用的延迟（秒）
+    :param jitter: 随机附加延迟的上限（秒）
+    :param concurrency: 并发请求数，默认读取服务商的并发配置
+    :param qps: 每秒请求数上限，<=0 表示不限流
+    :param seed: 随机种子
+    :param error_rate: 接口调用返回限流错误的概率
+    :return: AlibabaCloudService 或 TencentCloudService，client属性为模拟客户端
+    """
+    from .rate_limiter import ProviderRateLimits
+    from .resilience import CircuitBreaker, ProviderResilience
+
+    data = FakeBillingData(rows_per_day, seed)
+    if provider == 'alibaba':
+        from .alibaba_cloud_service import AlibabaCloudService as service_class
+        client = FakeBssClient(data, latency, jitter, error_rate=error_rate)
+        default_concurrency = os.environ.get("ALIBABA_BILLING_CONCURRENCY", "4")
+    elif provider == 'tencent':
+        from .tencent_cloud_service import TencentCloudService as service_class
+        client = FakeBillingClient(data, latency, jitter, error_rate=error_rate)
+        default_concurrency = os.environ.get("TENCENT_BILLING_CONCURRENCY", "4")
+    else:
+        raise ValueError(f'不支持的云服务商: {provider}')
+
+    service = service_class.__new__(service_class)
+    service.client = client
+    service.runtime = None
+    service.region = 'ap-guangzhou'
+    service.account_id = f'fake-{provider}'
+    service.max_concurrency = concurrency if concurrency is not None else int(default_concurrency)
+    # 只在进程内限流，使用独立的熔断器，不影响真实服务商的共享限流和熔断状态
+    service.rate_limits = ProviderRateLimits(provider, service.account_id, qps, path='')
+    service.resilience = ProviderResilience(provider, breaker=CircuitBreaker())
+    if page_size is not None:
+        service.PAGE_SIZE = page_size
+        client.max_page_size = max(client.max_page_size, page_size)
+    return service
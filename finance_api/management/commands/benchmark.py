@@ -0,0 +1,55 @@
+"""
+离线基准测试（使用本地模拟的云服务商，不需要凭证，不访问网络）
+
+    python manage.py benchmark --output benchmark.json
+    python manage.py benchmark --quick --suite fetch predict
+    python manage.py benchmark --baseline benchmark.json --tolerance 0.25
+"""
+from django.core.management.base import BaseCommand, CommandError
+from finance_api.benchmark import SUITES, compare_results, load_report, run_benchmarks, save_report
+
+
+class Command(BaseCommand):
+    help = '测试账单拉取吞吐量和预测耗时，输出JSON结果并可与基线比较'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suite', nargs='+', choices=SUITES, default=list(SUITES),
+                            help='要运行的测试组 (默认: 全部)')
+        parser.add_argument('--quick', action='store_true', help='使用较小的场景（适合CI）')
+        parser.add_argument('--repeat', type=int, help='每个场景的重复次数，取最短耗时')
+        parser.add_argument('--output', help='保存JSON结果的文件路径')
+        parser.add_argument('--baseline', help='基线JSON结果，有场景耗时增加超过 --tolerance 时以非零状态退出')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='允许的耗时增加比例 (默认: 0.2)')
+
+    def handle(self, *args, **options):
+        baseline = load_report(options['baseline']) if options['baseline'] else None
+
+        report = run_benchmarks(options['suite'], options['quick'], options['repeat'], log=self._log)
+
+        if options['output']:
+            save_report(report, options['output'])
+            self.stdout.write(f"结果已保存到: {options['output']}")
+
+        if baseline is None:
+            return
+
+        regressions = compare_results(report, baseline, options['tolerance'])
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(
+                    f"{regression['name']}: {regression['baseline']:.3f}s -> {regression['current']:.3f}s "
+                    f"(x{regression['ratio']})"
+                ))
+            raise CommandError(f'{len(regressions)} 个场景性能回退超过 {options["tolerance"]:.0%}')
+        self.stdout.write(self.style.SUCCESS('与基线相比没有性能回退'))
+
+    def _log(self, result):
+        throughput = ''
+        if 'rows_per_second' in result:
+            throughput = f"  {result['rows_per_second']:.0f} rows/s"
+            if 'api_calls' in result:
+                throughput += f", {result['api_calls']} calls"
+        elif 'series_per_second' in result:
+            throughput = f"  {result['series_per_second']:.1f} series/s"
+        self.stdout.write(f"{result['name']:<78}{result['seconds'] * 1000:>10.1f} ms{throughput}")
@@ -0,0 +1,39 @@
+"""
+启动耗时报告
+
+    python manage.py startup_report
+    python manage.py startup_report --json
+"""
+import json
+from django.core.management.base import BaseCommand
+from finance_api.startup import measure_startup
+
+
+class Command(BaseCommand):
+    help = '测量Web进程启动及各延迟加载依赖的导入耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+
+    def handle(self, *args, **options):
+        report = measure_startup()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
+            return
+
+        self.stdout.write('各项为前面各项已加载后的增量导入耗时')
+        self.stdout.write(f"{'模块':<42}{'耗时(ms)':>10}  加载时机")
+        for stage in report['stages']:
+            elapsed = 'error' if stage['error'] else f"{stage['ms']:.1f}"
+            self.stdout.write(f"{stage['module']:<42}{elapsed:>10}  {stage['when']}")
+            if stage['error']:
+                self.stdout.write(f"{'':<42}{'':>10}  {stage['error']}")
+
+        heavy = report['heavy_modules_at_boot']
+        boot_ms = sum(stage['ms'] for stage in report['stages'][:2])
+        self.stdout.write(f"\n启动（Django初始化 + URL配置）: {boot_ms:.1f} ms")
+        if heavy:
+            self.stdout.write(self.style.WARNING(f"启动时已加载重量级依赖: {', '.join(heavy)}"))
+        else:
+            self.stdout.write('启动时未加载pandas、scikit-learn、pyarrow及云服务商SDK')
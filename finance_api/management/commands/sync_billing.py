@@ -0,0 +1,61 @@
+"""
+定时同步账单数据
+
+    python manage.py sync_billing                 # 常驻运行，按BILLING_SYNC_INTERVAL周期同步
+    python manage.py sync_billing --once          # 同步一次后退出（适合cron）
+"""
+import signal
+import threading
+from django.core.management.base import BaseCommand
+from finance_api.sync_scheduler import BillingSyncScheduler
+
+
+class Command(BaseCommand):
+    help = '按周期增量同步云服务商账单到本地存储，并预热分析结果'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--provider', choices=['alibaba', 'tencent', 'all'], default='all',
+                            help='云服务商 (默认: all)')
+        parser.add_argument('--interval', type=int,
+                            help='同步周期（秒），默认读取BILLING_SYNC_INTERVAL')
+        parser.add_argument('--resync-days', type=int,
+                            help='每次重新同步的最近天数 (默认: BILLING_SETTLE_DAYS)')
+        parser.add_argument('--warm-days', type=str,
+                            help='同步后预热的历史天数，逗号分隔，默认读取BILLING_SYNC_WARM_DAYS，传空字符串不预热')
+        parser.add_argument('--once', action='store_true',
+                            help='同步一次后退出')
+
+    def handle(self, *args, **options):
+        providers = None if options['provider'] == 'all' else [options['provider']]
+        warm_days = options['warm_days']
+        if warm_days is not None:
+            warm_days = [int(days) for days in warm_days.split(',') if days]
+
+        scheduler = BillingSyncScheduler(
+            providers=providers,
+            interval=options['interval'],
+            resync_days=options['resync_days'],
+            warm_days=warm_days,
+            log=lambda message: self.stdout.write(message)
+        )
+
+        if options['once']:
+            results = scheduler.run_once()
+            failed = [provider for provider, result in results.items() if not result.get('success')]
+            if failed:
+                self.stderr.write(f"同步失败: {', '.join(failed)}")
+            return
+
+        stop_event = threading.Event()
+
+        def stop(signum, frame):
+            self.stdout.write('正在停止，等待进行中的同步结束...')
+            stop_event.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        self.stdout.write(
+            f"开始定时同步 {', '.join(scheduler.providers)}，周期 {scheduler.interval} 秒"
+        )
+        scheduler.run_forever(stop_event)
@@ -0,0 +1,179 @@
+"""
+运行指标
+进程内的轻量计数器、耗时直方图和回调指标，以Prometheus文本格式导出（/api/finance/metrics/）；
+多进程部署时每个进程单独统计，由Prometheus按实例汇总
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# 耗时直方图的分桶上限（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+METRIC_HELP = {
+    'finance_http_request_seconds': 'API请求耗时（秒）',
+    'finance_provider_request_seconds': '云服务商接口调用耗时（秒），账单明细接口每页一次调用',
+    'finance_provider_requests_total': '云服务商接口调用次数',
+    'finance_provider_items_total': '云服务商接口返回的账单明细条数',
+    'finance_provider_rate_limit_wait_seconds': '云服务商接口请求前等待限流令牌的时间（秒）',
+    'finance_provider_retries_total': '云服务商接口因限流或临时错误重试的次数',
+    'finance_provider_circuit_rejections_total': '熔断期间未发起的云服务商接口请求数',
+    'finance_provider_circuit_state': '云服务商熔断器状态（0关闭，1试探，2熔断）',
+    'finance_billing_rows_ingested_total': '写入本地存储的账单明细条数',
+    'finance_analysis_cache_requests_total': '分析结果缓存查询次数',
+    'finance_analysis_cache_hit_ratio': '分析结果缓存命中率',
+    'finance_analysis_cache_entries': '进程内分析结果缓存条数',
+    'finance_model_registry_requests_total': '预测模型获取次数（memory/disk为复用，trained为重新训练）',
+    'finance_prepare_data_seconds': '准备预测数据（构建DataFrame和特征）耗时（秒）',
+    'finance_model_fit_seconds': '训练预测模型耗时（秒）',
+    'finance_predict_seconds': '模型预测耗时（秒）',
+}
+
+
+class MetricsRegistry:
+    """指标注册表（线程安全）"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counters = {}
+        self._histograms = {}
+        self._gauges = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, value=1, **labels):
+        """计数器增加value"""
+        key = (name, self._label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        """记录一次耗时"""
+        key = (name, self._label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+                    break
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """记录代码块耗时到直方图"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    @contextmanager
+    def track(self, histogram, counter, **labels):
+        """
+        记录一次调用的耗时，并按结果计数（status为ok或error，异常继续抛出）
+        :param histogram: 耗时直方图名称
+        :param counter: 调用次数计数器名称
+        """
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            yield
+            status = 'ok'
+        finally:
+            self.observe(histogram, time.perf_counter() - started, **labels)
+            self.inc(counter, status=status, **labels)
+
+    def register_gauge(self, name, callback):
+        """
+        注册导出时计算的指标
+        :param callback: 无参数函数，返回数值，或 [(labels字典, 数值)]
+        """
+        with self._lock:
+            self._gauges[name] = callback
+
+    def counter_value(self, name, **labels):
+        """读取计数器当前值"""
+        with self._lock:
+            return self._counters.get((name, self._label_key(labels)), 0)
+
+    def counter_total(self, name):
+        """计数器所有标签组合的合计"""
+        with self._lock:
+            return sum(value for (counter, _), value in self._counters.items() if counter == name)
+
+    def render(self):
+        """
+        导出Prometheus文本格式
+        :return: 文本
+        """
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: {'buckets': list(h['buckets']), 'sum': h['sum'], 'count': h['count']}
+                          for key, h in self._histograms.items()}
+            gauges = dict(self._gauges)
+
+        lines = []
+        for name in sorted({name for name, _ in counters}):
+            self._header(lines, name, 'counter')
+            for (counter, labels), value in sorted(counters.items()):
+                if counter == name:
+                    lines.append(f'{name}{self._format_labels(labels)} {value}')
+
+        for name in sorted({name for name, _ in histograms}):
+            self._header(lines, name, 'histogram')
+            for (histogram, labels), data in sorted(histograms.items()):
+                if histogram != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(self.buckets, data['buckets']):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{self._format_labels(labels, le=str(bound))} {cumulative}')
+                lines.append(f'{name}_bucket{self._format_labels(labels, le="+Inf")} {data["count"]}')
+                lines.append(f'{name}_sum{self._format_labels(labels)} {data["sum"]}')
+                lines.append(f'{name}_count{self._format_labels(labels)} {data["count"]}')
+
+        for name, callback in sorted(gauges.items()):
+            try:
+                values = callback()
+            except Exception as e:
+                print(f"Error collecting metric {name}: {e}")
+                continue
+            if not isinstance(values, list):
+                values = [({}, values)]
+            self._header(lines, name, 'gauge')
+            for labels, value in values:
+                lines.append(f'{name}{self._format_labels(self._label_key(labels))} {value}')
+
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """清空计数器和直方图（回调指标保留）"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    @staticmethod
+    def _label_key(labels):
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    @staticmethod
+    def _header(lines, name, metric_type):
+        if name in METRIC_HELP:
+            lines.append(f'# HELP {name} {METRIC_HELP[name]}')
+        lines.append(f'# TYPE {name} {metric_type}')
+
+    @staticmethod
+    def _format_labels(labels, **extra):
+        pairs = list(labels) + list(extra.items())
+        if not pairs:
+            return ''
+        return '{' + ','.join(f'{key}="{MetricsRegistry._escape(value)}"' for key, value in pairs) + '}'
+
+    @staticmethod
+    def _escape(value):
+        return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+# 进程内共享的指标注册表
+metrics = MetricsRegistry()
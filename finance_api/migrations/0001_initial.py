@@ -0,0 +1,51 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=32)),
+                ('date', models.DateField()),
+                ('total_cost', models.FloatField(default=0.0)),
+                ('line_count', models.IntegerField(default=0)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BillingLine',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=32)),
+                ('date', models.DateField()),
+                ('product_name', models.CharField(blank=True, default='', max_length=255)),
+                ('resource_id', models.CharField(blank=True, default='', max_length=255)),
+                ('region', models.CharField(blank=True, default='', max_length=64)),
+                ('cost', models.FloatField(default=0.0)),
+                ('currency', models.CharField(default='CNY', max_length=8)),
+                ('subscription_type', models.CharField(blank=True, default='', max_length=32)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['provider', 'date'], name='billing_line_provider_date')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='billingline',
+            constraint=models.UniqueConstraint(fields=('provider', 'date', 'product_name', 'resource_id'), name='uniq_billing_line'),
+        ),
+        migrations.AddConstraint(
+            model_name='billingday',
+            constraint=models.UniqueConstraint(fields=('provider', 'date'), name='uniq_billing_day'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingSyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=32)),
+                ('account_id', models.CharField(blank=True, default='', max_length=128)),
+                ('settled_through', models.DateField(blank=True, null=True)),
+                ('last_sync_start', models.DateField(blank=True, null=True)),
+                ('last_sync_end', models.DateField(blank=True, null=True)),
+                ('last_line_count', models.IntegerField(default=0)),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='billingsyncstate',
+            constraint=models.UniqueConstraint(fields=('provider', 'account_id'), name='uniq_billing_sync_state'),
+        ),
+    ]
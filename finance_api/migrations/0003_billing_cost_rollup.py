@@ -0,0 +1,44 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:45
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def build_rollups(apps, schema_editor):
+    """根据已入库的账单明细生成成本聚合数据"""
+    BillingLine = apps.get_model('finance_api', 'BillingLine')
+    BillingCostRollup = apps.get_model('finance_api', 'BillingCostRollup')
+
+    rows = BillingLine.objects.values('provider', 'date', 'product_name', 'region').annotate(
+        total_cost=Sum('cost'), line_count=Count('id')
+    ).order_by()
+    BillingCostRollup.objects.bulk_create(
+        (BillingCostRollup(**row) for row in rows.iterator()), batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_api', '0002_billing_sync_state'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BillingCostRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('provider', models.CharField(max_length=32)),
+                ('date', models.DateField()),
+                ('product_name', models.CharField(blank=True, default='', max_length=255)),
+                ('region', models.CharField(blank=True, default='', max_length=64)),
+                ('total_cost', models.FloatField(default=0.0)),
+                ('line_count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='billingcostrollup',
+            constraint=models.UniqueConstraint(fields=('provider', 'date', 'product_name', 'region'), name='uniq_billing_cost_rollup'),
+        ),
+        migrations.RunPython(build_rollups, migrations.RunPython.noop),
+    ]
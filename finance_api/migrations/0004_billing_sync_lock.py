@@ -0,0 +1,23 @@
+# Generated by Django 4.2.7 on 2026-10-17 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance_api', '0003_billing_cost_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='billingsyncstate',
+            name='lock_owner',
+            field=models.CharField(blank=True, default='', max_length=128),
+        ),
+        migrations.AddField(
+            model_name='billingsyncstate',
+            name='locked_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,169 @@
+"""
+预测模型注册表
+按 (服务商, 序列指纹, 特征集) 持久化训练好的模型，相同数据的请求直接加载已有模型而不重新训练
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from .metrics import metrics
+
+# 默认保存在用户缓存目录，不写入项目目录
+DEFAULT_MODEL_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    'price_finanle', 'model_store')
+
+
+class ModelRegistry:
+    """
+    训练模型注册表（线程安全）
+    模型文件保存在 model_dir/<provider>/<feature_set>/<fingerprint>.joblib，
+    首次使用时加载并在内存中保留最近使用的模型；已注册的模型只读，不会在请求间被修改
+    """
+
+    def __init__(self, model_dir=None, max_loaded=None, keep_per_provider=None):
+        """
+        :param model_dir: 模型文件目录
+        :param max_loaded: 内存中最多保留的模型组数
+        :param keep_per_provider: 每个服务商和特征集最多保留的模型文件数，超出时删除最旧的
+        """
+        self.model_dir = model_dir or os.environ.get("PREDICTION_MODEL_DIR", DEFAULT_MODEL_DIR)
+        self.max_loaded = max_loaded if max_loaded is not None else int(
+            os.environ.get("PREDICTION_MODEL_CACHE_SIZE", "32"))
+        self.keep_per_provider = keep_per_provider if keep_per_provider is not None else int(
+            os.environ.get("PREDICTION_MODEL_KEEP", "20"))
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    @staticmethod
+    def fingerprint(X, y):
+        """计算训练数据指纹，数据变化时指纹随之变化"""
+        digest = hashlib.sha256()
+        for array in (X, y):
+            digest.update(str(array.shape).encode('ascii'))
+            digest.update(array.astype('float64').tobytes())
+        return digest.hexdigest()[:32]
+
+    @staticmethod
+    def feature_set_id(feature_cols, templates):
+        """特征列和模型参数的标识，特征或超参数变化后不会复用旧模型"""
+        payload = json.dumps({
+            'features': list(feature_cols),
+            'models': {name: repr(model) for name, model in sorted(templates.items())}
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def get_or_train(self, provider, fingerprint, feature_set, train):
+        """
+        获取已训练的模型，不存在时训练并保存
+        :param provider: 服务商标识，用于区分模型目录
+        :param fingerprint: 训练数据指纹
+        :param feature_set: 特征集标识
+        :param train: 无参数的训练函数，返回训练好的模型字典，失败时返回None
+        :return: 模型字典 {name: model}，训练失败时返回None
+        """
+        # 服务商名称来自请求参数，只保留安全字符作为目录名
+        provider_dir = re.sub(r'[^A-Za-z0-9_-]', '_', provider or 'default')
+        path = os.path.join(self.model_dir, provider_dir, feature_set, f'{fingerprint}.joblib')
+
+        models = self._get_loaded(path)
+        if models is not None:
+            metrics.inc('finance_model_registry_requests_total', result='memory')
+            return models
+
+        with self._key_lock(path):
+            models = self._get_loaded(path)
+            if models is not None:
+                metrics.inc('finance_model_registry_requests_total', result='memory')
+                return models
+
+            models = self._load(path)
+            if models is None:
+                try:
+                    models = train()
+                finally:
+                    # 训练失败时不保留该模型的锁，避免锁字典无限增长
+                    if models is None:
+                        self._release_key_lock(path)
+                if models is None:
+                    return None
+                self._save(path, models)
+                metrics.inc('finance_model_registry_requests_total', result='trained')
+            else:
+                metrics.inc('finance_model_registry_requests_total', result='disk')
+
+            self._set_loaded(path, models)
+            return models
+
+    def clear(self):
+        """清空内存中的模型（不删除模型文件）"""
+        with self._lock:
+            self._loaded.clear()
+
+    def _get_loaded(self, path):
+        with self._lock:
+            models = self._loaded.get(path)
+            if models is not None:
+                self._loaded.move_to_end(path)
+            return models
+
+    def _set_loaded(self, path, models):
+        with self._lock:
+            self._loaded[path] = models
+            self._loaded.move_to_end(path)
+            self._key_locks.pop(path, None)
+            while len(self._loaded) > max(self.max_loaded, 1):
+                self._loaded.popitem(last=False)
+
+    def _key_lock(self, path):
+        with self._lock:
+            return self._key_locks.setdefault(path, threading.Lock())
+
+    def _release_key_lock(self, path):
+        with self._lock:
+            self._key_locks.pop(path, None)
+
+    def _load(self, path):
+        if not os.path.exists(path):
+            return None
+        import joblib
+        try:
+            return joblib.load(path)
+        except Exception as e:
+            # 文件损坏或scikit-learn版本不兼容时重新训练
+            print(f"Error loading prediction model {path}: {e}")
+            return None
+
+    def _save(self, path, models):
+        import joblib
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            # 先写临时文件再替换，避免其他进程读到未写完的文件
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            joblib.dump(models, tmp_path)
+            os.replace(tmp_path, path)
+            self._prune(directory)
+        except Exception as e:
+            print(f"Error saving prediction model {path}: {e}")
+
+    def _prune(self, directory):
+        files = [
+            os.path.join(directory, name)
+            for name in os.listdir(directory) if name.endswith('.joblib')
+        ]
+        if len(files) <= self.keep_per_provider:
+            return
+        files.sort(key=os.path.getmtime)
+        for old_file in files[:len(files) - self.keep_per_provider]:
+            try:
+                os.remove(old_file)
+            except OSError:
+                pass
+
+
+# 进程内共享的模型注册表
+model_registry = ModelRegistry()
@@ -1,3 +1,101 @@
 from django.db import models
 
-# Create your models here.
+
+class BillingLine(models.Model):
+    """
+    云账单明细
+    按 服务商/日期/产品/资源 聚合存储，同一键的多条明细费用会被合并
+    """
+    provider = models.CharField(max_length=32)
+    date = models.DateField()
+    product_name = models.CharField(max_length=255, blank=True, default='')
+    resource_id = models.CharField(max_length=255, blank=True, default='')
+    region = models.CharField(max_length=64, blank=True, default='')
+    cost = models.FloatField(default=0.0)
+    currency = models.CharField(max_length=8, default='CNY')
+    subscription_type = models.CharField(max_length=32, blank=True, default='')
+    fetched_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['provider', 'date', 'product_name', 'resource_id'],
+                name='uniq_billing_line',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['provider', 'date'], name='billing_line_provider_date'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.date} {self.product_name} {self.resource_id}: {self.cost}"
+
+
+class BillingDay(models.Model):
+    """
+    每日账单拉取记录
+    记录某个服务商某一天的数据已拉取入库，以及当天的成本汇总
+    """
+    provider = models.CharField(max_length=32)
+    date = models.DateField()
+    total_cost = models.FloatField(default=0.0)
+    line_count = models.IntegerField(default=0)
+    fetched_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'date'], name='uniq_billing_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.date}: {self.total_cost}"
+
+
+class BillingCostRollup(models.Model):
+    """
+    成本聚合立方体
+    按 日期 × 服务商 × 产品 × 地域 预先汇总的成本，账单明细入库时同步更新，
+    产品/地域分解查询直接读取汇总数据而不扫描明细
+    """
+    provider = models.CharField(max_length=32)
+    date = models.DateField()
+    product_name = models.CharField(max_length=255, blank=True, default='')
+    region = models.CharField(max_length=64, blank=True, default='')
+    total_cost = models.FloatField(default=0.0)
+    line_count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['provider', 'date', 'product_name', 'region'],
+                name='uniq_billing_cost_rollup',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.provider} {self.date} {self.product_name} {self.region}: {self.total_cost}"
+
+
+class BillingSyncState(models.Model):
+    """
+    增量同步水位
+    记录每个服务商账户已完全结算并同步入库的最后一天
+    """
+    provider = models.CharField(max_length=32)
+    account_id = models.CharField(max_length=128, blank=True, default='')
+    settled_through = models.DateField(null=True, blank=True)
+    last_sync_start = models.DateField(null=True, blank=True)
+    last_sync_end = models.DateField(null=True, blank=True)
+    last_line_count = models.IntegerField(default=0)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    # 同步租约：同一服务商账户同时只允许一个进程同步，进程异常退出后租约到期自动释放
+    lock_owner = models.CharField(max_length=128, blank=True, default='')
+    locked_until = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['provider', 'account_id'], name='uniq_billing_sync_state'),
+        ]
+
+    def __str__(self):
+        return f"{self.provider}/{self.account_id}: {self.settled_through}"
@@ -0,0 +1,193 @@
+"""
+云服务商接口限流
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from .metrics import metrics
+
+
+class RateLimiter:
+    """
+    令牌桶限流器（线程安全）
+    每秒补充rate个令牌，最多累积burst个，请求前调用acquire获取令牌
+    """
+
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: 每秒允许的请求数，<=0 表示不限流
+        :param burst: 允许的突发请求数，默认与rate相同
+        """
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1, rate))
+        self._tokens = self.burst
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """获取令牌，令牌不足时阻塞等待"""
+        if self.rate <= 0:
+            return
+
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+                self._updated_at = now
+
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+
+                wait = (tokens - self._tokens) / self.rate
+
+            time.sleep(wait)
+
+
+class SharedRateLimiter:
+    """
+    跨进程共享的令牌桶限流器
+    令牌桶状态保存在SQLite文件中，同一台机器上的所有Web进程和命令行任务按同一个配额限流；
+    获取令牌时预约下一个可用时间点（令牌数可以为负），请求按到达顺序均匀间隔发出，
+    总请求速率保持在rate以下，而不是先突发再被云服务商限流
+    """
+
+    def __init__(self, path, key, rate, burst=1, timeout=30):
+        """
+        :param path: SQLite文件路径
+        :param key: 令牌桶标识，如 alibaba:<账户>:QueryInstanceBill
+        :param rate: 每秒允许的请求数，<=0 表示不限流
+        :param burst: 允许的突发请求数，默认为1（请求均匀间隔）
+        :param timeout: 等待其他进程释放SQLite锁的时间（秒）
+        """
+        self.path = path
+        self.key = key
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.timeout = timeout
+        self._local = threading.local()
+        if self.rate > 0:
+            self._connection()
+
+    def acquire(self, tokens=1):
+        """获取令牌，令牌不足时阻塞等待到预约的时间点"""
+        if self.rate <= 0:
+            return
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    def _reserve(self, tokens):
+        """
+        扣除令牌并返回需要等待的时间（秒）
+        使用time.time()，各进程的时钟一致
+        """
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?', (self.key,)
+            ).fetchone()
+            now = time.time()
+            if row is None:
+                available = self.burst
+            else:
+                available = min(self.burst, row[0] + max(0.0, now - row[1]) * self.rate)
+            available -= tokens
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated_at) VALUES (?, ?, ?)',
+                (self.key, available, now)
+            )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return -available / self.rate if available < 0 else 0.0
+
+    def _connection(self):
+        """每个线程使用独立的SQLite连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_buckets '
+                '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+            )
+            self._local.conn = conn
+        return conn
+
+
+def default_rate_limit_db():
+    """
+    共享限流状态文件，默认读取BILLING_RATE_LIMIT_DB
+    未配置时使用系统临时目录，设为空字符串时只在进程内限流
+    """
+    return os.environ.get(
+        "BILLING_RATE_LIMIT_DB", os.path.join(tempfile.gettempdir(), 'price_finanle_rate_limits.sqlite3')
+    )
+
+
+def parse_api_rates(value):
+    """
+    解析按接口配置的QPS
+    :param value: 如 "QueryInstanceBill:10,QueryAccountBalance:2"
+    :return: {接口名称: QPS}
+    """
+    rates = {}
+    for item in (value or '').split(','):
+        api, sep, rate = item.strip().partition(':')
+        if sep and api.strip():
+            rates[api.strip()] = float(rate)
+    return rates
+
+
+class ProviderRateLimits:
+    """
+    云服务商接口限流
+    按 服务商/账户/接口 分别使用令牌桶，接口QPS配额通常按账户和接口分别计算
+    """
+
+    def __init__(self, provider, account_id, rate, api_rates=None, path=None, burst=1):
+        """
+        :param provider: 服务商标识
+        :param account_id: 账户标识，同一账户的进程共享令牌桶
+        :param rate: 未单独配置的接口的每秒请求数上限，<=0 表示不限流
+        :param api_rates: {接口名称: QPS}，单独配置的接口
+        :param path: 共享限流状态的SQLite文件，默认读取BILLING_RATE_LIMIT_DB，为空时只在进程内限流
+        :param burst: 允许的突发请求数
+        """
+        self.provider = provider
+        self.account_id = account_id or ''
+        self.rate = float(rate)
+        self.api_rates = api_rates or {}
+        self.path = default_rate_limit_db() if path is None else path
+        self.burst = burst
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, api):
+        """请求接口前获取令牌，令牌不足时阻塞等待"""
+        limiter = self.limiter(api)
+        if limiter.rate <= 0:
+            return
+        with metrics.timer('finance_provider_rate_limit_wait_seconds', provider=self.provider, api=api):
+            limiter.acquire()
+
+    def limiter(self, api):
+        """获取接口的限流器"""
+        with self._lock:
+            limiter = self._limiters.get(api)
+            if limiter is None:
+                limiter = self._limiters[api] = self._create(api)
+            return limiter
+
+    def _create(self, api):
+        rate = self.api_rates.get(api, self.rate)
+        if self.path:
+            try:
+                return SharedRateLimiter(self.path, f'{self.provider}:{self.account_id}:{api}', rate, self.burst)
+            except (sqlite3.Error, OSError) as e:
+                print(f"Error opening shared rate limit database {self.path}, using per-process limit: {e}")
+        return RateLimiter(rate, self.burst)
@@ -0,0 +1,195 @@
+"""
+云服务商接口容错
+限流和临时错误时按指数退避（带随机抖动）重试单个请求，分页拉取时已获取的分页不受影响；
+某个服务商连续失败时熔断，熔断期间直接失败而不再请求云服务商，由调用方使用本地已有的数据
+"""
+import os
+import random
+import threading
+import time
+from .metrics import metrics
+
+# 可重试的错误码前缀（阿里云、腾讯云）：限流、服务端临时错误、网络错误
+RETRYABLE_CODE_PREFIXES = (
+    'Throttling', 'RequestLimitExceeded', 'ServiceUnavailable', 'InternalError',
+    'ServerNetworkError', 'ClientNetworkError', 'ServiceBusy', 'ResourceUnavailable',
+)
+RETRYABLE_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class ProviderUnavailableError(Exception):
+    """云服务商接口不可用，且本地没有可以使用的数据"""
+
+
+class CircuitOpenError(ProviderUnavailableError):
+    """服务商处于熔断状态，未发起请求"""
+
+
+def is_retryable(error):
+    """
+    判断错误是否为限流或临时错误（重试可能成功）
+    :param error: SDK抛出的异常（TeaException、TencentCloudSDKException等）
+    """
+    if isinstance(error, CircuitOpenError):
+        return False
+    code = str(getattr(error, 'code', None) or '')
+    if code.startswith(RETRYABLE_CODE_PREFIXES):
+        return True
+    if getattr(error, 'statusCode', None) in RETRYABLE_STATUS_CODES:
+        return True
+    # 阿里云SDK将网络错误包装为UnretryableException
+    inner = getattr(error, 'inner_exception', None)
+    if inner is not None and inner is not error:
+        return is_retryable(inner)
+    # 网络错误（包括requests的连接和超时异常）
+    return isinstance(error, OSError)
+
+
+class RetryPolicy:
+    """指数退避重试策略"""
+
+    def __init__(self, max_attempts=None, base_delay=None, max_delay=None):
+        """
+        :param max_attempts: 每个请求最多尝试的次数，默认读取PROVIDER_RETRY_ATTEMPTS
+        :param base_delay: 首次重试前的等待时间（秒），之后每次翻倍
+        :param max_delay: 最长等待时间（秒）
+        """
+        self.max_attempts = max_attempts if max_attempts is not None else int(
+            os.environ.get("PROVIDER_RETRY_ATTEMPTS", "4"))
+        self.base_delay = base_delay if base_delay is not None else float(
+            os.environ.get("PROVIDER_RETRY_BASE_DELAY", "0.5"))
+        self.max_delay = max_delay if max_delay is not None else float(
+            os.environ.get("PROVIDER_RETRY_MAX_DELAY", "10"))
+
+    def delay(self, retry):
+        """
+        第retry次重试（从1开始）前的等待时间
+        加入随机抖动，避免并发请求同时被限流后又同时重试
+        """
+        backoff = min(self.max_delay, self.base_delay * 2 ** (retry - 1))
+        return backoff * random.uniform(0.5, 1.0)
+
+
+class CircuitBreaker:
+    """
+    熔断器（线程安全）
+    连续failure_threshold次失败后熔断，reset_timeout秒后放行一个试探请求，成功则恢复，失败则继续熔断
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=None, reset_timeout=None, clock=time.monotonic):
+        """
+        :param failure_threshold: 熔断前允许的连续失败次数，默认读取PROVIDER_CIRCUIT_FAILURES，<=0 表示不熔断
+        :param reset_timeout: 熔断持续时间（秒），默认读取PROVIDER_CIRCUIT_RESET
+        """
+        self.failure_threshold = failure_threshold if failure_threshold is not None else int(
+            os.environ.get("PROVIDER_CIRCUIT_FAILURES", "5"))
+        self.reset_timeout = reset_timeout if reset_timeout is not None else float(
+            os.environ.get("PROVIDER_CIRCUIT_RESET", "60"))
+        self.clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """是否允许发起请求"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and self.clock() - self._opened_at >= self.reset_timeout:
+                # 熔断到期，只放行一个试探请求
+                self.state = self.HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or (
+                    0 < self.failure_threshold <= self.failures and self.state == self.CLOSED):
+                self.state = self.OPEN
+                self._opened_at = self.clock()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(provider):
+    """获取服务商在进程内共享的熔断器"""
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = _breakers[provider] = CircuitBreaker()
+        return breaker
+
+
+def reset_circuit_breakers():
+    """清空熔断器（配置变更后或测试中调用）"""
+    with _breakers_lock:
+        _breakers.clear()
+
+
+class ProviderResilience:
+    """云服务商接口的容错调用：重试、退避和熔断"""
+
+    def __init__(self, provider, retry=None, breaker=None, sleep=time.sleep):
+        """
+        :param provider: 服务商标识
+        :param retry: RetryPolicy，默认读取环境变量配置
+        :param breaker: CircuitBreaker，默认使用该服务商在进程内共享的熔断器
+        :param sleep: 等待函数
+        """
+        self.provider = provider
+        self.retry = retry or RetryPolicy()
+        self.breaker = breaker or get_circuit_breaker(provider)
+        self.sleep = sleep
+
+    def call(self, api, fn, *args, **kwargs):
+        """
+        调用接口，限流和临时错误时退避重试
+        :param api: 接口名称，用于指标标签
+        :param fn: 接口调用函数
+        :return: fn的返回值；重试后仍失败（或重试期间服务商已熔断）时抛出最后一次的异常，
+                 熔断期间调用时抛出CircuitOpenError
+        """
+        attempt = 1
+        while True:
+            if not self.breaker.allow():
+                metrics.inc('finance_provider_circuit_rejections_total', provider=self.provider, api=api)
+                raise CircuitOpenError(f'{self.provider} 接口连续失败，已熔断 {self.breaker.reset_timeout:g} 秒')
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if not is_retryable(e):
+                    # 参数或权限错误说明接口可以正常响应，不计入熔断
+                    self.breaker.record_success()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.retry.max_attempts or not self.breaker.allow():
+                    raise
+                metrics.inc('finance_provider_retries_total', provider=self.provider, api=api)
+                self.sleep(self.retry.delay(attempt))
+                attempt += 1
+                continue
+            self.breaker.record_success()
+            return result
+
+
+def _circuit_states():
+    codes = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+    with _breakers_lock:
+        breakers = list(_breakers.items())
+    return [({'provider': provider}, codes[breaker.state]) for provider, breaker in breakers]
+
+
+metrics.register_gauge('finance_provider_circuit_state', _circuit_states)
@@ -0,0 +1,73 @@
+"""
+相同请求合并（single-flight）
+同一时刻多个相同的请求（相同服务商、日期范围和参数）只执行一次，其余请求等待并共享结果
+"""
+import asyncio
+import copy
+import threading
+from concurrent.futures import Future
+
+
+class SingleFlight:
+    """
+    进行中请求的合并表（线程安全）
+    只合并同时进行的请求，请求完成后立即移除，不缓存结果
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        执行fn，已有相同key的请求在执行时等待其结果
+        :param key: 可哈希的请求标识，如 (方法名, 服务商, 开始日期, 结束日期, 参数)
+        :param fn: 阻塞函数
+        :return: fn的返回值副本；fn抛出的异常会传递给所有等待的请求
+        """
+        future, leader = self._begin(key)
+        if leader:
+            self._run(key, future, fn, args, kwargs)
+        return copy.deepcopy(future.result())
+
+    async def do_async(self, key, fn, *args, **kwargs):
+        """
+        do的异步版本：第一个请求在I/O线程池中执行fn，其余请求等待时不占用线程
+        """
+        from .async_executor import run_blocking
+
+        future, leader = self._begin(key)
+        if leader:
+            await run_blocking(self._run, key, future, fn, args, kwargs)
+        result = await asyncio.wrap_future(future)
+        return copy.deepcopy(result)
+
+    def in_flight(self):
+        """正在执行的请求数"""
+        with self._lock:
+            return len(self._calls)
+
+    def _begin(self, key):
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            # 标记为执行中，单个等待方取消时不会取消共享的结果
+            future.set_running_or_notify_cancel()
+            self._calls[key] = future
+            return future, True
+
+    def _run(self, key, future, fn, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+        else:
+            self._finish(key)
+            future.set_result(result)
+
+    def _finish(self, key):
+        with self._lock:
+            self._calls.pop(key, None)
@@ -0,0 +1,70 @@
+"""
+启动耗时报告
+在新的Python进程中依次测量Django初始化、加载URL配置（Web进程处理首个请求前的开销）
+以及各延迟加载依赖首次使用时的导入耗时（各项为前面各项已加载后的增量耗时）
+"""
+import json
+import os
+import subprocess
+import sys
+
+# (模块, 何时加载)
+STAGES = [
+    ('finance_api.urls', '加载URL配置和视图'),
+    ('finance_api.cost_prediction_service', '首个分析/预测请求（pandas、scikit-learn）'),
+    ('finance_api.alibaba_cloud_service', '首次访问阿里云（阿里云SDK）'),
+    ('finance_api.tencent_cloud_service', '首次访问腾讯云（腾讯云SDK）'),
+    ('joblib', '首次加载或保存训练模型'),
+    ('finance_api.billing_archive', 'Parquet归档（pyarrow）'),
+]
+
+# 不应在加载URL配置时导入的重量级依赖
+HEAVY_MODULES = [
+    'pandas', 'numpy', 'sklearn', 'joblib', 'pyarrow',
+    'alibabacloud_bssopenapi20171214', 'tencentcloud',
+]
+
+_MEASURE_SCRIPT = '''
+import importlib, json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+report = {'stages': [{'module': 'django.setup', 'ms': (time.perf_counter() - started) * 1000}]}
+for module, _ in STAGES:
+    started = time.perf_counter()
+    try:
+        importlib.import_module(module)
+        error = None
+    except Exception as e:
+        error = str(e)
+    report['stages'].append({'module': module, 'ms': (time.perf_counter() - started) * 1000, 'error': error})
+    if module == 'finance_api.urls':
+        report['heavy_modules_at_boot'] = [m for m in HEAVY_MODULES if m in sys.modules]
+print(json.dumps(report))
+'''
+
+
+def measure_startup(python=None):
+    """
+    在新进程中测量启动和延迟导入耗时（当前进程已导入的模块不影响结果）
+    :param python: Python解释器路径，默认为当前解释器
+    :return: {'stages': [{'module', 'ms', 'when', 'error'}], 'heavy_modules_at_boot': [...]}
+    """
+    script = f'STAGES = {STAGES!r}\nHEAVY_MODULES = {HEAVY_MODULES!r}\n' + _MEASURE_SCRIPT
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'price_finanle_django.settings')
+    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [project_dir, env.get('PYTHONPATH')]))
+
+    output = subprocess.run(
+        [python or sys.executable, '-c', script],
+        env=env, cwd=project_dir, capture_output=True, text=True, check=True
+    ).stdout
+    report = json.loads(output.strip().splitlines()[-1])
+
+    descriptions = dict(STAGES, **{'django.setup': 'Django初始化'})
+    for stage in report['stages']:
+        stage['ms'] = round(stage['ms'], 1)
+        stage['when'] = descriptions[stage['module']]
+        stage.setdefault('error', None)
+    return report
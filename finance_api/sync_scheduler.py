@@ -0,0 +1,141 @@
+"""
+账单定时同步
+按固定周期增量同步各服务商账户的账单到本地存储，同步失败（如接口限流）时指数退避，
+同步成功后预热常用的分析结果，接口请求可以只读取本地数据
+"""
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.db import connections
+from .billing_fetch_service import BillingFetchService
+
+
+class BillingSyncScheduler:
+    """
+    账单同步调度器
+    每个服务商独立调度，同一服务商同时只运行一个同步（跨进程由BillingSyncState的同步租约保证）
+    """
+
+    def __init__(self, service=None, providers=None, interval=None, initial_days=None,
+                 resync_days=None, warm_days=None, prediction_days=30, retry_delay=None,
+                 max_backoff=None, log=print):
+        """
+        :param service: BillingFetchService，默认新建
+        :param providers: 服务商列表，默认全部
+        :param interval: 同步周期（秒），默认读取BILLING_SYNC_INTERVAL
+        :param initial_days: 首次同步拉取的历史天数
+        :param resync_days: 每次重新同步的最近天数
+        :param warm_days: 同步后预热的历史天数列表，默认读取BILLING_SYNC_WARM_DAYS，为空时不预热
+        :param prediction_days: 预热完整分析时的预测天数
+        :param retry_delay: 首次失败后的重试间隔（秒），之后每次失败翻倍
+        :param max_backoff: 最长重试间隔（秒）
+        :param log: 输出日志的函数
+        """
+        self.service = service or BillingFetchService()
+        self.providers = list(providers or self.service.PROVIDER_NAMES)
+        self.interval = interval if interval is not None else int(
+            os.environ.get("BILLING_SYNC_INTERVAL", "3600"))
+        self.initial_days = initial_days
+        self.resync_days = resync_days
+        if warm_days is None:
+            warm_days = [int(days) for days in os.environ.get("BILLING_SYNC_WARM_DAYS", "30").split(',') if days]
+        self.warm_days = warm_days
+        self.prediction_days = prediction_days
+        self.retry_delay = retry_delay if retry_delay is not None else int(
+            os.environ.get("BILLING_SYNC_RETRY_DELAY", "60"))
+        self.max_backoff = max_backoff if max_backoff is not None else int(
+            os.environ.get("BILLING_SYNC_MAX_BACKOFF", "3600"))
+        self.log = log
+        self.failures = {provider: 0 for provider in self.providers}
+
+    def run_once(self):
+        """
+        同步所有服务商一次（不退避）
+        :return: {provider: 同步结果}
+        """
+        return {provider: self.sync_provider(provider) for provider in self.providers}
+
+    def run_forever(self, stop_event=None, tick=1.0):
+        """
+        持续按周期同步，直到stop_event被设置
+        :param stop_event: threading.Event，设置后等待进行中的同步结束并退出
+        :param tick: 检查到期任务的最长间隔（秒）
+        """
+        stop_event = stop_event or threading.Event()
+        next_run = {provider: 0.0 for provider in self.providers}
+        running = {}
+
+        with ThreadPoolExecutor(max_workers=len(self.providers), thread_name_prefix='billing-sync') as executor:
+            while not stop_event.is_set():
+                now = time.monotonic()
+                for provider in self.providers:
+                    if provider not in running and now >= next_run[provider]:
+                        running[provider] = executor.submit(self._sync_in_worker, provider)
+
+                for provider, future in list(running.items()):
+                    if future.done():
+                        del running[provider]
+                        next_run[provider] = time.monotonic() + self.next_delay(provider, future.result())
+
+                waits = [next_run[p] - time.monotonic() for p in self.providers if p not in running]
+                stop_event.wait(max(0.0, min([tick] + waits)))
+
+    def sync_provider(self, provider):
+        """
+        增量同步一个服务商，成功后预热分析结果
+        :return: 同步结果，failures 为连续失败次数
+        """
+        started = time.monotonic()
+        try:
+            result = self.service.sync_billing_data(provider, self.initial_days, self.resync_days)
+        except Exception as e:
+            result = {'success': False, 'provider': provider, 'message': str(e)}
+
+        if result.get('success'):
+            self.failures[provider] = 0
+            self.log(f"[sync] {provider}: {result['start_date']} ~ {result['end_date']}, "
+                     f"{result['line_count']} lines, settled through {result['settled_through']} "
+                     f"({time.monotonic() - started:.1f}s)")
+            self.warm_caches(provider)
+        elif result.get('busy'):
+            self.log(f"[sync] {provider}: {result['message']}")
+        else:
+            self.failures[provider] += 1
+            self.log(f"[sync] {provider}: {result.get('message')} (failure #{self.failures[provider]})")
+
+        result['failures'] = self.failures[provider]
+        return result
+
+    def next_delay(self, provider, result):
+        """
+        计算下次同步的等待时间
+        成功或其他进程正在同步时按正常周期；失败（如接口限流）时从retry_delay开始指数退避，
+        不超过max_backoff，并加入随机抖动，避免多个进程同时重试
+        """
+        failures = result.get('failures', 0)
+        if result.get('success') or result.get('busy') or failures == 0:
+            return self.interval
+        backoff = min(self.max_backoff, self.retry_delay * 2 ** (failures - 1))
+        return backoff * random.uniform(0.5, 1.0)
+
+    def warm_caches(self, provider):
+        """
+        预热常用的完整分析结果（分析结果缓存和训练模型注册表）
+        配置了共享的ANALYSIS_CACHE_BACKEND时预热结果对所有Web进程可用，训练的模型保存在磁盘上始终共享
+        """
+        for days in self.warm_days:
+            start_date, end_date = self.service.get_last_n_days(days)
+            for target in (provider, 'all'):
+                try:
+                    self.service.analyze_and_predict(target, start_date, end_date, self.prediction_days)
+                except Exception as e:
+                    self.log(f"[warm] {target} {start_date} ~ {end_date}: {e}")
+
+    def _sync_in_worker(self, provider):
+        """在线程池中同步，结束后关闭该线程的数据库连接"""
+        try:
+            return self.sync_provider(provider)
+        finally:
+            connections.close_all()
@@ -1,38 +1,93 @@
 import os
 from datetime import datetime, timedelta
+import requests
+from requests.adapters import HTTPAdapter
 from tencentcloud.common.credential import Credential
 from tencentcloud.common.profile.client_profile import ClientProfile
 from tencentcloud.common.profile.http_profile import HttpProfile
 from tencentcloud.common.exception.tencent_cloud_sdk_exception import TencentCloudSDKException
-from tencentcloud.billing.v20180709.client import BillingClient
+from tencentcloud.common.http.request import ProxyConnection
+from tencentcloud.billing.v20180709.billing_client import BillingClient
 from tencentcloud.billing.v20180709.models import (
     DescribeAccountBalanceRequest,
     DescribeBillDetailRequest,
     DescribeBillSummaryByProductRequest,
     DescribeDosageCosDetailByDateRequest
 )
+from .billing_utils import month_slices, summarize_billing_data, aggregate_daily_costs
+from .billing_pager import ConcurrentPager
+from .rate_limiter import ProviderRateLimits, parse_api_rates
+from .resilience import ProviderResilience, ProviderUnavailableError
+from .metrics import metrics
+
+class PooledConnection(ProxyConnection):
+    """
+    复用HTTP连接的SDK连接
+    SDK默认每个请求新建连接，这里改为共享带连接池的Session，并发请求间复用TLS连接
+    """
+
+    def __init__(self, conn, pool_size):
+        """
+        :param conn: SDK创建的ProxyConnection，沿用其超时、代理和证书配置
+        :param pool_size: 连接池大小，应不小于并发请求数
+        """
+        self.__dict__.update(conn.__dict__)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session = requests.Session()
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def request(self, method, url, body=None, headers=None):
+        headers.setdefault("Host", self.request_host)
+        return self.session.request(method=method,
+                                    url=url,
+                                    data=body,
+                                    headers=headers,
+                                    proxies=self.proxy,
+                                    verify=self.certification,
+                                    timeout=self.timeout,
+                                    stream=True)
+
 
 class TencentCloudService:
+    # DescribeBillDetail 单页最大条数
+    PAGE_SIZE = 100
+
     def __init__(self):
         self.secret_id = os.environ.get("TENCENT_CLOUD_SECRET_ID")
         self.secret_key = os.environ.get("TENCENT_CLOUD_SECRET_KEY")
         self.region = os.environ.get("TENCENT_CLOUD_REGION", "ap-guangzhou")
+        # 账户标识，用于区分增量同步水位，未配置时使用SecretId
+        self.account_id = os.environ.get("TENCENT_CLOUD_ACCOUNT_ID", self.secret_id or "")
+        # 账单明细并发请求数及每秒请求数上限（需低于账户的接口QPS配额）
+        self.max_concurrency = int(os.environ.get("TENCENT_BILLING_CONCURRENCY", "4"))
+        # 按账户和接口限流，同一台机器上的所有进程共享令牌桶（BILLING_RATE_LIMIT_DB）
+        self.rate_limits = ProviderRateLimits(
+            'tencent', self.account_id, float(os.environ.get("TENCENT_BILLING_QPS", "5")),
+            api_rates=parse_api_rates(os.environ.get("TENCENT_BILLING_API_QPS"))
+        )
+        # 限流和临时错误时退避重试，连续失败时熔断
+        self.resilience = ProviderResilience('tencent')
 
         cred = Credential(self.secret_id, self.secret_key)
-        httpProfile = HttpProfile()
+        httpProfile = HttpProfile(keepAlive=True)
         httpProfile.endpoint = "billing.tencentcloudapi.com"
 
         clientProfile = ClientProfile()
         clientProfile.httpProfile = httpProfile
         self.client = BillingClient(cred, self.region, clientProfile)
+        # 服务实例由client_registry在进程内共享，连接池按并发数保留空闲连接
+        self.client.request.conn = PooledConnection(
+            self.client.request.conn, max(self.max_concurrency, 1) * 2
+        )
 
     def get_account_balance(self):
         """获取账户余额"""
         try:
             req = DescribeAccountBalanceRequest()
-            response = self.client.DescribeAccountBalance(req)
+            response = self._call('DescribeAccountBalance', self.client.DescribeAccountBalance, req)
             return response.Balance
-        except TencentCloudSDKException as err:
+        except (TencentCloudSDKException, ProviderUnavailableError) as err:
             print(f"Error querying Tencent Cloud account balance: {err}")
             return None
 
@@ -41,82 +96,98 @@ class TencentCloudService:
         获取账单明细数据
         :param start_date: 开始日期 (YYYY-MM-DD)
         :param end_date: 结束日期 (YYYY-MM-DD)
-        :return: 账单数据列表
+        :return: 账单数据列表，重试后仍查询失败时抛出异常，不返回不完整的数据
         """
-        try:
-            billing_data = []
-            
-            # 将日期转换为账期格式 YYYY-MM
-            start_month = start_date[:7]
-            end_month = end_date[:7]
-            
-            # 生成需要查询的月份列表
-            months = self._generate_months(start_month, end_month)
-            
-            for month in months:
-                offset = 0
-                limit = 100
+        return list(self.iter_billing_lines(start_date, end_date))
+
+    def iter_billing_lines(self, start_date, end_date):
+        """
+        流式获取账单明细
+        各月份并发查询，月内分页在后台预取，内存中只保留预取窗口内的分页
+        :param start_date: 开始日期 (YYYY-MM-DD)
+        :param end_date: 结束日期 (YYYY-MM-DD)
+        :return: 账单明细生成器，查询失败时抛出TencentCloudSDKException
+        """
+        for month, details in self._iter_bill_detail_pages(start_date, end_date):
+            for item in details:
+                # 过滤日期范围
+                pay_time = item.PayTime if hasattr(item, 'PayTime') else ''
+                item_date = pay_time[:10] if len(pay_time) >= 10 else month + '-01'
                 
-                while True:
-                    req = DescribeBillDetailRequest()
-                    req.Month = month
-                    req.Offset = offset
-                    req.Limit = limit
-                    
-                    response = self.client.DescribeBillDetail(req)
-                    
-                    if not response.DetailSet:
-                        break
-                    
-                    for item in response.DetailSet:
-                        # 过滤日期范围
-                        pay_time = item.PayTime if hasattr(item, 'PayTime') else ''
-                        item_date = pay_time[:10] if len(pay_time) >= 10 else month + '-01'
-                        
-                        if start_date <= item_date <= end_date:
-                            billing_data.append({
-                                'date': item_date,
-                                'product_name': item.ProductName if hasattr(item, 'ProductName') else '',
-                                'cost': float(item.Cost) if hasattr(item, 'Cost') else 0.0,
-                                'currency': 'CNY',
-                                'resource_id': item.ResourceId if hasattr(item, 'ResourceId') else '',
-                                'region': item.Region if hasattr(item, 'Region') else ''
-                            })
-                    
-                    # 检查是否还有更多数据
-                    if len(response.DetailSet) < limit:
-                        break
-                    
-                    offset += limit
-            
-            return billing_data
-        except TencentCloudSDKException as err:
-            print(f"Error querying Tencent Cloud billing data: {err}")
-            return []
+                if start_date <= item_date <= end_date:
+                    yield {
+                        'date': item_date,
+                        'product_name': item.ProductName if hasattr(item, 'ProductName') else '',
+                        'cost': float(item.Cost) if hasattr(item, 'Cost') else 0.0,
+                        'currency': 'CNY',
+                        'resource_id': item.ResourceId if hasattr(item, 'ResourceId') else '',
+                        'region': item.Region if hasattr(item, 'Region') else ''
+                    }
+
+    def _iter_bill_detail_pages(self, start_date, end_date):
+        """
+        并发拉取账单明细分页
+        先并发查询每个月的第一页获取总条数，再并发预取剩余分页
+        :return: (month, DetailSet) 生成器，按月份和分页顺序返回
+        """
+        with ConcurrentPager(self.max_concurrency) as pager:
+            for (month, _, _, _), details in pager.iter_paged(
+                month_slices(start_date, end_date), self._describe_bill_detail, self.PAGE_SIZE
+            ):
+                yield month, details
+
+    def _describe_bill_detail(self, month_slice, page, need_total=False):
+        """
+        调用DescribeBillDetail查询某个月的一页账单明细
+        :param month_slice: (month, slice_start, slice_end, full_month)
+        :param page: 页码，从0开始
+        :return: (DetailSet, Total)，未请求总条数时Total为None
+        """
+        _, slice_start, slice_end, _ = month_slice
+        req = DescribeBillDetailRequest()
+        req.BeginTime = f"{slice_start} 00:00:00"
+        req.EndTime = f"{slice_end} 23:59:59"
+        req.Offset = page * self.PAGE_SIZE
+        req.Limit = self.PAGE_SIZE
+        if need_total:
+            req.NeedRecordNum = 1
+        
+        response = self._call('DescribeBillDetail', self.client.DescribeBillDetail, req)
+        details = response.DetailSet or []
+        metrics.inc('finance_provider_items_total', len(details), provider='tencent', api='DescribeBillDetail')
+        total = getattr(response, 'Total', None) if need_total else None
+        return details, total
+    
+    def _call(self, api, method, *args):
+        """
+        调用SDK接口：每次尝试前按接口获取限流令牌，限流和临时错误时退避重试（只重试这一个请求），
+        连续失败时熔断；每次尝试分别记录耗时和结果
+        """
+        def attempt():
+            self.rate_limits.acquire(api)
+            with metrics.track('finance_provider_request_seconds', 'finance_provider_requests_total',
+                               provider='tencent', api=api):
+                return method(*args)
+        return self.resilience.call(api, attempt)
+
+    def get_billing_summary(self, start_date, end_date):
+        """
+        单次拉取账单明细并汇总
+        :param start_date: 开始日期 (YYYY-MM-DD)
+        :param end_date: 结束日期 (YYYY-MM-DD)
+        :return: {'billing_data', 'daily_costs', 'product_costs', 'region_costs', 'total_cost'}，
+                 重试后仍查询失败时抛出异常，不返回不完整的数据
+        """
+        return summarize_billing_data(self.iter_billing_lines(start_date, end_date))
 
     def get_daily_costs(self, start_date, end_date):
         """
-        获取每日成本汇总
+        获取每日成本汇总（流式汇总，内存占用与账单明细条数无关）
         :param start_date: 开始日期 (YYYY-MM-DD)
         :param end_date: 结束日期 (YYYY-MM-DD)
-        :return: 每日成本字典 {date: cost}
+        :return: 每日成本字典 {date: cost}，重试后仍查询失败时抛出异常，不返回不完整的数据
         """
-        try:
-            billing_data = self.get_billing_data(start_date, end_date)
-            daily_costs = {}
-            
-            for item in billing_data:
-                date = item['date']
-                cost = item['cost']
-                if date in daily_costs:
-                    daily_costs[date] += cost
-                else:
-                    daily_costs[date] = cost
-            
-            return daily_costs
-        except Exception as e:
-            print(f"Error calculating daily costs: {e}")
-            return {}
+        return aggregate_daily_costs(self.iter_billing_lines(start_date, end_date))
 
     def get_product_summary(self, start_date, end_date):
         """
@@ -137,7 +208,8 @@ class TencentCloudService:
                 req = DescribeBillSummaryByProductRequest()
                 req.Month = month
                 
-                response = self.client.DescribeBillSummaryByProduct(req)
+                response = self._call('DescribeBillSummaryByProduct',
+                                      self.client.DescribeBillSummaryByProduct, req)
                 
                 if response.SummaryDetail:
                     for item in response.SummaryDetail:
@@ -149,7 +221,7 @@ class TencentCloudService:
                         })
             
             return product_summary
-        except TencentCloudSDKException as err:
+        except (TencentCloudSDKException, ProviderUnavailableError) as err:
             print(f"Error querying Tencent Cloud product summary: {err}")
             return []
 
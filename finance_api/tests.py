@@ -1,3 +1,717 @@
-from django.test import TestCase
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.management import call_command
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from . import client_registry, views
+from .analysis_cache import analysis_cache
+from .billing_fetch_service import BillingFetchService
+from .benchmark import run_fetch_benchmarks
+from .billing_store import BillingStore
+from .fake_providers import FakeBillingClient, FakeProviderError, create_fake_service
+from .models import BillingCostRollup, BillingDay, BillingLine
+from .resilience import CircuitBreaker, ProviderResilience, RetryPolicy
+from .startup import measure_startup
+from .sync_scheduler import BillingSyncScheduler
+
+
+class FakeProviderService:
+    """模拟云服务商，记录账单查询次数"""
+
+    def __init__(self, billing_data, account_id='test-account', latency=0):
+        self.billing_data = billing_data
+        self.account_id = account_id
+        self.latency = latency
+        self.calls = []
+
+    def iter_billing_lines(self, start_date, end_date):
+        self.calls.append((start_date, end_date))
+        time.sleep(self.latency)
+        for item in self.billing_data:
+            if start_date <= item['date'] <= end_date:
+                yield item
+
+    def get_billing_data(self, start_date, end_date):
+        return list(self.iter_billing_lines(start_date, end_date))
+
+
+class FailingProviderService(FakeProviderService):
+    """模拟查询失败的云服务商"""
+
+    def __init__(self, latency=0):
+        super().__init__([], latency=latency)
+
+    def iter_billing_lines(self, start_date, end_date):
+        self.calls.append((start_date, end_date))
+        time.sleep(self.latency)
+        raise RuntimeError('Throttling')
+        yield
+
+
+class BillingStoreTests(TestCase):
+
+    def setUp(self):
+        self.store = BillingStore(ttl_seconds=3600, settle_days=3)
+
+    def test_save_lines_merges_same_key(self):
+        self.store.save_lines('tencent', '2024-01-01', '2024-01-02', [
+            {'date': '2024-01-01', 'product_name': 'CVM', 'resource_id': 'ins-1', 'cost': 10.0},
+            {'date': '2024-01-01', 'product_name': 'CVM', 'resource_id': 'ins-1', 'cost': 5.0},
+            {'date': '2024-01-02', 'product_name': 'COS', 'resource_id': 'bucket', 'cost': 2.5},
+        ])
+
+        self.assertEqual(BillingLine.objects.count(), 2)
+        self.assertEqual(
+            self.store.get_daily_costs('tencent', '2024-01-01', '2024-01-02'),
+            {'2024-01-01': 15.0, '2024-01-02': 2.5}
+        )
+
+    def test_save_lines_merges_same_key_across_chunks(self):
+        def billing_data():
+            yield {'date': '2024-01-01', 'product_name': 'CVM', 'resource_id': 'ins-1',
+                   'region': 'ap-guangzhou', 'cost': 10.0}
+            yield {'date': '2024-01-01', 'product_name': 'COS', 'resource_id': 'bucket', 'cost': 1.0}
+            yield {'date': '2024-01-01', 'product_name': 'CVM', 'resource_id': 'ins-1',
+                   'region': 'ap-guangzhou', 'cost': 5.0}
+
+        with mock.patch.object(BillingStore, 'CHUNK_SIZE', 2):
+            saved = self.store.save_lines('tencent', '2024-01-01', '2024-01-01', billing_data())
+
+        self.assertEqual(saved, 2)
+        self.assertEqual(
+            BillingLine.objects.get(resource_id='ins-1').cost, 15.0
+        )
+        day = BillingDay.objects.get(provider='tencent')
+        self.assertEqual((day.total_cost, day.line_count), (16.0, 2))
+        rollup = BillingCostRollup.objects.get(product_name='CVM')
+        self.assertEqual((rollup.total_cost, rollup.line_count), (15.0, 1))
+
+    def test_save_lines_invalidates_analysis_cache(self):
+        daily_costs = {'2024-01-01': 1.0}
+        key = analysis_cache.make_key('predict_costs', daily_costs, {})
+
+        self.store.save_lines('tencent', '2024-01-01', '2024-01-01', [])
+
+        self.assertNotEqual(analysis_cache.make_key('predict_costs', daily_costs, {}), key)
+
+    def test_rollup_maintained_on_ingest(self):
+        self.store.save_lines('tencent', '2024-01-01', '2024-01-02', [
+            {'date': '2024-01-01', 'product_name': 'CVM', 'resource_id': 'ins-1', 'region': 'gz', 'cost': 10.0},
+            {'date': '2024-01-01', 'product_name': 'CVM', 'resource_id': 'ins-2', 'region': 'gz', 'cost': 5.0},
+            {'date': '2024-01-01', 'product_name': 'CVM', 'resource_id': 'ins-3', 'region': 'sh', 'cost': 1.0},
+            {'date': '2024-01-02', 'product_name': 'COS', 'resource_id': 'bucket', 'region': 'gz', 'cost': 2.5},
+        ])
+        self.store.save_lines('alibaba', '2024-01-01', '2024-01-01', [
+            {'date': '2024-01-01', 'product_name': 'CVM', 'instance_id': 'i-1', 'region': 'gz', 'cost': 4.0},
+        ])
+        self.assertEqual(BillingCostRollup.objects.count(), 4)
+
+        self.assertEqual(
+            self.store.query_cost_rollup(['tencent', 'alibaba'], '2024-01-01', '2024-01-02', ['product']),
+            [{'product': 'CVM', 'cost': 20.0, 'line_count': 4}, {'product': 'COS', 'cost': 2.5, 'line_count': 1}]
+        )
+        self.assertEqual(
+            self.store.query_cost_rollup(['tencent'], '2024-01-01', '2024-01-02', ['region'], products=['CVM']),
+            [{'region': 'gz', 'cost': 15.0, 'line_count': 2}, {'region': 'sh', 'cost': 1.0, 'line_count': 1}]
+        )
+
+        # 重新写入的日期范围替换原有聚合数据
+        self.store.save_lines('tencent', '2024-01-02', '2024-01-02', [])
+        self.assertEqual(
+            self.store.query_cost_rollup(['tencent'], '2024-01-01', '2024-01-02', ['date']),
+            [{'date': '2024-01-01', 'cost': 16.0, 'line_count': 3}]
+        )
+
+    def test_missing_days_respects_ttl_and_settlement(self):
+        self.store.save_lines('alibaba', '2024-01-01', '2024-01-03', [
+            {'date': '2024-01-02', 'product_name': 'ECS', 'instance_id': 'i-1', 'cost': 1.0},
+        ])
+        self.assertEqual(self.store.missing_days('alibaba', '2024-01-01', '2024-01-04'), ['2024-01-04'])
+
+        # 过期但未结算的日期需要重新拉取
+        BillingDay.objects.filter(date='2024-01-03').update(
+            fetched_at=timezone.make_aware(datetime(2024, 1, 4)))
+        BillingDay.objects.exclude(date='2024-01-03').update(
+            fetched_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(
+            self.store.missing_days('alibaba', '2024-01-01', '2024-01-04'),
+            ['2024-01-03', '2024-01-04']
+        )
+
+
+class BillingFetchServiceStoreTests(TestCase):
+
+    def setUp(self):
+        self.service = BillingFetchService()
+        self.service.tencent_service = FakeProviderService([
+            {'date': '2024-01-01', 'product_name': 'CVM', 'resource_id': 'ins-1', 'cost': 10.0},
+            {'date': '2024-01-02', 'product_name': 'CVM', 'resource_id': 'ins-1', 'cost': 12.0},
+        ])
+
+    def test_repeated_requests_read_from_store(self):
+        first = self.service.fetch_billing_data('tencent', '2024-01-01', '2024-01-02')
+        second = self.service.fetch_billing_data('tencent', '2024-01-01', '2024-01-02')
+        daily_costs, errors = self.service.get_daily_costs('tencent', '2024-01-01', '2024-01-02')
+
+        self.assertEqual(len(self.service.tencent_service.calls), 1)
+        self.assertEqual(first['total_cost'], 22.0)
+        self.assertEqual(first['product_costs'], {'CVM': 22.0})
+        self.assertEqual(second['billing_data'], first['billing_data'])
+        self.assertEqual(second['daily_costs'], first['daily_costs'])
+        self.assertEqual(daily_costs, {'2024-01-01': 10.0, '2024-01-02': 12.0})
+        self.assertEqual(errors, [])
+
+
+class FlakyBillingClient(FakeBillingClient):
+    """第一次请求指定偏移量的分页时返回限流错误"""
+
+    def __init__(self, data, fail_offset):
+        super().__init__(data)
+        self.fail_offset = fail_offset
+        self.failed = False
+
+    def DescribeBillDetail(self, request):
+        if request.Offset == self.fail_offset and not self.failed:
+            self.failed = True
+            raise FakeProviderError('RequestLimitExceeded')
+        return super().DescribeBillDetail(request)
+
+
+class ProviderResilienceTests(TransactionTestCase):
+
+    def setUp(self):
+        self.service = BillingFetchService()
+        self.fake = create_fake_service('tencent', rows_per_day=120, concurrency=2)
+        self.fake.resilience = ProviderResilience(
+            'tencent', retry=RetryPolicy(3, 0, 0), breaker=CircuitBreaker(failure_threshold=2)
+        )
+        self.service.tencent_service = self.fake
+        self.service.alibaba_service = FailingProviderService()
+
+    def test_throttled_page_is_retried_without_refetching_others(self):
+        self.fake.client = FlakyBillingClient(self.fake.client.data, fail_offset=200)
+
+        result = self.service.fetch_billing_data('tencent', '2024-01-01', '2024-01-03')
+
+        self.assertTrue(result['success'])
+        self.assertFalse(result['stale'])
+        self.assertEqual(len(result['billing_data']), 360)
+        # 4 页，只有被限流的一页重新请求
+        self.assertEqual(self.fake.client.calls, 4)
+
+    def test_outage_serves_last_good_data(self):
+        today = date.today()
+        start, end = (today - timedelta(days=2)).strftime('%Y-%m-%d'), today.strftime('%Y-%m-%d')
+        first = self.service.fetch_billing_data('tencent', start, end)
+        BillingDay.objects.update(fetched_at=timezone.now() - timedelta(hours=2))
+
+        self.fake.client.error_rate = 1.0
+        stale = self.service.fetch_billing_data('tencent', start, end)
+        self.assertTrue(stale['success'])
+        self.assertTrue(stale['stale'])
+        self.assertEqual(stale['total_cost'], first['total_cost'])
+        self.assertEqual(self.fake.resilience.breaker.state, CircuitBreaker.OPEN)
+
+        # 熔断期间不再请求云服务商；本地没有数据的日期范围返回错误而不是空账单
+        calls = self.fake.client.calls
+        missing = self.service.fetch_billing_data('tencent', '2024-01-01', '2024-01-02')
+        self.assertFalse(missing['success'])
+        self.assertIn('熔断', missing['message'])
+        self.assertEqual(self.fake.client.calls, calls)
+
+        combined = self.service.fetch_all_billing_data('2024-01-01', '2024-01-02')
+        self.assertEqual([e['provider'] for e in combined['errors']], ['alibaba', 'tencent'])
+
+
+class BillingSyncTests(TestCase):
+
+    def setUp(self):
+        today = date.today()
+        self.service = BillingFetchService()
+        self.service.alibaba_service = FakeProviderService([
+            {'date': (today - timedelta(days=i)).strftime('%Y-%m-%d'), 'product_name': 'ECS',
+             'instance_id': 'i-1', 'cost': 1.0}
+            for i in range(10)
+        ])
+
+    def test_sync_only_pulls_days_after_watermark(self):
+        today = date.today()
+        first = self.service.sync_billing_data('alibaba', initial_days=30, resync_days=3)
+        second = self.service.sync_billing_data('alibaba', initial_days=30, resync_days=3)
+
+        calls = self.service.alibaba_service.calls
+        self.assertEqual(calls[0][0], (today - timedelta(days=30)).strftime('%Y-%m-%d'))
+        self.assertEqual(calls[1][0], (today - timedelta(days=3)).strftime('%Y-%m-%d'))
+        self.assertEqual(first['settled_through'], (today - timedelta(days=4)).strftime('%Y-%m-%d'))
+        self.assertEqual(second['settled_through'], first['settled_through'])
+        self.assertEqual(BillingLine.objects.filter(provider='alibaba').count(), 10)
+
+    def test_watermark_does_not_cover_days_before_fetched_range(self):
+        today = date.today()
+        first = self.service.sync_billing_data('alibaba', initial_days=1, resync_days=3)
+        second = self.service.sync_billing_data('alibaba', initial_days=1, resync_days=3)
+
+        calls = self.service.alibaba_service.calls
+        self.assertEqual(calls[0][0], (today - timedelta(days=1)).strftime('%Y-%m-%d'))
+        # 只拉取了最近1天，水位不能声明更早的日期已同步
+        self.assertEqual(first['settled_through'], (today - timedelta(days=2)).strftime('%Y-%m-%d'))
+        # 之后仍重新拉取最近resync_days天，水位不后退
+        self.assertEqual(calls[1][0], (today - timedelta(days=3)).strftime('%Y-%m-%d'))
+        self.assertEqual(second['settled_through'], first['settled_through'])
+
+    def test_failed_fetch_keeps_watermark(self):
+        first = self.service.sync_billing_data('alibaba', initial_days=30, resync_days=3)
+        self.service.alibaba_service = FailingProviderService()
+        second = self.service.sync_billing_data('alibaba', initial_days=30, resync_days=3)
+
+        self.assertFalse(second['success'])
+        self.assertEqual(second['settled_through'], first['settled_through'])
+        self.assertEqual(BillingLine.objects.filter(provider='alibaba').count(), 10)
+
+
+class StreamingBillingViewTests(TransactionTestCase):
+
+    def setUp(self):
+        self.original_service = views.billing_service.tencent_service
+        views.billing_service.tencent_service = FakeProviderService([
+            {'date': '2024-01-01', 'product_name': 'CVM', 'resource_id': f'ins-{i}', 'cost': 1.5}
+            for i in range(3)
+        ])
+
+    def tearDown(self):
+        views.billing_service.tencent_service = self.original_service
+
+    def test_ndjson_streams_lines_then_summary(self):
+        response = self.client.get('/api/finance/billing/', {
+            'provider': 'tencent', 'start_date': '2024-01-01', 'end_date': '2024-01-01', 'format': 'ndjson'
+        })
+        records = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+
+        self.assertEqual([r['type'] for r in records], ['line', 'line', 'line', 'summary'])
+        self.assertEqual(records[0]['provider'], 'tencent')
+        self.assertEqual(records[-1]['total_cost'], 4.5)
+
+    def test_json_stream_matches_document_shape(self):
+        response = self.client.get('/api/finance/billing/', {
+            'provider': 'tencent', 'start_date': '2024-01-01', 'end_date': '2024-01-01', 'format': 'json-stream'
+        })
+        document = json.loads(b''.join(response.streaming_content))
+
+        self.assertEqual(len(document['billing_data']), 3)
+        self.assertEqual(document['daily_costs'], {'2024-01-01': 4.5})
+
+    def test_stream_reports_failed_providers(self):
+        original_alibaba = views.billing_service.alibaba_service
+        views.billing_service.alibaba_service = FailingProviderService()
+        try:
+            params = {'provider': 'all', 'start_date': '2024-01-01', 'end_date': '2024-01-01'}
+            document = json.loads(b''.join(self.client.get(
+                '/api/finance/billing/', {**params, 'format': 'json-stream'}).streaming_content))
+            records = [json.loads(line) for line in b''.join(self.client.get(
+                '/api/finance/billing/', {**params, 'format': 'ndjson'}).streaming_content).splitlines()]
+            # 没有可以读取的数据时在开始输出前返回错误
+            response = self.client.get('/api/finance/billing/', {
+                **params, 'provider': 'alibaba', 'format': 'ndjson'})
+        finally:
+            views.billing_service.alibaba_service = original_alibaba
+
+        self.assertTrue(document['partial'])
+        self.assertEqual([e['provider'] for e in document['errors']], ['alibaba'])
+        self.assertEqual(document['total_cost'], 4.5)
+        self.assertTrue(records[-1]['partial'])
+        self.assertEqual([e['provider'] for e in records[-1]['errors']], ['alibaba'])
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(response.json()['success'])
+
+
+class ConcurrentProviderTests(TransactionTestCase):
+
+    def test_slow_provider_returns_partial_results(self):
+        service = BillingFetchService(provider_timeout=0.5)
+        # 慢服务商查询失败，避免超时后的写入影响其他测试
+        service.alibaba_service = FailingProviderService(latency=1)
+        service.tencent_service = FakeProviderService([
+            {'date': '2024-01-01', 'product_name': 'CVM', 'resource_id': 'ins-1', 'cost': 5.0},
+        ])
+
+        started = time.monotonic()
+        result = service.fetch_all_billing_data('2024-01-01', '2024-01-01')
+
+        self.assertLess(time.monotonic() - started, 1.5)
+        self.assertTrue(result['partial'])
+        self.assertEqual([e['provider'] for e in result['errors']], ['alibaba'])
+        self.assertEqual(result['combined_daily_costs'], {'2024-01-01': 5.0})
+
+
+class PartialProviderViewTests(TransactionTestCase):
+
+    def setUp(self):
+        self.original_services = (views.billing_service.alibaba_service, views.billing_service.tencent_service)
+        views.billing_service.alibaba_service = FailingProviderService()
+        views.billing_service.tencent_service = FakeProviderService([
+            {'date': f'2024-01-{day:02d}', 'product_name': 'CVM', 'resource_id': 'ins-1', 'cost': 10.0 + day}
+            for day in range(1, 15)
+        ])
+
+    def tearDown(self):
+        views.billing_service.alibaba_service, views.billing_service.tencent_service = self.original_services
+
+    async def test_failed_provider_is_reported_in_analysis_views(self):
+        params = {'provider': 'all', 'start_date': '2024-01-01', 'end_date': '2024-01-14'}
+        responses = {
+            path: (await AsyncClient().get(f'/api/finance/{path}/', params)).json()
+            for path in ('daily-costs', 'predict', 'full-analysis')
+        }
+
+        for path, result in responses.items():
+            self.assertTrue(result['partial'], path)
+            self.assertEqual([e['provider'] for e in result['errors']], ['alibaba'], path)
+        # 只包含拉取成功的服务商的成本
+        self.assertEqual(responses['daily-costs']['daily_costs']['2024-01-01'], 11.0)
+        self.assertEqual(responses['full-analysis']['billing_summary']['days_count'], 14)
+
+    async def test_failed_provider_is_reported_in_batch_prediction(self):
+        response = await AsyncClient().get('/api/finance/predict-batch/', {
+            'provider': 'all', 'group_by': 'provider', 'start_date': '2024-01-01', 'end_date': '2024-01-14',
+            'days_ahead': 3, 'method': 'linear'
+        })
+        data = response.json()
+
+        self.assertEqual(list(data['results']), ['tencent'])
+        self.assertTrue(data['partial'])
+        self.assertEqual([e['provider'] for e in data['errors']], ['alibaba'])
+
+
+class ClientRegistryTests(TestCase):
+
+    def tearDown(self):
+        client_registry.reset_services()
+
+    def test_service_is_created_once_and_shared(self):
+        created = []
+
+        def slow_service():
+            time.sleep(0.05)
+            created.append(1)
+            return object()
+
+        results = []
+        with mock.patch.dict(client_registry.SERVICE_CLASSES, {'tencent': slow_service}):
+            threads = [
+                threading.Thread(target=lambda: results.append(client_registry.get_tencent_service()))
+                for _ in range(4)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(len(created), 1)
+            self.assertEqual(len({id(result) for result in results}), 1)
+            self.assertIs(BillingFetchService()._get_provider_service('tencent'), results[0])
+
+
+class GroupedCostViewTests(TransactionTestCase):
+
+    def setUp(self):
+        self.original_service = views.billing_service.tencent_service
+        views.billing_service.tencent_service = FakeProviderService([
+            {'date': f'2024-01-{day:02d}', 'product_name': product, 'resource_id': product,
+             'region': 'ap-guangzhou', 'cost': cost + day}
+            for day in range(1, 15)
+            for product, cost in (('CVM', 10.0), ('COS', 1.0))
+        ])
+
+    def tearDown(self):
+        views.billing_service.tencent_service = self.original_service
+
+    def test_get_groups_store_series_by_product(self):
+        response = self.client.get('/api/finance/predict-batch/', {
+            'provider': 'tencent', 'group_by': 'product',
+            'start_date': '2024-01-01', 'end_date': '2024-01-14', 'days_ahead': 3, 'method': 'linear'
+        })
+        data = response.json()
+
+        self.assertEqual(sorted(data['results']), ['COS', 'CVM'])
+        self.assertEqual(len(data['results']['CVM']['predictions']), 3)
+
+    def test_post_series_and_rejects_bad_group(self):
+        daily_costs = {f'2024-01-{day:02d}': float(day) for day in range(1, 11)}
+        response = self.client.post('/api/finance/predict-batch/', json.dumps({
+            'series': {'a': daily_costs, 'b': {'2024-01-01': 1.0}}, 'days_ahead': 2, 'method': 'moving_average'
+        }), content_type='application/json')
+        results = response.json()['results']
+
+        self.assertTrue(results['a']['success'])
+        self.assertFalse(results['b']['success'])
+
+        response = self.client.get('/api/finance/predict-batch/', {'group_by': 'zone'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rejects_invalid_batch_parameters(self):
+        series = {'a': {f'2024-01-{day:02d}': float(day) for day in range(1, 11)}}
+        bad_requests = [
+            [series],
+            {'series': series, 'days_ahead': 'abc'},
+            {'series': series, 'days_ahead': 0},
+            {'series': series, 'days_ahead': 100000},
+            {'series': series, 'method': 'prophet'},
+            {'series': {'a': 5}},
+            {'series': {'a': {'2024-01-01': 'ten'}}},
+            {'series': {'a': {'not-a-date': 1.0}}},
+            {'columns': {'series_id': ['a'], 'date': ['not-a-date'], 'cost': [1.0]}},
+            {'columns': {'series_id': ['a'], 'date': ['2024-01-01'], 'cost': ['ten']}},
+        ]
+        for body in bad_requests:
+            response = self.client.post('/api/finance/predict-batch/', json.dumps(body),
+                                        content_type='application/json')
+            self.assertEqual(response.status_code, 400, body)
+            self.assertFalse(response.json()['success'])
+
+        response = self.client.get('/api/finance/predict-batch/', {'days_ahead': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cost_breakdown_by_product_and_region(self):
+        response = self.client.get('/api/finance/cost-breakdown/', {
+            'provider': 'tencent', 'group_by': 'product,region',
+            'start_date': '2024-01-01', 'end_date': '2024-01-14', 'product': 'COS'
+        })
+        data = response.json()
+
+        self.assertEqual(data['rows'], [
+            {'product': 'COS', 'region': 'ap-guangzhou', 'cost': 119.0, 'line_count': 14}
+        ])
+        self.assertEqual(
+            self.client.get('/api/finance/cost-breakdown/', {'group_by': 'zone'}).status_code, 400)
+
+
+class RecordingExecutor(ThreadPoolExecutor):
+    """记录提交任务数的执行器（代替进程池）"""
+
+    def __init__(self):
+        super().__init__(max_workers=1)
+        self.submitted = 0
+
+    def submit(self, fn, *args, **kwargs):
+        self.submitted += 1
+        return super().submit(fn, *args, **kwargs)
+
+
+class AsyncViewTests(TransactionTestCase):
+
+    def setUp(self):
+        self.original_service = views.billing_service.tencent_service
+        views.billing_service.tencent_service = FakeProviderService([
+            {'date': f'2024-01-{day:02d}', 'product_name': 'CVM', 'resource_id': 'ins-1', 'cost': 10.0 + day}
+            for day in range(1, 15)
+        ])
+
+    def tearDown(self):
+        views.billing_service.tencent_service = self.original_service
+
+    async def test_prediction_offloads_model_fitting(self):
+        executor = RecordingExecutor()
+        with mock.patch.object(views.prediction_service, 'fit_executor', executor), \
+                mock.patch.object(views.prediction_service, 'model_registry', None):
+            response = await AsyncClient().get('/api/finance/predict/', {
+                'provider': 'tencent', 'start_date': '2024-01-01', 'end_date': '2024-01-14', 'days_ahead': 3
+            })
+        executor.shutdown()
+
+        self.assertEqual(len(response.json()['predictions']), 3)
+        self.assertEqual(executor.submitted, 1)
+
+    async def test_ndjson_streams_asynchronously(self):
+        response = await AsyncClient().get('/api/finance/billing/', {
+            'provider': 'tencent', 'start_date': '2024-01-01', 'end_date': '2024-01-03', 'format': 'ndjson'
+        })
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        records = [json.loads(line) for line in b''.join(chunks).splitlines()]
+
+        self.assertEqual([r['type'] for r in records], ['line'] * 3 + ['summary'])
+        self.assertEqual(records[-1]['total_cost'], 36.0)
+
+    async def test_rejects_other_methods(self):
+        response = await AsyncClient().post('/api/finance/daily-costs/')
+        self.assertEqual(response.status_code, 405)
+
+    async def test_metrics_endpoint_reports_requests_and_ingested_rows(self):
+        await AsyncClient().get('/api/finance/daily-costs/', {
+            'provider': 'tencent', 'start_date': '2024-01-01', 'end_date': '2024-01-14'
+        })
+        response = await AsyncClient().get('/api/finance/metrics/')
+        text = response.content.decode('utf-8')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        self.assertIn(
+            'finance_http_request_seconds_count{method="GET",status="200",view="get_daily_costs"}', text)
+        self.assertIn('finance_billing_rows_ingested_total{provider="tencent"}', text)
+        self.assertIn('# TYPE finance_analysis_cache_hit_ratio gauge', text)
+
+
+class RequestCoalescingTests(TransactionTestCase):
+
+    def setUp(self):
+        self.service = BillingFetchService()
+        self.service.tencent_service = FakeProviderService([
+            {'date': f'2024-01-{day:02d}', 'product_name': 'CVM', 'resource_id': 'ins-1', 'cost': 10.0 + day}
+            for day in range(1, 15)
+        ], latency=0.2)
+
+    def test_concurrent_refreshes_fetch_once(self):
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                self.service.get_daily_costs('tencent', '2024-01-01', '2024-01-14')[0]))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(self.service.tencent_service.calls), 1)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(result == results[0] and len(result) == 14 for result in results))
+
+    async def test_identical_full_analysis_requests_share_computation(self):
+        original_service = views.billing_service.tencent_service
+        views.billing_service.tencent_service = self.service.tencent_service
+        analyze = views.billing_service.analyze_and_predict
+        calls = []
+
+        def counting_analyze(*args):
+            calls.append(args)
+            return analyze(*args)
+
+        params = {'provider': 'tencent', 'start_date': '2024-01-01', 'end_date': '2024-01-14',
+                  'prediction_days': 3}
+        try:
+            with mock.patch.object(views.billing_service, 'analyze_and_predict', counting_analyze), \
+                    mock.patch.object(views.prediction_service, 'fit_executor', None), \
+                    mock.patch.object(views.prediction_service, 'model_registry', None):
+                responses = await asyncio.gather(*[
+                    AsyncClient().get('/api/finance/full-analysis/', params) for _ in range(3)
+                ])
+        finally:
+            views.billing_service.tencent_service = original_service
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(self.service.tencent_service.calls), 1)
+        self.assertEqual(len({response.content for response in responses}), 1)
+        self.assertEqual(responses[0].json()['billing_summary']['days_count'], 14)
+
+
+class SyncSchedulerTests(TestCase):
+
+    def setUp(self):
+        today = date.today()
+        self.service = BillingFetchService()
+        self.service.alibaba_service = FailingProviderService()
+        self.service.tencent_service = FakeProviderService([
+            {'date': (today - timedelta(days=i)).strftime('%Y-%m-%d'), 'product_name': 'CVM',
+             'resource_id': 'ins-1', 'cost': 10.0 + i}
+            for i in range(1, 10)
+        ])
+
+    def test_sync_lock_allows_one_sync_per_account(self):
+        self.assertTrue(self.service.store.acquire_sync_lock('tencent', 'test-account', 'other-host', 60))
+
+        result = self.service.sync_billing_data('tencent', initial_days=10)
+        self.assertTrue(result['busy'])
+        self.assertEqual(self.service.tencent_service.calls, [])
+
+        self.service.store.release_sync_lock('tencent', 'test-account', 'other-host')
+        self.assertTrue(self.service.sync_billing_data('tencent', initial_days=10)['success'])
+        self.assertTrue(self.service.store.acquire_sync_lock('tencent', 'test-account', 'other-host', 60))
+
+    def test_failures_back_off_and_success_warms_analysis(self):
+        scheduler = BillingSyncScheduler(
+            service=self.service, interval=3600, initial_days=10, warm_days=[7],
+            retry_delay=60, max_backoff=100, log=lambda message: None
+        )
+        with mock.patch.object(self.service, 'analyze_and_predict') as analyze:
+            results = scheduler.run_once()
+            delays = [scheduler.next_delay('alibaba', results['alibaba'])]
+            delays.append(scheduler.next_delay('alibaba', scheduler.sync_provider('alibaba')))
+            delays.append(scheduler.next_delay('alibaba', scheduler.sync_provider('alibaba')))
+
+        self.assertEqual(scheduler.next_delay('tencent', results['tencent']), 3600)
+        self.assertEqual(results['tencent']['line_count'], 9)
+        self.assertTrue(30 <= delays[0] <= 60 and 50 <= delays[1] <= 100 and 50 <= delays[2] <= 100)
+        self.assertEqual([c.args[0] for c in analyze.call_args_list], ['tencent', 'all'])
+
+    def test_local_only_requests_skip_provider(self):
+        self.service.fetch_on_request = False
+        self.assertEqual(self.service.get_daily_costs('tencent', '2024-01-01', '2024-01-07'), ({}, []))
+        self.assertEqual(self.service.tencent_service.calls, [])
+
+    def test_command_syncs_once(self):
+        with mock.patch.object(BillingFetchService, '_get_provider_service',
+                               return_value=self.service.tencent_service):
+            call_command('sync_billing', '--once', '--provider', 'tencent', '--warm-days', '',
+                         stdout=mock.MagicMock())
+
+        self.assertEqual(BillingLine.objects.filter(provider='tencent').count(), 9)
+
+
+class StartupTests(TestCase):
+
+    def test_url_conf_defers_heavy_imports(self):
+        report = measure_startup()
+
+        self.assertEqual(report['heavy_modules_at_boot'], [])
+        self.assertEqual([stage['module'] for stage in report['stages']][:2], ['django.setup', 'finance_api.urls'])
+
+
+class AlibabaPagingTests(TestCase):
+
+    def test_every_request_specifies_billing_date(self):
+        service = create_fake_service('alibaba', rows_per_day=5, page_size=3)
+        requests = []
+        query = service.client.query_instance_bill_with_options
+
+        def record(request, runtime=None):
+            requests.append(request)
+            return query(request, runtime)
+
+        service.client.query_instance_bill_with_options = record
+        lines = list(service.iter_billing_lines('2024-01-30', '2024-02-10'))
+
+        # 跨月的12天，每天5条，单页3条：12天 x 2页
+        self.assertEqual(len(lines), 60)
+        self.assertEqual(lines[0]['date'], '2024-01-30')
+        self.assertEqual(lines[-1]['date'], '2024-02-10')
+        self.assertEqual(len(requests), 24)
+        self.assertTrue(all(r.granularity == 'DAILY' and r.billing_date for r in requests))
+        self.assertEqual({r.billing_cycle for r in requests}, {'2024-01', '2024-02'})
+
+
+class BenchmarkTests(TransactionTestCase):
+
+    def test_fetch_benchmark_drives_real_pagination(self):
+        results = run_fetch_benchmarks([
+            ('tencent', 3, 250, None, 0), ('alibaba', 2, 10, 4, 0), ('alibaba', 40, 10, None, 0)
+        ])
+        by_name = {result['name']: result for result in results}
+
+        # 每天250条，单页100条：ceil(750 / 100) = 8 页
+        cold = by_name['fetch/cold/tencent/days=3/rows_per_day=250/page_size=default/latency=0']
+        self.assertEqual((cold['rows'], cold['api_calls']), (750, 8))
+        # 按天查询，每天10条，单页4条：2天 x 3页
+        cold = by_name['fetch/cold/alibaba/days=2/rows_per_day=10/page_size=4/latency=0']
+        self.assertEqual((cold['rows'], cold['api_calls']), (20, 6))
+        # 超过一周且跨月的范围同样按天查询（每天一页）
+        cold = by_name['fetch/cold/alibaba/days=40/rows_per_day=10/page_size=default/latency=0']
+        self.assertEqual((cold['rows'], cold['api_calls']), (400, 40))
+        self.assertEqual(len(results), 6)
+        self.assertEqual(BillingLine.objects.count(), 0)
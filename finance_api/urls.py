@@ -10,11 +10,16 @@ urlpatterns = [
     # 账单数据拉取
     path('billing/', views.fetch_billing_data, name='fetch-billing'),
     path('daily-costs/', views.get_daily_costs, name='daily-costs'),
+    path('cost-breakdown/', views.get_cost_breakdown, name='cost-breakdown'),
     
     # 成本分析
     path('analyze/', views.analyze_daily_costs, name='analyze-costs'),
     path('predict/', views.predict_costs, name='predict-costs'),
+    path('predict-batch/', views.predict_batch, name='predict-batch'),
     path('anomalies/', views.detect_anomalies, name='detect-anomalies'),
     path('full-analysis/', views.full_analysis, name='full-analysis'),
     path('budget-comparison/', views.compare_with_budget, name='budget-comparison'),
+    
+    # 运行指标
+    path('metrics/', views.get_metrics, name='metrics'),
 ]
\ No newline at end of file
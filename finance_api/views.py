@@ -1,66 +1,202 @@
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, HttpResponseNotAllowed, JsonResponse, StreamingHttpResponse
+from django.utils.log import log_response
+from django.utils.functional import SimpleLazyObject
 from django.views.decorators.csrf import csrf_exempt
+from asgiref.sync import markcoroutinefunction
+from functools import wraps
 import json
-from .alibaba_cloud_service import AlibabaCloudService
-from .tencent_cloud_service import TencentCloudService
+import time
+from .async_executor import cpu_executor, iterate_blocking, run_blocking
+from .client_registry import get_alibaba_service, get_tencent_service
 from .billing_fetch_service import BillingFetchService
-from .cost_prediction_service import CostPredictionService
+from .billing_store import BillingStore
+from .billing_utils import BillingAggregator
+from .metrics import metrics
 
-# 初始化服务
-billing_service = BillingFetchService()
-prediction_service = CostPredictionService()
+def _create_prediction_service():
+    from .cost_prediction_service import CostPredictionService
+    return CostPredictionService(fit_executor=cpu_executor)
 
-@require_http_methods(["GET"])
-def get_alibaba_cloud_balance(request):
+# 初始化服务（模型训练在共享进程池中执行）；预测服务及pandas、scikit-learn在首个分析请求时才加载，
+# 云服务商SDK在首次访问该云服务商时才加载，只有余额查询的进程不承担这些导入开销
+prediction_service = SimpleLazyObject(_create_prediction_service)
+billing_service = BillingFetchService(prediction_service=prediction_service)
+
+# 批量预测支持的预测方法及最长预测天数
+PREDICTION_METHODS = ('linear', 'random_forest', 'moving_average', 'ensemble')
+MAX_BATCH_DAYS_AHEAD = 365
+
+def async_view(methods):
+    """
+    异步视图装饰器：限制请求方法（Django 4.2 的 require_http_methods 只支持同步视图）并记录请求耗时
+    视图中的云服务商请求、数据库读写和分析计算通过 run_blocking 在有界线程池中执行，
+    部署在ASGI服务器时等待上游响应不占用工作线程；
+    每个请求的耗时按视图、方法和状态码记录到 finance_http_request_seconds（流式响应只计到开始输出）
+    """
+    def decorator(func):
+        @wraps(func)
+        async def inner(request, *args, **kwargs):
+            started = time.perf_counter()
+            status = 500
+            try:
+                if request.method not in methods:
+                    response = HttpResponseNotAllowed(methods)
+                    log_response(
+                        "Method Not Allowed (%s): %s", request.method, request.path,
+                        response=response, request=request,
+                    )
+                else:
+                    response = await func(request, *args, **kwargs)
+                status = response.status_code
+                return response
+            finally:
+                metrics.observe('finance_http_request_seconds', time.perf_counter() - started,
+                                view=func.__name__, method=request.method, status=status)
+        return inner
+    return decorator
+
+def _streaming_content(request, iterator):
+    """ASGI下在线程池中遍历同步生成器并异步输出，WSGI下直接输出同步生成器"""
+    if isinstance(request, ASGIRequest):
+        return iterate_blocking(iterator)
+    return iterator
+
+@async_view(["GET"])
+async def get_alibaba_cloud_balance(request):
     """获取阿里云账户余额"""
-    service = AlibabaCloudService()
-    balance = service.get_account_balance()
+    try:
+        service = get_alibaba_service()
+    except Exception as e:
+        print(f"Failed to initialize Alibaba Cloud service: {e}")
+        return JsonResponse({"error": "Could not retrieve Alibaba Cloud balance"}, status=500)
+    balance = await run_blocking(service.get_account_balance)
     if balance is not None:
         return JsonResponse({"provider": "Alibaba Cloud", "balance": balance})
     return JsonResponse({"error": "Could not retrieve Alibaba Cloud balance"}, status=500)
 
-@require_http_methods(["GET"])
-def get_tencent_cloud_balance(request):
+@async_view(["GET"])
+async def get_tencent_cloud_balance(request):
     """获取腾讯云账户余额"""
-    service = TencentCloudService()
-    balance = service.get_account_balance()
+    try:
+        service = get_tencent_service()
+    except Exception as e:
+        print(f"Failed to initialize Tencent Cloud service: {e}")
+        return JsonResponse({"error": "Could not retrieve Tencent Cloud balance"}, status=500)
+    balance = await run_blocking(service.get_account_balance)
     if balance is not None:
         return JsonResponse({"provider": "Tencent Cloud", "balance": balance})
     return JsonResponse({"error": "Could not retrieve Tencent Cloud balance"}, status=500)
 
-@require_http_methods(["GET"])
-def get_all_balances(request):
+@async_view(["GET"])
+async def get_all_balances(request):
     """获取所有云账户余额"""
-    result = billing_service.get_account_balances()
+    result = await run_blocking(billing_service.get_account_balances)
     return JsonResponse(result)
 
-@require_http_methods(["GET"])
-def fetch_billing_data(request):
+@async_view(["GET"])
+async def fetch_billing_data(request):
     """
     拉取账单数据
     参数:
         provider: alibaba/tencent/all
         start_date: YYYY-MM-DD
         end_date: YYYY-MM-DD
+        format: json/ndjson/json-stream，默认json；
+                ndjson 逐行输出账单明细，json-stream 分块输出JSON文档
     """
     provider = request.GET.get('provider', 'all')
     start_date = request.GET.get('start_date')
     end_date = request.GET.get('end_date')
+    response_format = request.GET.get('format', 'json')
     
     if not start_date or not end_date:
         # 默认最近30天
         start_date, end_date = billing_service.get_last_n_days(30)
     
+    if response_format in ('ndjson', 'json-stream'):
+        # 开始输出前刷新本地存储，输出开始后无法再返回错误状态码
+        providers, errors = await run_blocking(
+            billing_service.refresh_providers, provider, start_date, end_date
+        )
+        if not providers:
+            return JsonResponse({
+                'success': False,
+                'message': '无法获取账单数据' if errors else f'不支持的云服务商: {provider}',
+                'errors': errors
+            }, status=503 if errors else 400)
+        
+        if response_format == 'ndjson':
+            return StreamingHttpResponse(
+                _streaming_content(
+                    request, _stream_billing_ndjson(provider, providers, errors, start_date, end_date)
+                ),
+                content_type='application/x-ndjson; charset=utf-8'
+            )
+        return StreamingHttpResponse(
+            _streaming_content(
+                request, _stream_billing_json(provider, providers, errors, start_date, end_date)
+            ),
+            content_type='application/json; charset=utf-8'
+        )
+    
     if provider == 'all':
-        result = billing_service.fetch_all_billing_data(start_date, end_date)
+        result = await run_blocking(billing_service.fetch_all_billing_data, start_date, end_date)
     else:
-        result = billing_service.fetch_billing_data(provider, start_date, end_date)
+        result = await run_blocking(billing_service.fetch_billing_data, provider, start_date, end_date)
     
     return JsonResponse(result, safe=False)
 
-@require_http_methods(["GET"])
-def get_daily_costs(request):
+def _stream_billing_ndjson(provider, providers, errors, start_date, end_date):
+    """
+    逐行输出账单明细 (NDJSON)
+    每行一条 {"type": "line", ...}，最后一行为 {"type": "summary", ...} 汇总，
+    汇总中的 errors 和 partial 说明未能读取的服务商
+    """
+    aggregator = BillingAggregator()
+    
+    for item in billing_service.iter_billing_lines(providers, start_date, end_date):
+        aggregator.add(item)
+        yield json.dumps({'type': 'line', **item}, ensure_ascii=False) + '\n'
+    
+    yield json.dumps({
+        'type': 'summary',
+        'provider': provider,
+        'start_date': start_date,
+        'end_date': end_date,
+        'line_count': aggregator.line_count,
+        **aggregator.summary(),
+        'errors': errors,
+        'partial': bool(errors)
+    }, ensure_ascii=False) + '\n'
+
+def _stream_billing_json(provider, providers, errors, start_date, end_date, batch_size=500):
+    """分块输出JSON文档，账单明细数组按批输出，汇总字段、errors 和 partial 在数组之后输出"""
+    aggregator = BillingAggregator()
+    
+    head = json.dumps({
+        'success': True,
+        'provider': provider,
+        'start_date': start_date,
+        'end_date': end_date
+    }, ensure_ascii=False)
+    yield head[:-1] + ', "billing_data": ['
+    
+    batch = []
+    for item in billing_service.iter_billing_lines(providers, start_date, end_date):
+        batch.append(json.dumps(item, ensure_ascii=False))
+        if aggregator.line_count:
+            batch[-1] = ',' + batch[-1]
+        aggregator.add(item)
+        if len(batch) >= batch_size:
+            yield ''.join(batch)
+            batch = []
+    
+    tail = json.dumps({**aggregator.summary(), 'errors': errors, 'partial': bool(errors)}, ensure_ascii=False)
+    yield ''.join(batch) + '], ' + tail[1:]
+
+@async_view(["GET"])
+async def get_daily_costs(request):
     """
     获取每日成本
     参数:
@@ -75,23 +211,20 @@ def get_daily_costs(request):
     if not start_date or not end_date:
         start_date, end_date = billing_service.get_last_n_days(30)
     
-    if provider == 'all':
-        result = billing_service.fetch_all_billing_data(start_date, end_date)
-        daily_costs = result.get('combined_daily_costs', {})
-    else:
-        result = billing_service.fetch_billing_data(provider, start_date, end_date)
-        daily_costs = result.get('daily_costs', {})
+    daily_costs, errors = await run_blocking(billing_service.get_daily_costs, provider, start_date, end_date)
     
     return JsonResponse({
         'success': True,
         'provider': provider,
         'start_date': start_date,
         'end_date': end_date,
-        'daily_costs': daily_costs
+        'daily_costs': daily_costs,
+        'errors': errors,
+        'partial': bool(errors)
     })
 
-@require_http_methods(["GET"])
-def analyze_daily_costs(request):
+@async_view(["GET"])
+async def analyze_daily_costs(request):
     """
     分析每日成本，判断成本高低
     参数:
@@ -106,27 +239,23 @@ def analyze_daily_costs(request):
     if not start_date or not end_date:
         start_date, end_date = billing_service.get_last_n_days(30)
     
-    # 获取账单数据
-    if provider == 'all':
-        result = billing_service.fetch_all_billing_data(start_date, end_date)
-        daily_costs = result.get('combined_daily_costs', {})
-    else:
-        result = billing_service.fetch_billing_data(provider, start_date, end_date)
-        daily_costs = result.get('daily_costs', {})
+    # 读取每日成本
+    daily_costs, errors = await run_blocking(billing_service.get_daily_costs, provider, start_date, end_date)
     
     if not daily_costs:
         return JsonResponse({
             'success': False,
-            'message': '无法获取账单数据'
+            'message': '无法获取账单数据',
+            'errors': errors
         }, status=400)
     
     # 分析每日成本
-    analysis = prediction_service.daily_cost_analysis(daily_costs)
+    analysis = await run_blocking(prediction_service.daily_cost_analysis, daily_costs)
     
-    return JsonResponse(analysis)
+    return JsonResponse({**analysis, 'errors': errors, 'partial': bool(errors)})
 
-@require_http_methods(["GET"])
-def predict_costs(request):
+@async_view(["GET"])
+async def predict_costs(request):
     """
     预测未来成本
     参数:
@@ -145,27 +274,25 @@ def predict_costs(request):
     if not start_date or not end_date:
         start_date, end_date = billing_service.get_last_n_days(30)
     
-    # 获取历史账单数据
-    if provider == 'all':
-        result = billing_service.fetch_all_billing_data(start_date, end_date)
-        daily_costs = result.get('combined_daily_costs', {})
-    else:
-        result = billing_service.fetch_billing_data(provider, start_date, end_date)
-        daily_costs = result.get('daily_costs', {})
+    # 读取历史每日成本
+    daily_costs, errors = await run_blocking(billing_service.get_daily_costs, provider, start_date, end_date)
     
     if not daily_costs:
         return JsonResponse({
             'success': False,
-            'message': '无法获取历史账单数据'
+            'message': '无法获取历史账单数据',
+            'errors': errors
         }, status=400)
     
     # 预测未来成本
-    predictions = prediction_service.predict_costs(daily_costs, days_ahead, method)
+    predictions = await run_blocking(
+        prediction_service.predict_costs, daily_costs, days_ahead, method, provider
+    )
     
-    return JsonResponse(predictions)
+    return JsonResponse({**predictions, 'errors': errors, 'partial': bool(errors)})
 
-@require_http_methods(["GET"])
-def detect_anomalies(request):
+@async_view(["GET"])
+async def detect_anomalies(request):
     """
     检测异常成本
     参数:
@@ -182,22 +309,18 @@ def detect_anomalies(request):
     if not start_date or not end_date:
         start_date, end_date = billing_service.get_last_n_days(30)
     
-    # 获取账单数据
-    if provider == 'all':
-        result = billing_service.fetch_all_billing_data(start_date, end_date)
-        daily_costs = result.get('combined_daily_costs', {})
-    else:
-        result = billing_service.fetch_billing_data(provider, start_date, end_date)
-        daily_costs = result.get('daily_costs', {})
+    # 读取每日成本
+    daily_costs, errors = await run_blocking(billing_service.get_daily_costs, provider, start_date, end_date)
     
     if not daily_costs:
         return JsonResponse({
             'success': False,
-            'message': '无法获取账单数据'
+            'message': '无法获取账单数据',
+            'errors': errors
         }, status=400)
     
     # 检测异常
-    anomalies = prediction_service.detect_anomalies(daily_costs, threshold)
+    anomalies = await run_blocking(prediction_service.detect_anomalies, daily_costs, threshold)
     
     return JsonResponse({
         'success': True,
@@ -205,11 +328,13 @@ def detect_anomalies(request):
         'start_date': start_date,
         'end_date': end_date,
         'anomalies': anomalies,
-        'anomaly_count': len(anomalies)
+        'anomaly_count': len(anomalies),
+        'errors': errors,
+        'partial': bool(errors)
     })
 
-@require_http_methods(["GET"])
-def full_analysis(request):
+@async_view(["GET"])
+async def full_analysis(request):
     """
     完整的成本分析和预测
     参数:
@@ -226,15 +351,16 @@ def full_analysis(request):
     if not start_date or not end_date:
         start_date, end_date = billing_service.get_last_n_days(30)
     
-    # 使用统一服务进行分析和预测
-    result = billing_service.analyze_and_predict(
-        provider, start_date, end_date, prediction_days
+    # 使用统一服务进行分析和预测；同时到达的相同请求共享一次拉取和计算
+    result = await billing_service.flights.do_async(
+        ('analyze_and_predict', provider, start_date, end_date, prediction_days),
+        billing_service.analyze_and_predict, provider, start_date, end_date, prediction_days
     )
     
     return JsonResponse(result)
 
-@require_http_methods(["GET"])
-def compare_with_budget(request):
+@async_view(["GET"])
+async def compare_with_budget(request):
     """
     与预算进行比较
     参数:
@@ -259,22 +385,178 @@ def compare_with_budget(request):
     if not start_date or not end_date:
         start_date, end_date = billing_service.get_last_n_days(30)
     
-    # 获取账单数据
-    if provider == 'all':
-        result = billing_service.fetch_all_billing_data(start_date, end_date)
-        daily_costs = result.get('combined_daily_costs', {})
-    else:
-        result = billing_service.fetch_billing_data(provider, start_date, end_date)
-        daily_costs = result.get('daily_costs', {})
+    # 读取每日成本
+    daily_costs, errors = await run_blocking(billing_service.get_daily_costs, provider, start_date, end_date)
     
     if not daily_costs:
         return JsonResponse({
             'success': False,
-            'message': '无法获取账单数据'
+            'message': '无法获取账单数据',
+            'errors': errors
         }, status=400)
     
     # 与预算比较
-    comparison = prediction_service.compare_with_baseline(daily_costs, daily_budget)
+    comparison = await run_blocking(prediction_service.compare_with_baseline, daily_costs, daily_budget)
     
-    return JsonResponse(comparison)
+    return JsonResponse({**comparison, 'errors': errors, 'partial': bool(errors)})
 
+
+@async_view(["GET"])
+async def get_cost_breakdown(request):
+    """
+    按产品/地域等维度分解成本（读取预先汇总的成本聚合数据）
+    参数:
+        provider: alibaba/tencent/all
+        start_date: YYYY-MM-DD
+        end_date: YYYY-MM-DD
+        group_by: 逗号分隔的维度 date/provider/product/region，默认product
+        product: 逗号分隔的产品名称，只统计这些产品
+        region: 逗号分隔的地域，只统计这些地域
+    """
+    provider = request.GET.get('provider', 'all')
+    start_date = request.GET.get('start_date')
+    end_date = request.GET.get('end_date')
+    group_by = [d for d in request.GET.get('group_by', 'product').split(',') if d]
+    products = [p for p in request.GET.get('product', '').split(',') if p]
+    regions = [r for r in request.GET.get('region', '').split(',') if r]
+    
+    unsupported = [d for d in group_by if d not in BillingStore.ROLLUP_DIMENSIONS]
+    if unsupported:
+        return JsonResponse({
+            'success': False,
+            'message': f'不支持的分组维度: {",".join(unsupported)}'
+        }, status=400)
+    
+    if not start_date or not end_date:
+        start_date, end_date = billing_service.get_last_n_days(30)
+    
+    result = await run_blocking(
+        billing_service.get_cost_breakdown, provider, start_date, end_date, group_by, products, regions
+    )
+    
+    return JsonResponse(result)
+
+@markcoroutinefunction
+@csrf_exempt
+@async_view(["GET", "POST"])
+async def predict_batch(request):
+    """
+    批量预测多个成本序列
+    GET 按维度读取本地账单后预测，参数:
+        provider: alibaba/tencent/all
+        group_by: product/region/provider，默认product
+        start_date: YYYY-MM-DD
+        end_date: YYYY-MM-DD
+        days_ahead: 预测天数，默认30
+        method: 预测方法，默认ensemble
+    POST 预测请求体中的序列，JSON:
+        series: {series_id: {date: cost}}，或
+        columns: {"series_id": [...], "date": [...], "cost": [...]}（长格式列数组）
+        days_ahead, method: 同GET
+    """
+    if request.method == 'POST':
+        try:
+            body = json.loads(request.body or b'{}')
+        except json.JSONDecodeError:
+            return JsonResponse({'success': False, 'message': '请求体不是有效的JSON'}, status=400)
+        if not isinstance(body, dict):
+            return JsonResponse({'success': False, 'message': '请求体必须是JSON对象'}, status=400)
+        params = body
+    else:
+        body = {}
+        params = request.GET
+    
+    days_ahead = params.get('days_ahead', 30)
+    if isinstance(days_ahead, str) and days_ahead.strip().isdigit():
+        days_ahead = int(days_ahead)
+    if type(days_ahead) is not int or not 1 <= days_ahead <= MAX_BATCH_DAYS_AHEAD:
+        return JsonResponse({
+            'success': False,
+            'message': f'days_ahead 必须是 1 到 {MAX_BATCH_DAYS_AHEAD} 之间的整数'
+        }, status=400)
+    
+    method = params.get('method', 'ensemble')
+    if method not in PREDICTION_METHODS:
+        return JsonResponse({
+            'success': False,
+            'message': f'不支持的预测方法: {method}'
+        }, status=400)
+    
+    errors = []
+    if request.method == 'POST':
+        if 'columns' in body:
+            import pandas as pd
+            try:
+                series = pd.DataFrame(body['columns'])
+                series = series[['series_id', 'date', 'cost']]
+            except (KeyError, ValueError, TypeError):
+                return JsonResponse({
+                    'success': False,
+                    'message': 'columns 需要包含等长的 series_id、date、cost 数组'
+                }, status=400)
+        else:
+            series = body.get('series')
+            if not isinstance(series, dict):
+                return JsonResponse({
+                    'success': False,
+                    'message': '请提供 series 或 columns'
+                }, status=400)
+            if not all(_is_daily_costs(daily_costs) for daily_costs in series.values()):
+                return JsonResponse({
+                    'success': False,
+                    'message': 'series 的每个序列需要是 {日期: 成本} 对象，成本为数值'
+                }, status=400)
+    else:
+        provider = request.GET.get('provider', 'all')
+        group_by = request.GET.get('group_by', 'product')
+        start_date = request.GET.get('start_date')
+        end_date = request.GET.get('end_date')
+        
+        if group_by not in ('product', 'region', 'provider'):
+            return JsonResponse({
+                'success': False,
+                'message': f'不支持的分组维度: {group_by}'
+            }, status=400)
+        
+        if not start_date or not end_date:
+            start_date, end_date = billing_service.get_last_n_days(30)
+        
+        series, errors = await run_blocking(
+            billing_service.get_grouped_daily_costs, provider, start_date, end_date, group_by
+        )
+    
+    if len(series) == 0:
+        return JsonResponse({
+            'success': False,
+            'message': '无法获取历史账单数据',
+            'errors': errors
+        }, status=400)
+    
+    from .cost_prediction_service import InvalidSeriesError
+    try:
+        results = await run_blocking(prediction_service.predict_batch, series, days_ahead, method)
+    except InvalidSeriesError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    
+    return JsonResponse({
+        'success': True,
+        'series_count': len(results),
+        'results': {str(series_id): result for series_id, result in results.items()},
+        'errors': errors,
+        'partial': bool(errors)
+    })
+
+def _is_daily_costs(value):
+    """是否为 {日期: 成本} 对象，成本为数值"""
+    return isinstance(value, dict) and all(
+        isinstance(cost, (int, float)) and not isinstance(cost, bool) for cost in value.values()
+    )
+
+@async_view(["GET"])
+async def get_metrics(request):
+    """
+    运行指标（Prometheus文本格式）
+    包括接口耗时、云服务商接口调用次数和耗时、分析结果缓存命中率、模型复用次数和入库账单条数，
+    多进程部署时每个进程单独统计
+    """
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -1,6 +1,71 @@
 import { NextApiRequest, NextApiResponse } from 'next';
 import { TencentCloudFinanceService } from '../../lib/tencentCloudService';
 
+// Django 账单接口地址
+const FINANCE_API_BASE_URL = process.env.FINANCE_API_BASE_URL || 'http://localhost:8000/api/finance';
+
+/**
+ * 逐行读取 NDJSON 响应流
+ * 每解析出一行立即回调，不在内存中缓存完整响应
+ */
+export async function readNdjson(
+  body: ReadableStream<Uint8Array>,
+  onRecord: (record: any, line: string) => void
+): Promise<void> {
+  const reader = body.getReader();
+  const decoder = new TextDecoder();
+  let buffered = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) {
+      break;
+    }
+
+    buffered += decoder.decode(value, { stream: true });
+    const lines = buffered.split('\n');
+    buffered = lines.pop() ?? '';
+
+    for (const line of lines) {
+      if (line.trim()) {
+        onRecord(JSON.parse(line), line);
+      }
+    }
+  }
+
+  buffered += decoder.decode();
+  if (buffered.trim()) {
+    onRecord(JSON.parse(buffered), buffered);
+  }
+}
+
+/**
+ * 流式转发账单明细
+ * 从 Django 的 /billing/?format=ndjson 接口逐行读取，并立即写回客户端
+ */
+async function streamBillingLines(req: NextApiRequest, res: NextApiResponse) {
+  const { provider, startDate, endDate } = req.query;
+  const params = new URLSearchParams({ provider: (provider as string) || 'all', format: 'ndjson' });
+  if (startDate && endDate) {
+    params.set('start_date', startDate as string);
+    params.set('end_date', endDate as string);
+  }
+
+  const upstream = await fetch(`${FINANCE_API_BASE_URL}/billing/?${params.toString()}`);
+  if (!upstream.ok || !upstream.body) {
+    return res.status(502).json({ error: `账单服务请求失败: ${upstream.status}` });
+  }
+
+  res.status(200);
+  res.setHeader('Content-Type', 'application/x-ndjson; charset=utf-8');
+
+  await readNdjson(upstream.body, (_record, line) => {
+    res.write(line + '\n');
+  });
+
+  res.end();
+}
+
 /**
  * 腾讯云财务信息API路由
  * 提供账单查询、费用统计等接口
@@ -11,6 +76,11 @@ export default async function handler(req: NextApiRequest, res: NextApiResponse)
   }
 
   try {
+    // 账单明细流式转发不需要腾讯云凭证
+    if (req.query.action === 'billing-stream') {
+      return await streamBillingLines(req, res);
+    }
+
     // 从环境变量获取腾讯云凭证
     const secretId = process.env.TENCENT_SECRET_ID;
     const secretKey = process.env.TENCENT_SECRET_KEY;
@@ -62,7 +132,7 @@ export default async function handler(req: NextApiRequest, res: NextApiResponse)
 
       default:
         return res.status(400).json({ 
-          error: '无效的action参数，支持的值：bill-overview, bill-details, cost-statistics, account-balance, consumption-trend' 
+          error: '无效的action参数，支持的值：bill-overview, bill-details, cost-statistics, account-balance, consumption-trend, billing-stream' 
         });
     }
 
@@ -74,6 +144,10 @@ export default async function handler(req: NextApiRequest, res: NextApiResponse)
 
   } catch (error: any) {
     console.error('API错误:', error);
+    // 流式响应已开始输出时无法再返回错误JSON
+    if (res.headersSent) {
+      return res.end();
+    }
     res.status(500).json({
       success: false,
       error: error.message || '服务器内部错误',
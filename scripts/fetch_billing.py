@@ -12,11 +12,14 @@ from datetime import datetime, timedelta
 import argparse
 
 # 添加项目路径
-sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# 设置环境变量（如果需要）
+# 账单数据存储在Django数据库中，需要先初始化Django
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'price_finanle_django.settings')
 
+import django
+django.setup()
+
 # 导入服务
 from finance_api.billing_fetch_service import BillingFetchService
 
@@ -25,7 +28,7 @@ def main():
     parser = argparse.ArgumentParser(description='云成本账单拉取和预测工具')
     
     parser.add_argument('action', 
-                       choices=['fetch', 'analyze', 'predict', 'balance', 'anomaly', 'full'],
+                       choices=['fetch', 'sync', 'analyze', 'predict', 'balance', 'anomaly', 'full'],
                        help='操作类型')
     
     parser.add_argument('--provider', 
@@ -45,7 +48,16 @@ def main():
                        help='预测天数或历史天数 (默认: 30)')
     
     parser.add_argument('--output',
-                       help='输出JSON文件路径')
+                       help='输出JSON文件路径，--output-format parquet 时为归档目录')
+    
+    parser.add_argument('--output-format',
+                       choices=['json', 'parquet'],
+                       default='json',
+                       help='输出格式: json 保存操作结果，parquet 将账单明细按服务商/月份分区归档 (默认: json)')
+    
+    parser.add_argument('--resync-days',
+                       type=int,
+                       help='增量同步时重新拉取的最近天数 (默认: BILLING_SETTLE_DAYS)')
     
     parser.add_argument('--budget',
                        type=float,
@@ -80,6 +92,22 @@ def main():
         print(f"\n✓ 账单数据拉取完成")
         print(f"  总成本: ¥{result.get('total_cost', 0):.2f}")
         
+    elif args.action == 'sync':
+        print("正在增量同步账单数据...")
+        providers = ['alibaba', 'tencent'] if args.provider == 'all' else [args.provider]
+        result = {'providers': [
+            service.sync_billing_data(provider, resync_days=args.resync_days)
+            for provider in providers
+        ]}
+        
+        print(f"\n✓ 增量同步完成")
+        for provider, sync_result in zip(providers, result['providers']):
+            if sync_result['success']:
+                print(f"  {sync_result['provider']}: {sync_result['start_date']} 至 {sync_result['end_date']}, "
+                      f"{sync_result['line_count']} 条明细, 已结算至 {sync_result['settled_through']}")
+            else:
+                print(f"  {provider}: {sync_result['message']}")
+        
     elif args.action == 'balance':
         print("正在查询账户余额...")
         result = service.get_account_balances()
@@ -188,9 +216,23 @@ def main():
         anomalies = result.get('anomalies', [])
         if anomalies:
             print(f"\n⚠️  异常检测: 发现 {len(anomalies)} 个异常")
+        
+        timings = result.get('timings_ms', {})
+        if timings:
+            print(f"\n⏱  各阶段耗时 (毫秒):")
+            for stage, elapsed in timings.items():
+                print(f"  {stage}: {elapsed:.2f}")
     
     # 保存结果
-    if result and args.output:
+    if args.output_format == 'parquet':
+        export = service.export_to_parquet(args.provider, args.start_date, args.end_date, args.output)
+        if export['success']:
+            print(f"\n✓ 账单明细已归档到: {export['archive_dir']}")
+            for provider, count in export['line_counts'].items():
+                print(f"  {provider}: {count} 条明细")
+        else:
+            print(f"\n✗ 归档失败: {export['error']}")
+    elif result and args.output:
         service.export_to_json(result, args.output)
         print(f"\n✓ 结果已保存到: {args.output}")
     
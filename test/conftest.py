@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试共用的数据和服务夹具
+"""
+
+import sys
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from finance_api import model_registry
+from finance_api.cost_prediction_service import CostPredictionService
+
+
+def build_daily_costs(days=30, base=100, trend=0.0, start=datetime(2024, 1, 1)):
+    """
+    生成按星期波动的每日成本序列
+    :param days: 天数
+    :param base: 基础成本
+    :param trend: 每天递增的成本
+    :param start: 开始日期
+    :return: {date: cost}
+    """
+    return {
+        (start + timedelta(days=i)).strftime('%Y-%m-%d'): base + (i % 7) * 5 + i * trend
+        for i in range(days)
+    }
+
+
+class CountingPredictionService(CostPredictionService):
+    """记录模型训练次数"""
+
+    def __init__(self, cache=None, model_registry=None):
+        super().__init__(cache=cache, model_registry=model_registry)
+        self.train_count = 0
+
+    def fit_models(self, df):
+        self.train_count += 1
+        return super().fit_models(df)
+
+
+@pytest.fixture
+def make_daily_costs():
+    return build_daily_costs
+
+
+@pytest.fixture
+def counting_service():
+    return CountingPredictionService
+
+
+@pytest.fixture(autouse=True)
+def isolated_model_dir(tmp_path, monkeypatch):
+    """默认模型注册表写入临时目录，测试不在项目或用户目录下留下模型文件"""
+    monkeypatch.setattr(model_registry.model_registry, 'model_dir', str(tmp_path / 'model_store'))
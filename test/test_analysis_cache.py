@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试分析结果缓存（不需要云SDK）
+"""
+
+import sys
+import os
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from finance_api.analysis_cache import AnalysisCache
+from finance_api.cost_prediction_service import CostPredictionService
+
+
+def test_repeated_prediction_uses_cache(make_daily_costs, counting_service):
+    """测试相同序列和参数只训练一次"""
+    service = counting_service(cache=AnalysisCache(max_entries=8, ttl_seconds=60, backend=''))
+    daily_costs = make_daily_costs()
+
+    first = service.predict_costs(daily_costs, days_ahead=7)
+    second = service.predict_costs(daily_costs, 7, 'ensemble')
+    third = service.predict_costs(daily_costs, days_ahead=14)
+
+    assert first == second
+    assert len(third['predictions']) == 14
+    assert service.train_count == 2
+
+
+def test_cached_results_are_copies_and_invalidated(make_daily_costs, counting_service):
+    """测试缓存结果不受调用方修改影响，失效后重新计算"""
+    cache = AnalysisCache(max_entries=8, ttl_seconds=60, backend='')
+    service = counting_service(cache=cache)
+    daily_costs = make_daily_costs()
+
+    result = service.predict_costs(daily_costs, days_ahead=7)
+    result['predictions'].clear()
+    assert len(service.predict_costs(daily_costs, days_ahead=7)['predictions']) == 7
+
+    cache.invalidate()
+    service.predict_costs(daily_costs, days_ahead=7)
+    assert service.train_count == 2
+
+
+def test_lru_is_bounded(make_daily_costs):
+    """测试缓存条数有上限"""
+    cache = AnalysisCache(max_entries=2, ttl_seconds=60, backend='')
+    service = CostPredictionService(cache=cache)
+
+    for threshold in (1.0, 1.5, 2.0):
+        service.detect_anomalies(make_daily_costs(), threshold=threshold)
+
+    assert len(cache._entries) == 2
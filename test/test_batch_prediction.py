@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试多序列批量预测（不需要云SDK）
+"""
+
+import sys
+import os
+from datetime import datetime
+
+import pandas as pd
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from finance_api.cost_prediction_service import CostPredictionService
+
+
+def test_batch_matches_single_series_prediction(make_daily_costs):
+    """测试批量预测结果与逐个调用predict_costs一致"""
+    service = CostPredictionService(cache=None, model_registry=None)
+    series = {
+        'ECS': make_daily_costs(45, trend=0.3),
+        'OSS': make_daily_costs(20, base=10, trend=0.3, start=datetime(2024, 2, 1)),
+        'CDN': make_daily_costs(45, base=50, trend=0.3),
+        'RDS': make_daily_costs(3, trend=0.3),
+    }
+
+    results = service.predict_batch(series, days_ahead=14, method='ensemble', max_workers=1)
+
+    for series_id, daily_costs in series.items():
+        expected = service.predict_costs(daily_costs, days_ahead=14, method='ensemble')
+        assert results[series_id]['success'] == expected['success']
+        # 批量线性回归与逐个训练只有浮点误差，四舍五入后最多相差0.01
+        for batch_pred, single_pred in zip(results[series_id]['predictions'], expected['predictions']):
+            assert batch_pred['date'] == single_pred['date']
+            assert abs(batch_pred['predicted_cost'] - single_pred['predicted_cost']) <= 0.011
+    assert results['RDS']['success'] is False
+
+
+def test_batch_accepts_long_format_dataframe(make_daily_costs):
+    """测试长格式DataFrame输入，同一序列同一天的多行合并"""
+    service = CostPredictionService(cache=None, model_registry=None)
+    rows = [
+        {'product': product, 'date': date, 'cost': cost / 2}
+        for product, base in (('ECS', 100), ('OSS', 10))
+        for date, cost in make_daily_costs(30, base=base, trend=0.3).items()
+        for _ in range(2)
+    ]
+
+    results = service.predict_batch(
+        pd.DataFrame(rows), days_ahead=7, method='linear', series_col='product')
+
+    assert sorted(results) == ['ECS', 'OSS']
+    assert results['OSS'] == service.predict_costs(make_daily_costs(30, base=10, trend=0.3), days_ahead=7, method='linear')
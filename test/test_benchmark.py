@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试基准测试工具和模拟的云服务商账单接口（不需要云SDK）
+"""
+
+import sys
+import os
+from types import SimpleNamespace
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from finance_api.benchmark import compare_results, synthetic_daily_costs
+from finance_api.fake_providers import FakeBillingClient, FakeBillingData, FakeBssClient, FakeProviderError
+
+
+def test_fake_data_pages_cover_range_without_gaps():
+    """测试按偏移量分页读取的明细连续、不重复，且相同参数生成相同数据"""
+    data = FakeBillingData(rows_per_day=7, seed=1)
+    rows = []
+    offset = 0
+    while True:
+        page, total = data.page('2024-01-30', '2024-02-02', offset, 5)
+        if not page:
+            break
+        rows.extend(page)
+        offset += len(page)
+
+    assert total == 28
+    assert len(rows) == 28
+    assert len({(row['date'], row['resource_id']) for row in rows}) == 28
+    assert [row['date'] for row in rows[::7]] == ['2024-01-30', '2024-01-31', '2024-02-01', '2024-02-02']
+    assert FakeBillingData(rows_per_day=7, seed=1).day_rows('2024-02-01') == rows[14:21]
+
+
+def test_fake_clients_cap_page_size_and_count_calls():
+    """测试模拟客户端按接口的单页上限返回，并统计调用次数"""
+    data = FakeBillingData(rows_per_day=200)
+    bss = FakeBssClient(data)
+    response = bss.query_instance_bill_with_options(SimpleNamespace(
+        billing_cycle='2024-02', billing_date=None, page_num=1, page_size=1000))
+    assert len(response.body.data.items.item) == 300
+    assert response.body.data.total_count == 29 * 200
+
+    billing = FakeBillingClient(data)
+    response = billing.DescribeBillDetail(SimpleNamespace(
+        BeginTime='2024-02-01 00:00:00', EndTime='2024-02-01 23:59:59', Offset=150, Limit=100, NeedRecordNum=1))
+    assert len(response.DetailSet) == 50
+    assert response.Total == 200
+    assert (bss.calls, billing.calls, billing.items_returned) == (1, 1, 50)
+
+
+def test_fake_bss_rejects_daily_query_without_billing_date():
+    """测试模拟的QueryInstanceBill与真实接口一致，按天粒度查询时必须指定账单日期"""
+    bss = FakeBssClient(FakeBillingData(rows_per_day=5))
+    with pytest.raises(FakeProviderError) as error:
+        bss.query_instance_bill_with_options(SimpleNamespace(
+            billing_cycle='2024-02', billing_date=None, granularity='DAILY', page_num=1, page_size=100))
+    assert error.value.code == 'InvalidParameter'
+
+    response = bss.query_instance_bill_with_options(SimpleNamespace(
+        billing_cycle='2024-02', billing_date='2024-02-03', granularity='DAILY', page_num=1, page_size=100))
+    assert {item.billing_date for item in response.body.data.items.item} == {'2024-02-03'}
+
+
+def test_compare_results_reports_regressions():
+    """测试与基线比较：超过容差的场景视为回退，耗时很短的场景和新场景不比较"""
+    baseline = {'results': [
+        {'name': 'predict/days=365', 'seconds': 0.2},
+        {'name': 'fetch/cold/tencent', 'seconds': 1.0},
+        {'name': 'batch/series=1', 'seconds': 0.001},
+    ]}
+    current = [
+        {'name': 'predict/days=365', 'seconds': 0.3},
+        {'name': 'fetch/cold/tencent', 'seconds': 1.1},
+        {'name': 'batch/series=1', 'seconds': 0.004},
+        {'name': 'batch/series=10', 'seconds': 5.0},
+    ]
+
+    regressions = compare_results(current, baseline, tolerance=0.2)
+
+    assert regressions == [{'name': 'predict/days=365', 'baseline': 0.2, 'current': 0.3, 'ratio': 1.5}]
+
+
+def test_synthetic_series_is_deterministic():
+    """测试模拟的每日成本序列长度正确且可复现"""
+    costs = synthetic_daily_costs(1825, seed=3)
+
+    assert len(costs) == 1825
+    assert max(costs) == '2024-06-30'
+    assert costs == synthetic_daily_costs(1825, seed=3)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试Parquet账单归档（需要pyarrow，不需要云SDK）
+"""
+
+import sys
+import os
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+pytest.importorskip('pyarrow')
+
+from finance_api.billing_archive import BillingArchive
+from finance_api.cost_prediction_service import CostPredictionService
+
+
+def make_lines(month, days, products=('CVM', 'COS')):
+    return [
+        {'date': f'{month}-{day:02d}', 'product_name': product, 'resource_id': f'{product}-{k}',
+         'region': 'ap-guangzhou', 'cost': 10.0 * (k + 1) + day}
+        for day in range(1, days + 1)
+        for product in products
+        for k in range(2)
+    ]
+
+
+def test_write_replaces_range_and_reads_with_filters(tmp_path):
+    """测试按日期范围替换写入，以及按服务商、日期、产品过滤读取"""
+    archive = BillingArchive(str(tmp_path))
+    assert archive.write('tencent', '2024-01-01', '2024-02-28',
+                         make_lines('2024-01', 31) + make_lines('2024-02', 28)) == 236
+    archive.write('alibaba', '2024-01-01', '2024-01-31', make_lines('2024-01', 31, products=('ECS',)))
+
+    # 重新写入一天，只替换该天的数据
+    archive.write('tencent', '2024-01-10', '2024-01-10',
+                  [{'date': '2024-01-10', 'product_name': 'CVM', 'resource_id': 'new', 'cost': 1.0}])
+
+    df = archive.read(['tencent'], '2024-01-09', '2024-01-11', products=['CVM'])
+    assert df['date'].dt.strftime('%Y-%m-%d').tolist() == ['2024-01-09'] * 2 + ['2024-01-10'] + ['2024-01-11'] * 2
+    assert set(df['provider']) == {'tencent'}
+    assert archive.read(['alibaba'], '2024-02-01', '2024-02-28').empty
+    assert sorted(os.listdir(tmp_path / 'provider=tencent')) == ['month=2024-01', 'month=2024-02']
+
+
+def test_daily_costs_frame_feeds_prediction(tmp_path):
+    """测试归档读取的每日成本可直接用于预测，结果与字典输入一致"""
+    archive = BillingArchive(str(tmp_path))
+    lines = make_lines('2024-01', 31)
+    archive.write('tencent', '2024-01-01', '2024-01-31', lines)
+
+    daily_frame = archive.read_daily_costs(['tencent'], '2024-01-01', '2024-01-31')
+    daily_costs = {}
+    for item in lines:
+        daily_costs[item['date']] = daily_costs.get(item['date'], 0) + item['cost']
+
+    service = CostPredictionService(cache=None, model_registry=None)
+    assert service.predict_costs(daily_frame, days_ahead=7) == service.predict_costs(daily_costs, days_ahead=7)
+    assert service.daily_cost_analysis(daily_frame) == service.daily_cost_analysis(daily_costs)
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试账单分页并发拉取和限流（不需要云SDK）
+"""
+
+import sys
+import os
+import time
+import threading
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from finance_api.billing_pager import ConcurrentPager, Prefetched
+from finance_api.rate_limiter import RateLimiter
+
+
+def test_pager_keeps_order_and_runs_concurrently():
+    """测试并发拉取结果保持提交顺序"""
+    in_flight = []
+    peak = []
+    lock = threading.Lock()
+
+    def fetch(page):
+        with lock:
+            in_flight.append(page)
+            peak.append(len(in_flight))
+        time.sleep(0.05 if page % 2 else 0.01)
+        with lock:
+            in_flight.remove(page)
+        return page
+
+    started = time.monotonic()
+    with ConcurrentPager(max_workers=4) as pager:
+        results = list(pager.map_ordered(lambda page=page: fetch(page) for page in range(12)))
+    elapsed = time.monotonic() - started
+
+    assert results == list(range(12))
+    assert max(peak) <= 4
+    assert elapsed < 12 * 0.03
+
+
+def test_pager_accepts_prefetched_results():
+    """测试已获取的结果不再发起请求"""
+    with ConcurrentPager(max_workers=2) as pager:
+        results = list(pager.map_ordered([Prefetched('first'), lambda: 'second']))
+
+    assert results == ['first', 'second']
+
+
+def test_rate_limiter_limits_qps():
+    """测试令牌桶限流"""
+    limiter = RateLimiter(rate=20, burst=1)
+
+    started = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    elapsed = time.monotonic() - started
+
+    # 第一个请求使用初始令牌，其余5个请求每个等待约50ms
+    assert elapsed >= 0.2
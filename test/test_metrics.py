@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试运行指标（不需要云SDK）
+"""
+
+import sys
+import os
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from finance_api.metrics import MetricsRegistry
+
+
+def test_track_counts_status_and_records_latency():
+    """测试track按调用结果计数并记录耗时，异常继续抛出"""
+    registry = MetricsRegistry(buckets=(0.1, 1))
+
+    with registry.track('finance_provider_request_seconds', 'finance_provider_requests_total',
+                        provider='tencent', api='DescribeBillDetail'):
+        pass
+    with pytest.raises(RuntimeError):
+        with registry.track('finance_provider_request_seconds', 'finance_provider_requests_total',
+                            provider='tencent', api='DescribeBillDetail'):
+            raise RuntimeError('RequestLimitExceeded')
+
+    labels = {'provider': 'tencent', 'api': 'DescribeBillDetail'}
+    assert registry.counter_value('finance_provider_requests_total', status='ok', **labels) == 1
+    assert registry.counter_value('finance_provider_requests_total', status='error', **labels) == 1
+    assert registry.counter_total('finance_provider_requests_total') == 2
+
+    text = registry.render()
+    assert '# TYPE finance_provider_request_seconds histogram' in text
+    assert ('finance_provider_request_seconds_bucket{api="DescribeBillDetail",provider="tencent",le="+Inf"} 2'
+            in text)
+    assert 'finance_provider_request_seconds_count{api="DescribeBillDetail",provider="tencent"} 2' in text
+
+
+def test_render_prometheus_text():
+    """测试直方图分桶累计、计数器和回调指标的导出格式"""
+    registry = MetricsRegistry(buckets=(0.1, 1))
+    registry.observe('finance_model_fit_seconds', 0.05)
+    registry.observe('finance_model_fit_seconds', 0.5)
+    registry.observe('finance_model_fit_seconds', 5)
+    registry.inc('finance_billing_rows_ingested_total', 120, provider='alibaba')
+    registry.register_gauge('finance_analysis_cache_entries', lambda: 3)
+    registry.register_gauge('broken', lambda: 1 / 0)
+
+    lines = registry.render().splitlines()
+
+    assert 'finance_model_fit_seconds_bucket{le="0.1"} 1' in lines
+    assert 'finance_model_fit_seconds_bucket{le="1"} 2' in lines
+    assert 'finance_model_fit_seconds_bucket{le="+Inf"} 3' in lines
+    assert 'finance_model_fit_seconds_count 3' in lines
+    assert 'finance_billing_rows_ingested_total{provider="alibaba"} 120' in lines
+    assert '# TYPE finance_analysis_cache_entries gauge' in lines
+    assert 'finance_analysis_cache_entries 3' in lines
+    # 回调出错的指标跳过，不影响其他指标
+    assert not any(line.startswith('broken') for line in lines)
+
+
+def test_label_values_are_escaped():
+    """测试标签值中的引号和换行被转义"""
+    registry = MetricsRegistry()
+    registry.inc('finance_provider_items_total', provider='a"b\nc')
+
+    assert 'finance_provider_items_total{provider="a\\"b\\nc"} 1' in registry.render()
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试预测模型注册表（不需要云SDK）
+"""
+
+import sys
+import os
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from finance_api.cost_prediction_service import CostPredictionService
+from finance_api.model_registry import ModelRegistry
+
+
+def test_models_are_persisted_and_reused(tmp_path, make_daily_costs, counting_service):
+    """测试相同数据复用磁盘上的模型，新数据重新训练"""
+    service = counting_service(model_registry=ModelRegistry(model_dir=str(tmp_path)))
+    first = service.predict_costs(make_daily_costs(), days_ahead=7, provider='tencent')
+    assert service.train_count == 1
+
+    # 新进程（新注册表实例）从磁盘加载模型
+    restarted = counting_service(model_registry=ModelRegistry(model_dir=str(tmp_path)))
+    second = restarted.predict_costs(make_daily_costs(), days_ahead=7, provider='tencent')
+    assert restarted.train_count == 0
+    assert first == second
+
+    restarted.predict_costs(make_daily_costs(base=110), days_ahead=7, provider='tencent')
+    assert restarted.train_count == 1
+
+
+def test_prediction_does_not_fit_shared_templates(tmp_path, make_daily_costs):
+    """测试预测不修改服务实例上的模型"""
+    service = CostPredictionService(cache=None, model_registry=ModelRegistry(model_dir=str(tmp_path)))
+    service.predict_costs(make_daily_costs(), days_ahead=7, provider='../alibaba')
+
+    assert not hasattr(service.models['random_forest'], 'estimators_')
+    assert not os.path.exists(os.path.join(os.path.dirname(str(tmp_path)), 'alibaba'))
+
+
+def test_failed_training_releases_key_lock(tmp_path):
+    """测试训练失败或抛出异常时不保留该模型的锁"""
+    registry = ModelRegistry(model_dir=str(tmp_path))
+
+    assert registry.get_or_train('tencent', 'a' * 32, 'features', lambda: None) is None
+
+    def fail():
+        raise RuntimeError('fit failed')
+
+    with pytest.raises(RuntimeError):
+        registry.get_or_train('tencent', 'b' * 32, 'features', fail)
+    assert registry._key_locks == {}
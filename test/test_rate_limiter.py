@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试跨进程共享的云服务商接口限流（不需要云SDK）
+"""
+
+import sys
+import os
+import time
+import multiprocessing
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from finance_api.rate_limiter import ProviderRateLimits, RateLimiter, SharedRateLimiter, parse_api_rates
+
+
+def _acquire_times(path, count, queue):
+    limiter = SharedRateLimiter(path, 'tencent:account:DescribeBillDetail', rate=20)
+    for _ in range(count):
+        limiter.acquire()
+        queue.put(time.time())
+
+
+def test_processes_share_one_bucket(tmp_path):
+    """测试多个进程共享同一个令牌桶，总请求速率不超过配额且请求均匀间隔"""
+    path = str(tmp_path / 'limits.sqlite3')
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=_acquire_times, args=(path, 5, queue)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    times = sorted(queue.get(timeout=10) for _ in range(10))
+    for worker in workers:
+        worker.join()
+
+    # 两个进程共10个请求，首个使用初始令牌，之后每50ms一个
+    assert times[-1] - times[0] >= 0.4
+    assert min(b - a for a, b in zip(times, times[1:])) >= 0.03
+
+
+def test_limits_are_keyed_by_account_and_api(tmp_path):
+    """测试不同账户、不同接口使用独立的令牌桶，单独配置的接口使用自己的QPS"""
+    path = str(tmp_path / 'limits.sqlite3')
+    limits = ProviderRateLimits('alibaba', 'account-a', rate=2, api_rates={'QueryAccountBalance': 0}, path=path)
+    other_account = ProviderRateLimits('alibaba', 'account-b', rate=2, path=path)
+
+    started = time.monotonic()
+    limits.acquire('QueryInstanceBill')
+    limits.acquire('QueryBill')
+    other_account.acquire('QueryInstanceBill')
+    for _ in range(5):
+        limits.acquire('QueryAccountBalance')
+    assert time.monotonic() - started < 0.2
+
+    # 同一账户同一接口的第二个请求等待约0.5秒（其他进程内的实例同样等待）
+    same_account = ProviderRateLimits('alibaba', 'account-a', rate=2, path=path)
+    started = time.monotonic()
+    same_account.acquire('QueryInstanceBill')
+    assert time.monotonic() - started >= 0.4
+
+
+def test_empty_path_limits_within_process():
+    """测试未配置共享文件时只在进程内限流"""
+    limits = ProviderRateLimits('tencent', 'account', rate=5, path='')
+
+    assert isinstance(limits.limiter('DescribeBillDetail'), RateLimiter)
+    assert limits.limiter('DescribeBillDetail') is limits.limiter('DescribeBillDetail')
+
+
+def test_parse_api_rates():
+    """测试解析按接口配置的QPS"""
+    assert parse_api_rates('QueryInstanceBill:10, QueryAccountBalance:2') == {
+        'QueryInstanceBill': 10.0, 'QueryAccountBalance': 2.0
+    }
+    assert parse_api_rates(None) == {}
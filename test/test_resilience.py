@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试云服务商接口的重试和熔断（不需要云SDK）
+"""
+
+import sys
+import os
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from finance_api.fake_providers import FakeProviderError
+from finance_api.resilience import (
+    CircuitBreaker, CircuitOpenError, ProviderResilience, RetryPolicy, is_retryable
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def flaky(failures, code='Throttling'):
+    """前failures次调用抛出指定错误码的异常"""
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) <= failures:
+            raise FakeProviderError(code)
+        return 'ok'
+
+    return call, calls
+
+
+def test_retryable_errors():
+    """测试限流、服务端临时错误和网络错误可重试，参数和权限错误不重试"""
+    assert is_retryable(FakeProviderError('Throttling.User'))
+    assert is_retryable(FakeProviderError('RequestLimitExceeded'))
+    assert is_retryable(FakeProviderError('InternalError'))
+    assert is_retryable(ConnectionResetError())
+    assert not is_retryable(FakeProviderError('AuthFailure.SignatureFailure'))
+    assert not is_retryable(FakeProviderError('InvalidParameter'))
+    assert not is_retryable(CircuitOpenError())
+
+
+def test_throttled_call_is_retried_with_backoff():
+    """测试限流时退避重试"""
+    delays = []
+    resilience = ProviderResilience(
+        'tencent', retry=RetryPolicy(max_attempts=4, base_delay=1, max_delay=3),
+        breaker=CircuitBreaker(failure_threshold=10), sleep=delays.append
+    )
+    call, calls = flaky(3, 'RequestLimitExceeded')
+
+    assert resilience.call('DescribeBillDetail', call) == 'ok'
+    assert len(calls) == 4
+    # 指数退避（1、2、4封顶为3秒），随机抖动在 [0.5, 1.0] 倍之间
+    assert 0.5 <= delays[0] <= 1 and 1 <= delays[1] <= 2 and 1.5 <= delays[2] <= 3
+
+
+def test_gives_up_after_max_attempts_and_skips_non_retryable():
+    """测试超过最大尝试次数后抛出原异常，不可重试的错误不重试"""
+    resilience = ProviderResilience('alibaba', retry=RetryPolicy(3, 0, 0),
+                                    breaker=CircuitBreaker(failure_threshold=10), sleep=lambda s: None)
+
+    call, calls = flaky(5)
+    with pytest.raises(FakeProviderError):
+        resilience.call('QueryInstanceBill', call)
+    assert len(calls) == 3
+
+    call, calls = flaky(5, 'InvalidAccessKeyId.NotFound')
+    with pytest.raises(FakeProviderError):
+        resilience.call('QueryInstanceBill', call)
+    assert len(calls) == 1
+
+
+def test_circuit_opens_rejects_and_recovers_after_probe():
+    """测试连续失败后熔断，熔断期间不发起请求，到期后试探请求成功则恢复"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=60, clock=clock)
+    resilience = ProviderResilience('alibaba', retry=RetryPolicy(2, 0, 0), breaker=breaker,
+                                    sleep=lambda s: None)
+
+    call, calls = flaky(100)
+    with pytest.raises(FakeProviderError):
+        resilience.call('QueryInstanceBill', call)
+    # 第3次失败时熔断，不再继续重试
+    with pytest.raises(FakeProviderError):
+        resilience.call('QueryInstanceBill', call)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert len(calls) == 3
+
+    with pytest.raises(CircuitOpenError):
+        resilience.call('QueryInstanceBill', call)
+    assert len(calls) == 3
+
+    # 熔断到期后放行一个试探请求，失败则重新熔断
+    clock.now = 61
+    with pytest.raises(FakeProviderError):
+        resilience.call('QueryInstanceBill', call)
+    assert len(calls) == 4
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.now = 122
+    call, calls = flaky(0)
+    assert resilience.call('QueryInstanceBill', call) == 'ok'
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_allows_single_probe():
+    """测试试探期间只放行一个请求"""
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+
+    clock.now = 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.allow()
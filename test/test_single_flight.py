@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试相同请求合并（不需要云SDK）
+"""
+
+import sys
+import os
+import threading
+import time
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from finance_api.single_flight import SingleFlight
+
+
+def run_concurrently(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_concurrent_calls_share_one_execution():
+    """测试同时进行的相同请求只执行一次，各自得到结果副本"""
+    flights = SingleFlight()
+    calls, results = [], []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return {'daily_costs': {'2024-01-01': 1.0}}
+
+    run_concurrently(5, lambda: results.append(flights.do(('full', 'all', '2024-01-01'), compute)))
+
+    assert len(calls) == 1
+    assert all(result == results[0] for result in results)
+    assert len({id(result) for result in results}) == 5
+    assert flights.in_flight() == 0
+
+    # 请求完成后不保留结果
+    flights.do(('full', 'all', '2024-01-01'), compute)
+    assert len(calls) == 2
+
+
+def test_errors_reach_every_waiter():
+    """测试执行失败时所有等待的请求都收到异常"""
+    flights = SingleFlight()
+    errors = []
+
+    def fail():
+        time.sleep(0.1)
+        raise RuntimeError('Throttling')
+
+    def call():
+        with pytest.raises(RuntimeError):
+            flights.do('key', fail)
+        errors.append(1)
+
+    run_concurrently(3, call)
+    assert len(errors) == 3
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试向量化的成本预测（不需要云SDK）
+"""
+
+import sys
+import os
+from datetime import timedelta
+
+# 添加项目路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from finance_api.cost_prediction_service import CostPredictionService
+
+
+class CountingModel:
+    """记录predict调用次数的模型"""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = 0
+
+    def predict(self, X):
+        self.calls += 1
+        return self.model.predict(X)
+
+
+def test_horizon_predicted_in_one_call_per_model(make_daily_costs):
+    """测试整个预测期每个模型只调用一次predict，结果与逐日预测一致"""
+    service = CostPredictionService(cache=None, model_registry=None)
+    daily_costs = make_daily_costs(60, trend=0.3)
+    df = service.prepare_data(daily_costs)
+    fitted = service.fit_models(df)
+    models = {name: CountingModel(model) for name, model in fitted.items()}
+    service.get_models = lambda df, provider=None: models
+
+    result = service.predict_costs(daily_costs, days_ahead=365)
+
+    assert [model.calls for model in models.values()] == [1, 1]
+    assert len(result['predictions']) == 365
+    assert result['predictions'][0]['date'] == '2024-03-01'
+
+    # 与逐日构建特征的预测结果一致
+    last_date = df['date'].max()
+    for i in (0, 100, 364):
+        future_date = last_date + timedelta(days=i + 1)
+        features = [
+            future_date.dayofweek, future_date.day, future_date.month,
+            (future_date - df['date'].min()).days,
+            df['cost'].tail(7).mean(), df['cost'].tail(30).mean(), df['cost'].tail(7).std()
+        ]
+        expected = sum(max(0, m.predict([features])[0]) for m in fitted.values()) / len(fitted)
+        assert result['predictions'][i]['predicted_cost'] == round(expected, 2)
+
+
+def test_zero_day_horizon_returns_empty_predictions(make_daily_costs):
+    """测试预测0天时不调用predict，返回空的预测结果（与逐日预测时一致）"""
+    service = CostPredictionService(cache=None, model_registry=None)
+    daily_costs = make_daily_costs(60, trend=0.3)
+
+    for method in ('ensemble', 'linear', 'moving_average'):
+        result = service.predict_costs(daily_costs, days_ahead=0, method=method)
+        assert result['success'] and result['predictions'] == []
+
+    result = service.analysis_pipeline(daily_costs).predict_costs(days_ahead=0)
+    assert result['success'] and result['statistics']['prediction_days'] == 0
+
+
+def test_prepare_data_lightweight_skips_features():
+    """测试轻量模式只返回日期和成本"""
+    service = CostPredictionService(cache=None, model_registry=None)
+    df = service.prepare_data({'2024-01-02': 2.0, '2024-01-01': 1.0}, lightweight=True)
+
+    assert list(df.columns) == ['date', 'cost']
+    assert df['cost'].tolist() == [1.0, 2.0]
+
+
+def test_daily_analysis_and_baseline_records():
+    """测试向量化的每日分析和预算对比记录"""
+    service = CostPredictionService(cache=None, model_registry=None)
+    daily_costs = {'2024-01-01': 100.0, '2024-01-02': 100.0, '2024-01-03': 400.0, '2024-01-04': 10.0}
+
+    analysis = service.daily_cost_analysis(daily_costs)
+    assert [day['level'] for day in analysis['daily_analysis']] == ['normal', 'normal', 'high', 'normal']
+    assert analysis['daily_analysis'][2] == {
+        'date': '2024-01-03', 'cost': 400.0, 'level': 'high',
+        'description': '成本偏高', 'deviation_pct': 162.3
+    }
+
+    comparison = service.compare_with_baseline(daily_costs, 150.0)
+    assert comparison['comparison'][3] == {
+        'date': '2024-01-04', 'cost': 10.0, 'baseline': 150.0,
+        'difference': -140.0, 'difference_pct': -93.33, 'status': 'within_budget'
+    }
+    assert comparison['summary']['over_budget_days'] == 1
+
+    # 全部为0的成本序列偏离比例为0，而不是NaN
+    analysis = service.daily_cost_analysis({'2024-01-01': 0.0, '2024-01-02': 0.0})
+    assert [day['deviation_pct'] for day in analysis['daily_analysis']] == [0, 0]
+
+
+def test_pipeline_prepares_series_once(make_daily_costs):
+    """测试流水线只准备一次数据，各阶段结果与单独调用一致"""
+    service = CostPredictionService(cache=None, model_registry=None)
+    daily_costs = make_daily_costs(60, trend=0.3)
+    prepare_calls = []
+    prepare_data = service.prepare_data
+    service.prepare_data = lambda *args, **kwargs: prepare_calls.append(1) or prepare_data(*args, **kwargs)
+
+    pipeline = service.analysis_pipeline(daily_costs)
+    results = (pipeline.daily_cost_analysis(), pipeline.predict_costs(14), pipeline.detect_anomalies(1.5))
+
+    assert len(prepare_calls) == 1
+    assert set(pipeline.timings) == {'prepare', 'daily_analysis', 'predictions', 'anomalies'}
+    assert results == (
+        service.daily_cost_analysis(daily_costs),
+        service.predict_costs(daily_costs, 14),
+        service.detect_anomalies(daily_costs, 1.5)
+    )